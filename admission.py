@@ -0,0 +1,295 @@
+"""Admission control for the write endpoints.
+
+    @pages.route('/add', methods=['GET', 'POST'])
+    @admitted('uploads')
+    def add(): ...
+
+A POST to a view decorated with `@admitted(policy)` must get past two checks
+before its body is read:
+
+* a token bucket per client IP and policy (`rate` requests per second, up to
+  `burst` at once). An empty bucket gets `429 Too Many Requests` with a
+  `Retry-After` of the seconds until the next token;
+* a cap of `concurrency` requests running in the endpoint at once. Further
+  requests queue in arrival order, up to `queue` of them, for at most
+  `timeout` seconds. A full queue or a missed deadline gets
+  `503 Service Unavailable` with `Retry-After: ADMISSION_RETRY_AFTER`.
+
+Shedding costs no database or disk work, so a burst of form spam or large
+uploads cannot tie up every worker and starve the read-only pages.
+
+Two backends, as for the fragment cache: `sqlite` (the default,
+`instance/admission.sqlite3`, shared by all gunicorn workers, so the limits
+hold for the whole server) and `memory`. The memory backend counts per
+process, so each of N workers would admit its own `concurrency` requests;
+gunicorn refuses to start it with more than one worker (see
+`check_workers`). Buckets are keyed by `request.remote_addr`, which is the
+client's address only when `TRUSTED_PROXIES` tells the app how many
+proxies' `X-Forwarded-For` entries to believe. Every decision is sent on `admission_decided`;
+metrics.py counts admitted versus shed requests and the time spent queued.
+"""
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from blinker import Namespace
+from flask import current_app, request
+
+from workers import pid_alive
+
+DEFAULT_POLICIES = {
+    # Photo uploads: /add, /edit/<id>
+    'uploads': {'rate': 0.2, 'burst': 5, 'concurrency': 2, 'queue': 4, 'timeout': 2.0},
+    # Contact / FAQ messages
+    'forms': {'rate': 0.2, 'burst': 5, 'concurrency': 4, 'queue': 8, 'timeout': 1.0},
+}
+# A slot still taken this long after it was granted is freed, in case its
+# holder hung; slots of dead workers are freed straight away. Holders never
+# extend it, so a request running longer no longer counts toward the cap.
+SLOT_LEASE = 120
+POLL_INTERVAL = 0.02
+# Sent with `endpoint`, `outcome` and `waited` (seconds queued)
+_signals = Namespace()
+admission_decided = _signals.signal('admission-decided')
+
+ADMITTED, RATE_LIMITED, QUEUE_FULL, TIMED_OUT = 'admitted', 'rate_limited', 'queue_full', 'timed_out'
+
+
+def check_workers(backend, workers):
+    """Refuse a per-process backend when several processes share the limits."""
+    if backend == 'memory' and workers > 1:
+        raise RuntimeError(f"ADMISSION_BACKEND=memory enforces its limits per worker, so {workers} workers "
+                           f"would admit {workers} times as many requests; use ADMISSION_BACKEND=sqlite")
+
+
+def _refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + (now - updated) * rate)
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class MemoryBackend:
+    def __init__(self):
+        self._buckets = {}
+        self._running = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def take(self, key, rate, burst):
+        """Take a token; returns 0 or the seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > 10000:
+                # Forget clients whose bucket has filled up again
+                self._buckets = {key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+                                 if _refill(tokens, updated, now, rate, burst) < burst}
+            return 0
+
+    def acquire(self, endpoint, limit, max_queue, timeout):
+        """Take a slot of `endpoint`; returns a token for release(), QUEUE_FULL or TIMED_OUT."""
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            waiting = self._waiting.setdefault(endpoint, deque())
+            if self._running.get(endpoint, 0) < limit and not waiting:
+                self._running[endpoint] = self._running.get(endpoint, 0) + 1
+                return endpoint
+            if len(waiting) >= max_queue:
+                return QUEUE_FULL
+            ticket = object()
+            waiting.append(ticket)
+            try:
+                while waiting[0] is not ticket or self._running.get(endpoint, 0) >= limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return TIMED_OUT
+                    self._changed.wait(remaining)
+                self._running[endpoint] = self._running.get(endpoint, 0) + 1
+                return endpoint
+            finally:
+                waiting.remove(ticket)
+                self._changed.notify_all()
+
+    def release(self, token):
+        with self._lock:
+            self._running[token] -= 1
+            self._changed.notify_all()
+
+
+class SQLiteBackend:
+    """Buckets and slots in a WAL-mode SQLite file shared between processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+
+    def _connection(self):
+        # sqlite3 connections must not cross threads or a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS bucket "
+                         "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS slot (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                         "endpoint TEXT NOT NULL, pid INTEGER NOT NULL, running INTEGER NOT NULL, "
+                         "expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_slot_endpoint ON slot (endpoint, running)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, fn, *args):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, *args)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def take(self, key, rate, burst):
+        def take(conn):
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM bucket WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*row, now, rate, burst) if row else burst
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                         (key, tokens - 1 if not wait else tokens, now))
+            self._takes += 1
+            if self._takes % 100 == 0:
+                # Full buckets carry no information
+                conn.execute("DELETE FROM bucket WHERE updated < ?", (now - burst / rate,))
+            return wait
+        return self._transaction(take)
+
+    def _free_stale(self, conn, endpoint):
+        conn.execute("DELETE FROM slot WHERE endpoint = ? AND expires < ?", (endpoint, time.time()))
+        for slot_id, pid in conn.execute("SELECT id, pid FROM slot WHERE endpoint = ?", (endpoint,)).fetchall():
+            if pid != os.getpid() and not pid_alive(pid):
+                conn.execute("DELETE FROM slot WHERE id = ?", (slot_id,))
+
+    def _counts(self, conn, endpoint):
+        running, waiting = conn.execute(
+            "SELECT COALESCE(SUM(running), 0), COALESCE(SUM(1 - running), 0) FROM slot WHERE endpoint = ?",
+            (endpoint,)).fetchone()
+        return running, waiting
+
+    def acquire(self, endpoint, limit, max_queue, timeout):
+        deadline = time.monotonic() + timeout
+
+        def enter(conn):
+            self._free_stale(conn, endpoint)
+            running, waiting = self._counts(conn, endpoint)
+            if running < limit and not waiting:
+                return conn.execute("INSERT INTO slot (endpoint, pid, running, expires) VALUES (?, ?, 1, ?)",
+                                    (endpoint, os.getpid(), time.time() + SLOT_LEASE)).lastrowid, True
+            if waiting >= max_queue:
+                return None, False
+            return conn.execute("INSERT INTO slot (endpoint, pid, running, expires) VALUES (?, ?, 0, ?)",
+                                (endpoint, os.getpid(), time.time() + timeout + SLOT_LEASE)).lastrowid, False
+
+        def promote(conn, slot_id):
+            self._free_stale(conn, endpoint)
+            running, _ = self._counts(conn, endpoint)
+            first = conn.execute("SELECT MIN(id) FROM slot WHERE endpoint = ? AND running = 0",
+                                 (endpoint,)).fetchone()[0]
+            if running >= limit or first != slot_id:
+                return False
+            conn.execute("UPDATE slot SET running = 1, expires = ? WHERE id = ?",
+                         (time.time() + SLOT_LEASE, slot_id))
+            return True
+
+        slot_id, running = self._transaction(enter)
+        if slot_id is None:
+            return QUEUE_FULL
+        while not running:
+            if time.monotonic() >= deadline:
+                self.release(slot_id)
+                return TIMED_OUT
+            time.sleep(POLL_INTERVAL)
+            running = self._transaction(promote, slot_id)
+        return slot_id
+
+    def release(self, token):
+        self._connection().execute("DELETE FROM slot WHERE id = ?", (token,))
+
+
+# -------------------------------
+# Flask integration
+# -------------------------------
+def admitted(policy):
+    """Rate-limit and cap the concurrency of the view's POSTs under `policy`."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            control = current_app.extensions.get('admission')
+            if control is None or not control.enabled or request.method in ('GET', 'HEAD', 'OPTIONS'):
+                return view(*args, **kwargs)
+            return control.run(policy, view, args, kwargs)
+        return wrapper
+    return decorator
+
+
+class AdmissionControl:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ADMISSION_ENABLED', os.getenv('ADMISSION_ENABLED', '1') == '1')
+        app.config.setdefault('ADMISSION_BACKEND', os.getenv('ADMISSION_BACKEND', 'sqlite'))
+        app.config.setdefault('ADMISSION_PATH', os.path.join(app.instance_path, 'admission.sqlite3'))
+        app.config.setdefault('ADMISSION_RETRY_AFTER', int(os.getenv('ADMISSION_RETRY_AFTER', 5)))
+        app.config.setdefault('ADMISSION_POLICIES', {})
+        self.enabled = app.config['ADMISSION_ENABLED']
+        self.retry_after = app.config['ADMISSION_RETRY_AFTER']
+        self.policies = {name: dict(DEFAULT_POLICIES.get(name, {}), **overrides)
+                         for name, overrides in {**DEFAULT_POLICIES, **app.config['ADMISSION_POLICIES']}.items()}
+        if app.config['ADMISSION_BACKEND'] == 'sqlite':
+            self.backend = SQLiteBackend(app.config['ADMISSION_PATH'])
+        else:
+            self.backend = MemoryBackend()
+        app.extensions['admission'] = self
+
+    def run(self, policy, view, args, kwargs):
+        settings = self.policies[policy]
+        endpoint = request.endpoint
+        started = time.monotonic()
+
+        wait = self.backend.take(f"{policy}:{request.remote_addr}", settings['rate'], settings['burst'])
+        if wait:
+            return self._reject(endpoint, RATE_LIMITED, 429, math.ceil(wait), 0.0)
+
+        token = self.backend.acquire(endpoint, settings['concurrency'], settings['queue'], settings['timeout'])
+        waited = time.monotonic() - started
+        if token in (QUEUE_FULL, TIMED_OUT):
+            return self._reject(endpoint, token, 503, self.retry_after, waited)
+        admission_decided.send(self, endpoint=endpoint, outcome=ADMITTED, waited=waited)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            self.backend.release(token)
+
+    def _reject(self, endpoint, outcome, status, retry_after, waited):
+        admission_decided.send(self, endpoint=endpoint, outcome=outcome, waited=waited)
+        message = "Too many requests" if status == 429 else "The server is busy"
+        return current_app.response_class(f"{message}, please try again in {retry_after} seconds.\n",
+                                          status=status, mimetype='text/plain',
+                                          headers={'Retry-After': str(retry_after)})
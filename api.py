@@ -0,0 +1,235 @@
+"""JSON API for pets, for the mobile app and partner sites.
+
+    GET  /api/pets?species=Dog&fields=id,name,img&per_page=50&after=<cursor>
+    GET  /api/pets/<id>
+    GET  /api/pets/batch?ids=3,1,2
+    GET  /api/pets.ndjson?species=Cat          (streamed, one pet per line)
+    POST /api/pets/bulk   {"create": [...], "update": [...], "delete": [...]}
+
+Listings take the same filters and cursors as /pets. `fields` limits both the
+response and the columns read from the database. The NDJSON export walks the
+table in keyset chunks inside a generator, so neither side holds the whole
+result in memory. Bulk writes are applied in one transaction: either every
+operation succeeds or none does.
+"""
+import json
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from sqlalchemy.orm import load_only
+
+import search
+from caching import conditional
+from replicas import read_only
+from models import db, Pet, validate_pet
+from pagination import clamp_page_size, paginate, SORT_KEYS
+
+FIELDS = ('id', 'img', 'name', 'age', 'breed', 'species')
+MAX_BATCH = 100
+MAX_BULK = 1000
+EXPORT_CHUNK = 1000
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+@api.errorhandler(ApiError)
+def handle_api_error(e):
+    return jsonify(error=str(e), **e.extra), e.status
+
+
+# -------------------------------
+# Helpers
+# -------------------------------
+def requested_fields():
+    raw = request.args.get('fields', '')
+    if not raw.strip():
+        return FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in raw.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}", allowed=list(FIELDS))
+    return fields
+
+
+def project(query, fields, sort='id'):
+    # Cursors need the id and the sort column even if they are not returned
+    needed = set(fields) | {'id'}
+    if SORT_KEYS.get(sort) is not None:
+        needed.add(SORT_KEYS[sort].key)
+    return query.options(load_only(*[getattr(Pet, name) for name in FIELDS if name in needed]))
+
+
+def serialize(pet, fields):
+    return {field: getattr(pet, field) for field in fields}
+
+
+def filtered_query():
+    filters = {key: request.args.get(key, '').strip() for key in search.FILTER_KEYS}
+    try:
+        return search.filter_pets(Pet.query, **filters)
+    except ValueError as e:
+        raise ApiError(str(e)) from None
+
+
+def parse_ids(raw):
+    try:
+        ids = [int(part) for part in raw.split(',') if part.strip()]
+    except ValueError:
+        raise ApiError("ids must be a comma-separated list of integers") from None
+    if len(ids) > MAX_BATCH:
+        raise ApiError(f"At most {MAX_BATCH} ids per request")
+    return ids
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+@api.route('/pets')
+@read_only
+@conditional(catalog=True)
+def list_pets():
+    fields = requested_fields()
+    sort = request.args.get('sort', 'id')
+    if sort not in SORT_KEYS:
+        raise ApiError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+    try:
+        page = paginate(project(filtered_query(), fields, sort), sort=sort, after=request.args.get('after'),
+                        before=request.args.get('before'), per_page=clamp_page_size(request.args.get('per_page')))
+    except ValueError as e:
+        raise ApiError(str(e)) from None
+    return jsonify(
+        pets=[serialize(pet, fields) for pet in page.items],
+        per_page=page.per_page,
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
+    )
+
+
+@api.route('/pets/<int:pet_id>')
+@read_only
+@conditional(catalog=True)
+def get_pet(pet_id):
+    fields = requested_fields()
+    pet = project(Pet.query, fields).filter(Pet.id == pet_id).first()
+    if pet is None:
+        raise ApiError("Pet not found", 404)
+    return jsonify(serialize(pet, fields))
+
+
+@api.route('/pets/batch')
+@read_only
+@conditional(catalog=True)
+def batch_get():
+    fields = requested_fields()
+    ids = parse_ids(request.args.get('ids', ''))
+    pets = {pet.id: pet for pet in project(Pet.query, fields).filter(Pet.id.in_(ids))}
+    return jsonify(
+        pets=[serialize(pets[pet_id], fields) for pet_id in ids if pet_id in pets],
+        missing=[pet_id for pet_id in ids if pet_id not in pets],
+    )
+
+
+@api.route('/pets.ndjson')
+@read_only
+def export_ndjson():
+    fields = requested_fields()
+    query = project(filtered_query(), fields)
+
+    def generate():
+        last_id = 0
+        while True:
+            chunk = query.filter(Pet.id > last_id).order_by(Pet.id).limit(EXPORT_CHUNK).all()
+            if not chunk:
+                return
+            yield ''.join(json.dumps(serialize(pet, fields)) + '\n' for pet in chunk)
+            last_id = chunk[-1].id
+            # Let the identity map forget the chunk we just sent
+            db.session.expunge_all()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# -------------------------------
+# Writing
+# -------------------------------
+def _validated(index, data, op, base=None):
+    if not isinstance(data, dict):
+        raise ApiError("Expected a JSON object", op=op, index=index)
+    merged = dict(base or {}, **{key: data[key] for key in FIELDS if key in data and key != 'id'})
+    try:
+        fields = validate_pet(merged)
+        if not fields['img']:
+            raise ValueError("Img is required")
+    except ValueError as e:
+        raise ApiError(str(e), op=op, index=index) from None
+    return fields
+
+
+@api.route('/pets/bulk', methods=['POST'])
+def bulk_write():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError("Expected a JSON object with create, update and/or delete lists")
+    creates, updates, deletes = (body.get(key) or [] for key in ('create', 'update', 'delete'))
+    if not all(isinstance(ops, list) for ops in (creates, updates, deletes)):
+        raise ApiError("create, update and delete must be lists")
+    if len(creates) + len(updates) + len(deletes) > MAX_BULK:
+        raise ApiError(f"At most {MAX_BULK} operations per request")
+
+    try:
+        created = []
+        for index, data in enumerate(creates):
+            pet = Pet(**_validated(index, data, 'create'))
+            db.session.add(pet)
+            created.append(pet)
+
+        update_ids = [data.get('id') for data in updates if isinstance(data, dict)]
+        delete_ids = list(deletes)
+        if not all(isinstance(pet_id, int) for pet_id in update_ids + delete_ids) or len(update_ids) != len(updates):
+            raise ApiError("update entries need an integer id, and delete takes a list of ids")
+        existing = {pet.id: pet for pet in Pet.query.filter(Pet.id.in_(update_ids + delete_ids))}
+
+        released = []
+        for index, data in enumerate(updates):
+            pet = existing.get(data['id'])
+            if pet is None:
+                raise ApiError("Pet not found", 404, op='update', index=index, id=data['id'])
+            fields = _validated(index, data, 'update', pet.to_dict())
+            if fields['img'] != pet.img:
+                released.append(pet.img)
+            for key, value in fields.items():
+                setattr(pet, key, value)
+        for index, pet_id in enumerate(delete_ids):
+            pet = existing.get(pet_id)
+            if pet is None:
+                raise ApiError("Pet not found", 404, op='delete', index=index, id=pet_id)
+            released.append(pet.img)
+            db.session.delete(pet)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    uploads = current_app.extensions.get('uploads')
+    if uploads is not None:
+        for path in released:
+            uploads.release(path)
+    images = current_app.extensions.get('images')
+    if images is not None:
+        for pet in created:
+            images.submit(pet.img)
+    return jsonify(
+        created=[pet.id for pet in created],
+        updated=len(updates),
+        deleted=len(delete_ids),
+    )
+
+
+def init_app(app):
+    app.register_blueprint(api)
@@ -1,65 +1,81 @@
-from flask import Flask, render_template, url_for, request, redirect, flash
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.utils import secure_filename
+from flask import Blueprint, Flask, render_template, url_for, request, redirect, flash, jsonify
+from flask.cli import with_appcontext
+from flask_migrate import Migrate
 import os
+import click
 from dotenv import load_dotenv
-import requests
-import uuid  
-
-# -------------------------------
-# Load environment variables
-# -------------------------------
-load_dotenv()
-
-# -------------------------------
-# Initialize Flask app
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from dog_facts import DogFactsProvider
+from images import ImagePipeline
+from models import db, Pet, validate_pet
+from storage import UploadStore, streamed_upload, too_large
+from submissions import SubmissionQueue
+from metrics import Metrics
+from profiler import Profiler
+from fragments import FragmentCache
+from caching import HttpCache, conditional
+from assets import Assets
+from admission import AdmissionControl, admitted
+from replicas import ReplicaRouter, read_only, use_primary
+from pagination import paginate, clamp_page_size, SORT_KEYS
+import config
+import search
+import bulk
+import stats
+import api
+import template_cache
+from matching import MatchEngine, parse_preferences
+from suggest import SuggestIndex
+from featured import FeaturedPets
+
+# -------------------------------
+# Extensions (bound to the app in create_app)
+# -------------------------------
+migrate = Migrate()
+# Dog facts (cached, refreshed in the background)
+dog_facts = DogFactsProvider()
+# Content-addressed upload storage
+upload_store = UploadStore()
+# Responsive image derivatives (built off the request thread)
+image_pipeline = ImagePipeline()
+# Contact / FAQ submissions (written in batches)
+submission_queue = SubmissionQueue()
+# Request metrics (/metrics, Server-Timing)
+metrics = Metrics()
+# Sampling profiler for slow requests (opt-in, /_profiles)
+profiler = Profiler()
+# Fingerprinted, precompressed static files (flask assets build)
+assets = Assets()
+# Rate limits and concurrency caps for the write endpoints
+admission_control = AdmissionControl()
+# Conditional GET / ETags (catalogue version shared through the database)
+http_cache = HttpCache()
+# Rendered-fragment cache ({% cache %} blocks in templates)
+fragment_cache = FragmentCache()
+# Adopter matching (NumPy snapshot of the catalogue)
+match_engine = MatchEngine()
+# Name / breed typeahead (in-memory prefix index)
+suggest_index = SuggestIndex()
+# Home page featured pets (rotated snapshot)
+featured_pets = FeaturedPets()
+# Read replicas (read-only views, with read-your-writes)
+replica_router = ReplicaRouter()
+
+pages = Blueprint('pages', __name__)
+
+
+# -------------------------------
+# Seed Pets Function
 # -------------------------------
-app = Flask(__name__, template_folder='templates', static_folder='static')
-app.secret_key = os.getenv('SECRET_KEY', 'a8f3@9!gks92&x1z')  
-
-# -------------------------------
-# File Upload Config
-# -------------------------------
-UPLOAD_FOLDER = os.path.join(app.root_path, 'static/uploads')
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-# -------------------------------
-# Database configuration
-# -------------------------------
-database_url = os.environ.get('DATABASE_URL', 'sqlite:///test.db')
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-
-
-# -------------------------------
-# Database Models
-# -------------------------------
-class Pet(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    img = db.Column(db.String(200), nullable=False)
-    name = db.Column(db.String(100), nullable=False)
-    age = db.Column(db.Integer, nullable=False)
-    breed = db.Column(db.String(100), nullable=False)
-    species = db.Column(db.String(100), nullable=False)
-
-    def __repr__(self):
-        return f'<Pet {self.name}>'
-    
-
-    # --- Seed Pets Function ---
 
 def seed_pets():
-    if Pet.query.count() == 0:
+    """Add the starter pets if the catalogue is empty; returns how many were added."""
+    with use_primary():
+        if Pet.query.count() > 0:
+            return 0
         pets_available = [
             Pet(img='images/Golden-Retriever.png', name='Charlie', age=3, breed='Golden Retriever', species='Dog'),
             Pet(img='images/Beagle.png', name='Max', age=2, breed='Beagle', species='Dog'),
@@ -81,57 +97,92 @@ def seed_pets():
             Pet(img='images/BoxTurtle.png', name='Shelly', age=4, breed='Box Turtle', species='Reptile'),
             Pet(img='images/VeiledChameleon.png', name='Echo', age=2, breed='Veiled Chameleon', species='Reptile'),
         ]
-        db.session.bulk_save_objects(pets_available)
+        db.session.add_all(pets_available)
         db.session.commit()
+        return len(pets_available)
+
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Add the starter pets to an empty catalogue."""
+    added = seed_pets()
+    click.echo(f"Added {added} pets." if added else "The catalogue already has pets; nothing to do.")
+
+
+# -------------------------------
+# App factory
+# -------------------------------
+def create_app(test_config=None):
+    """Build the app without touching the database.
+
+    The schema is managed with `flask db upgrade` and starter data with
+    `flask seed`; engines open their first connection on the first request.
+    `test_config` overrides settings before any extension reads them.
+    """
+    load_dotenv()
+
+    app = Flask(__name__, template_folder='templates', static_folder='static')
+    app.secret_key = os.getenv('SECRET_KEY', 'a8f3@9!gks92&x1z')
+    app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static/uploads')
+    if test_config:
+        app.config.update(test_config)
+    # Proxies in front of the app whose X-Forwarded-For / -Proto to believe,
+    # so request.remote_addr (rate limits, logs) is the client's address
+    app.config.setdefault('TRUSTED_PROXIES', int(os.getenv('TRUSTED_PROXIES', 0)))
+    if app.config['TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'],
+                                x_proto=app.config['TRUSTED_PROXIES'])
+
+    config.init_app(app)
+    db.init_app(app)
+    with app.app_context():
+        config.tune_engine(db.engine, app.config)
+        config.reset_after_fork(db.engine)
+    migrate.init_app(app, db)
+
+    search.init_app(app)
+    bulk.init_app(app)
+    stats.init_app(app)
+    api.init_app(app)
+    template_cache.init_app(app)
+    for extension in (profiler, dog_facts, upload_store, image_pipeline, submission_queue, metrics, admission_control,
+                      assets, http_cache, fragment_cache, match_engine, suggest_index, featured_pets,
+                      replica_router):
+        extension.init_app(app)
+
+    app.register_blueprint(pages)
+    app.cli.add_command(seed_command)
+    return app
+
+
+def warm_up(app):
+    """Per-process work done once in the gunicorn master under `--preload`,
+    so the forked workers share it copy-on-write (see gunicorn.conf.py)."""
+    template_cache.compile_all(app)
+    with app.app_context():
+        try:
+            match_engine.snapshot()
+            suggest_index.refresh()
+            featured_pets.current()
+        except SQLAlchemyError as e:
+            app.logger.warning("Skipping the catalogue snapshot warm-up: %s", e)
+        db.session.remove()
 
-class Submission(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    first_name = db.Column(db.String(100), nullable=False)
-    surname = db.Column(db.String(100), nullable=False)
-    email = db.Column(db.String(100), nullable=False)
-    message = db.Column(db.Text, nullable=False)
-    terms = db.Column(db.Boolean, nullable=False)
-
-    def __repr__(self):
-        return f'<Submission {self.first_name} {self.surname}>'
-
-# -------------------------------
-# Create database tables if not exist
-# -------------------------------
-with app.app_context():
-    db.create_all()
-
-# -------------------------------
-# Helper function to fetch dog facts
-# -------------------------------
-def get_dog_facts(limit=3):
-    try:
-        response = requests.get(f"https://dogapi.dog/api/v2/facts?limit={limit}")
-        if response.status_code == 200:
-            data = response.json()
-            return [item['attributes']['body'] for item in data.get('data', [])]
-    except Exception as e:
-        print("Error fetching dog facts:", e)
-    # Fallback facts if API fails
-    return [
-        "All my dogs were named Charlie",
-        "Dogs can learn over 1000 words",
-        "They dream just like humans!"
-    ]
 
 # -------------------------------
 # Inject dog facts into all templates
 # -------------------------------
-@app.context_processor
+@pages.app_context_processor
 def inject_dog_facts():
-    return {'dog_facts': get_dog_facts()}
+    return {'dog_facts': dog_facts.get_facts()}
 
 # -------------------------------
 # Routes / Views
 # -------------------------------
 
 # Home page with contact form and steps
-@app.route('/', methods=['GET', 'POST'])
+@pages.route('/', methods=['GET', 'POST'])
 def index():
     steps = [
         {
@@ -157,46 +208,29 @@ def index():
         message = request.form.get('message')
         terms = request.form.get('terms') == 'on'
         flash('Thank you for contacting us!!')
-        return render_template('index.html', form_action=url_for('index'), first_name=first_name, surname=surname, email=email, message=message, terms=terms, steps=steps,)
+        return render_template('index.html', form_action=url_for('pages.index'), first_name=first_name, surname=surname, email=email, message=message, terms=terms, steps=steps,)
     
-    return render_template('index.html', steps=steps, form_action=url_for('index'))
+    return render_template('index.html', steps=steps, form_action=url_for('pages.index'))
 
 
 # -------------------------------
 # Pet listing page start
 # -------------------------------
 
-from sqlalchemy import distinct
+def listing_args():
+    return {key: request.args.get(key, '').strip() for key in search.FILTER_KEYS}
 
-@app.route('/pets', methods=['GET', 'POST'])
+
+@pages.route('/pets', methods=['GET', 'POST'])
+@read_only
+@conditional(catalog=True)
 def list_pets():
-    
-    if Pet.query.count() == 0:
-        pets_available = [
-            Pet(img='images/Golden-Retriever.png', name='Charlie', age=3, breed='Golden Retriever', species='Dog'),
-            Pet(img='images/Beagle.png', name='Max', age=2, breed='Beagle', species='Dog'),
-            Pet(img='images/Bulldogg.png', name='Rocky', age=5, breed='Bulldog', species='Dog'),
-            Pet(img='images/Husky.png', name='Ghost', age=4, breed='Siberian Husky', species='Dog'),
-            Pet(img='images/Tabby.png', name='Luna', age=1, breed='Tabby', species='Cat'),
-            Pet(img='images/Siamese.png', name='Simba', age=3, breed='Siamese', species='Cat'),
-            Pet(img='images/Persian.png', name='Nala', age=4, breed='Persian', species='Cat'),
-            Pet(img='images/Bengal.png', name='Tiger', age=2, breed='Bengal', species='Cat'),
-            Pet(img='images/Lop.png', name='Hazel', age=1, breed='Lop', species='Rabbit'),
-            Pet(img='images/Rex.png', name='Cinnamon', age=2, breed='Rex', species='Rabbit'),
-            Pet(img='images/Angora.png', name='Snowflake', age=2, breed='Angora', species='Rabbit'),
-            Pet(img='images/Macaw.png', name='Skye', age=2, breed='Macaw', species='Bird'),
-            Pet(img='images/Cockatiel.png', name='Sunny', age=1, breed='Cockatiel', species='Bird'),
-            Pet(img='images/Parakeet.png', name='Kiwi', age=2, breed='Parakeet', species='Bird'),
-            Pet(img='images/LeopardGecko.png', name='Leo', age=1, breed='Leopard Gecko', species='Reptile'),
-            Pet(img='images/BeardedDragon.png', name='Spike', age=3, breed='Bearded Dragon', species='Reptile'),
-            Pet(img='images/CornSnake.png', name='Slyther', age=2, breed='Corn Snake', species='Reptile'),
-            Pet(img='images/BoxTurtle.png', name='Shelly', age=4, breed='Box Turtle', species='Reptile'),
-            Pet(img='images/VeiledChameleon.png', name='Echo', age=2, breed='Veiled Chameleon', species='Reptile'),
-        ]
-        db.session.bulk_save_objects(pets_available)
-        db.session.commit()
+    per_page = clamp_page_size(request.args.get('per_page'))
+    sort = request.args.get('sort', 'id')
+    if sort not in SORT_KEYS:
+        sort = 'id'
+    facets = stats.facets()
 
-    
     if request.method == 'POST':
         first_name = request.form.get('first_name')
         surname = request.form.get('surname')
@@ -205,16 +239,19 @@ def list_pets():
         terms = request.form.get('terms') == 'on'
         flash('Thank you for contacting us!!')
 
-        pets = Pet.query.all()
-        species_options = [row[0] for row in db.session.query(distinct(Pet.species)).all()]
+        page = paginate(Pet.query, per_page=per_page)
         return render_template(
             'pets.html',
-            pets=pets,
+            pets=page.items,
+            page=page,
+            # The form posts to the unfiltered first page, whatever the query string
+            grid_key=('POST', per_page),
+            filter_args={},
+            facets=facets,
             name='',
             age='',
             breed='',
             selected_species='',
-            species_options=species_options,
             first_name=first_name,
             surname=surname,
             email=email,
@@ -223,38 +260,110 @@ def list_pets():
         )
 
     
-    name = request.args.get('name', '').strip()
-    age = request.args.get('age', '').strip()
-    breed = request.args.get('breed', '').strip()
-    species = request.args.get('species', '').strip()
-
-    query = Pet.query
-    if name:
-        query = query.filter(Pet.name.ilike(f"%{name}%"))
-    if age:
-        try:
-            query = query.filter(Pet.age == int(age))
-        except ValueError:
-            flash("Age must be a number", "filter")
-    if breed:
-        query = query.filter(Pet.breed.ilike(f"%{breed}%"))
-    if species:
-        query = query.filter(Pet.species == species)
+    filters = listing_args()
+    applied = filters
+    try:
+        query = search.filter_pets(Pet.query, **filters)
+    except ValueError:
+        flash("Age must be a number", "filter")
+        applied = dict(filters, age='')
+        query = search.filter_pets(Pet.query, **applied)
 
-    pets = query.all()
-    species_options = [row[0] for row in db.session.query(distinct(Pet.species)).all()]
+    cursor = (request.args.get('after'), request.args.get('before'))
+    try:
+        page = paginate(query, sort=sort, after=cursor[0], before=cursor[1], per_page=per_page)
+    except ValueError:
+        # A stale or hand-edited cursor just restarts from the first page
+        cursor = (None, None)
+        page = paginate(query, sort=sort, per_page=per_page)
+
+    filter_args = {key: value for key, value in filters.items() if value}
+    if sort != 'id':
+        filter_args['sort'] = sort
+    if 'per_page' in request.args:
+        filter_args['per_page'] = per_page
 
     return render_template(
         'pets.html',
-        pets=pets,
-        name=name,
-        age=age,
-        breed=breed,
-        selected_species=species,
-        species_options=species_options
+        pets=page.items,
+        page=page,
+        grid_key=('GET', sorted(applied.items()), sort, per_page, cursor),
+        filter_args=filter_args,
+        facets=facets,
+        name=filters['name'],
+        age=filters['age'],
+        breed=filters['breed'],
+        selected_species=filters['species'],
     )
 
 
+# JSON variant of the listing, same filters and cursors
+@pages.route('/pets.json')
+@read_only
+def list_pets_json():
+    try:
+        query = search.filter_pets(Pet.query, **listing_args())
+        page = paginate(query, sort=request.args.get('sort', 'id'), after=request.args.get('after'),
+                        before=request.args.get('before'),
+                        per_page=clamp_page_size(request.args.get('per_page')))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(
+        pets=[pet.to_dict() for pet in page.items],
+        per_page=page.per_page,
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
+    )
+
+
+# Pet counts per species, breed and age bucket
+@pages.route('/pets/facets.json')
+@read_only
+def pet_facets_json():
+    facets = stats.facets()
+    return jsonify(total=facets['total'], **{
+        facet: [{'value': value, 'count': count} for value, count in facets[facet]] for facet in stats.FACETS
+    })
+
+
+# Rank the whole catalogue against an adopter's preferences
+@pages.route('/match', methods=['GET', 'POST'])
+def match_pets():
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args
+    if data is None:
+        data = {}
+    try:
+        preferences = parse_preferences(data)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    results = match_engine.match(limit=clamp_page_size(request.args.get('limit', data.get('limit'))),
+                                 **preferences)
+    pets = {pet.id: pet for pet in Pet.query.filter(Pet.id.in_([pet_id for pet_id, _ in results]))}
+    return jsonify(matches=[
+        dict(pets[pet_id].to_dict(), score=round(score, 3)) for pet_id, score in results if pet_id in pets
+    ])
+
+
+# Relevance-ranked name/breed search
+@pages.route('/pets/search.json')
+@read_only
+def search_pets_json():
+    limit = clamp_page_size(request.args.get('limit'))
+    pets = search.ranked(request.args.get('q', ''), limit=limit)
+    return jsonify(pets=[pet.to_dict() for pet in pets])
+
+
+# Name and breed completions for the filter form
+@pages.route('/pets/suggest')
+def suggest_pets():
+    field = request.args.get('field')
+    fields = (field,) if field in ('name', 'breed') else ('name', 'breed')
+    suggestions = suggest_index.suggest(request.args.get('q', ''), fields,
+                                        limit=clamp_page_size(request.args.get('limit', 8)))
+    return jsonify({field: [{'value': value, 'count': count} for value, count in values]
+                    for field, values in suggestions.items()})
+
+
 # -------------------------------
 # Pet listing page end
 # -------------------------------
@@ -264,7 +373,9 @@ def list_pets():
 # -------------------------------
 
 
-@app.route('/add', methods=['GET', 'POST'])
+@pages.route('/add', methods=['GET', 'POST'])
+@admitted('uploads')
+@streamed_upload
 def add():
     if request.method == 'POST':
         try:
@@ -278,36 +389,24 @@ def add():
                 flash("No image selected", "error")
                 return redirect(request.url)
 
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                unique_filename = f"{uuid.uuid4().hex}_{filename}"
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                img_path = f'uploads/{unique_filename}'
-            else:
-                flash("Allowed image types: png, jpg, jpeg, gif", "error")
-                return redirect(request.url)
-
-            name = request.form.get('name')
-            age = request.form.get('age')
-            breed = request.form.get('breed')
-            species = request.form.get('species')
-
-            if not name or not age or not breed or not species:
-                flash("Please fill in all required fields!", "error")
-                return redirect(request.url)
-
+            # Check the fields before storing the photo, so a rejected pet
+            # leaves nothing behind (the streamed file is dropped at request end)
             try:
-                age = int(age)
-            except ValueError:
-                flash("Age must be a number", "error")
+                fields = validate_pet(request.form.to_dict())
+                fields['img'] = upload_store.save(file)
+            except ValueError as e:
+                flash(str(e), "error")
                 return redirect(request.url)
+            image_pipeline.submit(fields['img'])
 
-            new_pet = Pet(img=img_path, name=name, age=age, breed=breed, species=species)
+            new_pet = Pet(**fields)
             db.session.add(new_pet)
             db.session.commit()
-            flash(f"Pet '{name}' added successfully!", "success")
-            return redirect(url_for('list_pets'))
+            flash(f"Pet '{new_pet.name}' added successfully!", "success")
+            return redirect(url_for('pages.list_pets'))
+        except RequestEntityTooLarge:
+            flash(too_large(upload_store.max_bytes), "error")
+            return redirect(request.url)
         except Exception as e:
             flash(f"An error occurred: {str(e)}", "error")
             return redirect(request.url)
@@ -324,33 +423,40 @@ def add():
 # edit pets start 
 # -------------------------------
 
-@app.route('/edit/<int:pet_id>', methods=['GET', 'POST'])
+@pages.route('/edit/<int:pet_id>', methods=['GET', 'POST'])
+@admitted('uploads')
+@read_only
+@streamed_upload
 def edit_pet(pet_id):
     pet = Pet.query.get_or_404(pet_id)
 
     if request.method == 'POST':
         try:
-            pet.name = request.form['name']
-            pet.age = int(request.form['age'])
-            pet.breed = request.form['breed']
-            pet.species = request.form['species']
-
-            if 'image' in request.files:
-                image_file = request.files['image']
-                if image_file.filename != '' and allowed_file(image_file.filename):
-                    filename = secure_filename(image_file.filename)
-                    upload_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                    image_file.save(upload_path)
-                    pet.img = f'uploads/{filename}'
-                elif image_file.filename != '':
-                    flash("Invalid image type. Allowed: png, jpg, jpeg, gif", "error")
-                    return redirect(request.url)
+            # Same checks as /add, before the photo is stored or the pet touched
+            try:
+                fields = validate_pet(request.form.to_dict())
+                fields['img'] = pet.img
+                image_file = request.files.get('image')
+                if image_file is not None and image_file.filename != '':
+                    fields['img'] = upload_store.save(image_file)
+            except ValueError as e:
+                flash(str(e), "error")
+                return redirect(request.url)
 
+            old_img = pet.img
+            for key, value in fields.items():
+                setattr(pet, key, value)
+            if pet.img != old_img:
+                image_pipeline.submit(pet.img)
             db.session.commit()
+            if pet.img != old_img:
+                upload_store.release(old_img)
             flash('Pet updated successfully!', 'success')
-            return redirect(url_for('list_pets'))
+            return redirect(url_for('pages.list_pets'))
 
+        except RequestEntityTooLarge:
+            flash(too_large(upload_store.max_bytes), "error")
+            return redirect(request.url)
         except Exception as e:
             flash(f"An error occurred while updating: {str(e)}", "error")
             return redirect(request.url)
@@ -360,13 +466,14 @@ def edit_pet(pet_id):
 
 
 
-@app.route('/delete_pet/<int:pet_id>', methods=['POST'])
+@pages.route('/delete_pet/<int:pet_id>', methods=['POST'])
 def delete_pet(pet_id):
     pet = Pet.query.get_or_404(pet_id)
     db.session.delete(pet)
     db.session.commit()
+    upload_store.release(pet.img)
     flash(f"Deleted pet {pet.name}", "success")
-    return redirect(url_for('list_pets'))
+    return redirect(url_for('pages.list_pets'))
 
 # -------------------------------
 # edit pets end
@@ -377,7 +484,8 @@ def delete_pet(pet_id):
 
 
 # About page 
-@app.route('/about', methods=['GET', 'POST'])
+@pages.route('/about', methods=['GET', 'POST'])
+@conditional(catalog=True, static=True)
 def about():
     sections = [
         {
@@ -421,7 +529,7 @@ def about():
         flash('Thank you for contacting us!!')
         return render_template(
             'about.html',
-            form_action=url_for('about'),
+            form_action=url_for('pages.about'),
             first_name=first_name,
             surname=surname,
             email=email,
@@ -432,12 +540,13 @@ def about():
 
     return render_template(
         'about.html',
-        form_action=url_for('about'),
+        form_action=url_for('pages.about'),
         sections=sections
     )
 
 # Contact page with form that saves submission to DB
-@app.route('/contact', methods=['GET', 'POST'])
+@pages.route('/contact', methods=['GET', 'POST'])
+@admitted('forms')
 def contact():
     if request.method == 'POST':
         first_name = request.form.get('first_name')
@@ -445,15 +554,19 @@ def contact():
         email = request.form.get('email')
         message = request.form.get('message')
         terms = request.form.get('terms') == 'on'
-        submission = Submission(first_name=first_name, surname=surname, email=email, message=message, terms=terms)
-        db.session.add(submission)
-        db.session.commit()
+        try:
+            submission_queue.submit(first_name=first_name, surname=surname, email=email, message=message, terms=terms)
+        except ValueError as e:
+            flash(str(e))
+            return redirect(url_for('pages.contact'))
         flash('Thank you for contacting us!!')
-        return redirect(url_for('contact'))
+        return redirect(url_for('pages.contact'))
     return render_template('contact.html')
 
 # FAQ page with contact form (stores submissions)
-@app.route('/faq', methods=['GET', 'POST'])
+@pages.route('/faq', methods=['GET', 'POST'])
+@admitted('forms')
+@conditional(static=True)
 def faq():
     if request.method == 'POST':
         first_name = request.form.get('first_name')
@@ -461,18 +574,22 @@ def faq():
         email = request.form.get('email')
         message = request.form.get('message')
         terms = request.form.get('terms') == 'on'
-        submission = Submission(first_name=first_name, surname=surname, email=email, message=message, terms=terms)
-        db.session.add(submission)
-        db.session.commit()
+        try:
+            submission_queue.submit(first_name=first_name, surname=surname, email=email, message=message, terms=terms)
+        except ValueError as e:
+            flash(str(e))
+            return render_template('faq.html', form_action=url_for('pages.faq'))
         flash('Thank you for contacting us!!')
-        return render_template('faq.html', form_action=url_for('faq'), first_name=first_name, surname=surname, email=email, message=message, terms=terms)
-    return render_template('faq.html', form_action=url_for('faq'))
+        return render_template('faq.html', form_action=url_for('pages.faq'), first_name=first_name, surname=surname, email=email, message=message, terms=terms)
+    return render_template('faq.html', form_action=url_for('pages.faq'))
 
 
 
 # -------------------------------
 # Run the app
 # -------------------------------
+app = create_app()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,162 @@
+"""Optional ASGI entry point.
+
+    uvicorn asgi:application --workers 2
+
+The default deployment (`gunicorn app:app`) is unchanged. Under an ASGI
+server:
+
+* `/pets.json` is answered natively on the event loop through an async
+  SQLAlchemy engine (aiosqlite / asyncpg), so a slow database round-trip
+  parks a coroutine instead of a worker;
+* dog facts are refreshed on the same loop with httpx instead of on a
+  thread, so no request ever waits for dogapi.dog;
+* contact/FAQ submissions, already off the request path in the write-behind
+  queue (submissions.py), are inserted through the same async engine;
+* every other route goes to the Flask app unchanged, on a pool of
+  `ASGI_THREADS` threads (a2wsgi), so up to that many run at once. Request
+  bodies are streamed to the app as they arrive, so uploads still go straight
+  to disk (storage.py).
+"""
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import config
+import search
+from app import app as flask_app
+from models import db, Pet
+from pagination import clamp_page_size, make_page, page_query
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+
+def async_database_url(url):
+    """`url` (a SQLAlchemy URL, with any relative SQLite path already resolved
+    by Flask-SQLAlchemy) with the async driver of its backend."""
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise RuntimeError(f"No async driver configured for {url.drivername}")
+    return url.set(drivername=driver)
+
+
+def async_engine_options(options, url):
+    """The sync engine's options, with psycopg2's `connect_args` given their
+    asyncpg names; per-connection settings are applied by config.tune_engine."""
+    options = dict(options, connect_args=dict(options.get('connect_args', {})))
+    if url.get_backend_name() == 'postgresql':
+        connect_args = options['connect_args']
+        if 'connect_timeout' in connect_args:
+            connect_args['timeout'] = connect_args.pop('connect_timeout')
+        # `-c name=value` server settings
+        flags = connect_args.pop('options', '').split()
+        settings = dict(flag.split('=', 1) for flag in flags[1::2] if '=' in flag)
+        if settings:
+            connect_args['server_settings'] = dict(connect_args.get('server_settings', {}), **settings)
+    return options
+
+
+class AsyncApp:
+    def __init__(self, app):
+        self.app = app
+        app.config.setdefault('ASGI_THREADS', int(os.getenv('ASGI_THREADS', 16)))
+        self.wsgi = WSGIMiddleware(app, workers=app.config['ASGI_THREADS'])
+        self.engine = None
+        self.session = None
+        self.routes = {
+            '/pets.json': self.list_pets_json,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        handler = self.routes.get(scope['path']) if scope['type'] == 'http' else None
+        if handler is None or scope['method'] not in ('GET', 'HEAD'):
+            return await self.wsgi(scope, receive, send)
+        await handler(scope, send)
+
+    # --- Lifecycle ---
+
+    async def startup(self):
+        with self.app.app_context():
+            # The primary's URL, with a relative SQLite path under the instance folder
+            url = db.engine.url
+        async_url = async_database_url(url)
+        self.engine = create_async_engine(async_url, **async_engine_options(
+            self.app.config['SQLALCHEMY_ENGINE_OPTIONS'], async_url))
+        config.tune_engine(self.engine.sync_engine, self.app.config)
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        # Look up the search index now, so filtering never connects on the loop
+        async with self.engine.connect() as connection:
+            await connection.run_sync(search.detect_index, str(url))
+        loop = asyncio.get_running_loop()
+        self.app.extensions['dog_facts'].use_event_loop(loop)
+        self.app.extensions['submission_queue'].use_async_session(loop, self.session)
+
+    async def shutdown(self):
+        await self.app.extensions['dog_facts'].close_async()
+        await self.app.extensions['submission_queue'].close_async()
+        self.wsgi.executor.shutdown(wait=False)
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- Native routes ---
+
+    async def send_json(self, send, data, status=200):
+        body = json.dumps(data).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def list_pets_json(self, scope, send):
+        """Same filters, cursors and response as the Flask `/pets.json`."""
+        args = {key: values[-1] for key, values in parse_qs(scope['query_string'].decode('latin-1')).items()}
+        sort = args.get('sort', 'id')
+        after, before = args.get('after'), args.get('before')
+        per_page = clamp_page_size(args.get('per_page'))
+        try:
+            # match() looks at the engine's dialect; the index was checked at startup
+            with self.app.app_context():
+                query = search.filter_pets(select(Pet), **{key: args.get(key, '').strip()
+                                                           for key in search.FILTER_KEYS})
+            statement = page_query(query, sort, after, before, per_page)
+        except ValueError as e:
+            return await self.send_json(send, {'error': str(e)}, 400)
+
+        async with self.session() as session:
+            rows = (await session.execute(statement)).scalars().all()
+            page = make_page(rows, sort, after, before, per_page)
+            if page is None:
+                rows = (await session.execute(page_query(query, sort, per_page=per_page))).scalars().all()
+                page = make_page(rows, sort, per_page=per_page)
+        await self.send_json(send, {
+            'pets': [pet.to_dict() for pet in page.items],
+            'per_page': page.per_page,
+            'next_cursor': page.next_cursor,
+            'prev_cursor': page.prev_cursor,
+        })
+
+
+application = AsyncApp(flask_app)
@@ -0,0 +1,201 @@
+"""Fingerprinted, precompressed static assets.
+
+    flask assets build
+
+copies every file under `static/css`, `static/js` and `static/images` to
+`static/dist/<dir>/<name>.<hash>.<ext>`, named by the SHA-256 of its content,
+writes `.br` and `.gz` copies of the text files (CSS, JS, SVG, ...) and
+records `{source path: fingerprinted path}` in `static/dist/manifest.json`.
+
+Once the manifest exists, `url_for('static', filename='css/style.css')`
+returns the fingerprinted URL, so templates need no changes. Fingerprinted
+files are served with `Cache-Control: immutable` and a year's max-age: a new
+build changes the URL, never the file. The static view sends the Brotli or
+gzip copy when the browser accepts it, so nothing is compressed per request.
+Derived photos and uploads are content-addressed already and get the same
+caching. Files of earlier builds are kept, for pages cached before a deploy.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+
+import click
+from flask import current_app, request, send_from_directory
+from flask.cli import AppGroup
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - Brotli is optional
+    brotli = None
+
+SOURCE_DIRS = ('css', 'js', 'images')
+OUTPUT_DIR = 'dist'
+MANIFEST = 'manifest.json'
+COMPRESSIBLE = {'.css', '.js', '.mjs', '.svg', '.json', '.txt', '.xml', '.html', '.map', '.ico'}
+# Static paths whose names are content hashes already (images.py, storage.py)
+CONTENT_ADDRESSED = ('derived/', 'uploads/')
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(data)
+    os.replace(tmp_path, path)
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def build(static_folder):
+    """Fingerprint and compress every source asset; returns `(manifest, stats)`."""
+    manifest = {}
+    stats = {'files': 0, 'written': 0, 'bytes': 0, 'compressed_bytes': {}}
+    for source_dir in SOURCE_DIRS:
+        root = os.path.join(static_folder, source_dir)
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.startswith('.'):
+                    continue
+                source = os.path.join(dirpath, filename)
+                rel = os.path.relpath(source, static_folder).replace(os.sep, '/')
+                stem, ext = os.path.splitext(rel)
+                hashed = f"{OUTPUT_DIR}/{stem}.{fingerprint(source)}{ext}"
+                manifest[rel] = hashed
+                stats['files'] += 1
+
+                target = os.path.join(static_folder, hashed)
+                if os.path.exists(target):
+                    continue
+                with open(source, 'rb') as fh:
+                    data = fh.read()
+                _write_atomic(target, data)
+                stats['written'] += 1
+                stats['bytes'] += len(data)
+                if ext.lower() not in COMPRESSIBLE:
+                    continue
+                for encoding, suffix in ENCODINGS:
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    compressed = _compress(data, encoding)
+                    # Not worth a file (or a Content-Encoding) if it does not shrink
+                    if len(compressed) < len(data):
+                        _write_atomic(target + suffix, compressed)
+                        stats['compressed_bytes'][encoding] = \
+                            stats['compressed_bytes'].get(encoding, 0) + len(compressed)
+    _write_atomic(os.path.join(static_folder, OUTPUT_DIR, MANIFEST),
+                  json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest, stats
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.hashed = {}
+        self.version = ''
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_ENABLED', os.getenv('ASSETS_ENABLED', '1') == '1')
+        app.config.setdefault('ASSETS_MAX_AGE', int(os.getenv('ASSETS_MAX_AGE', 365 * 24 * 3600)))
+        self.static_folder = app.static_folder
+        self.max_age = app.config['ASSETS_MAX_AGE']
+        if app.config['ASSETS_ENABLED']:
+            self.load()
+        app.url_defaults(self._fingerprinted_url)
+        app.view_functions['static'] = self.serve
+        app.extensions['assets'] = self
+        app.cli.add_command(assets_cli)
+
+    def load(self):
+        """Read the manifest written by `flask assets build`, if there is one."""
+        path = os.path.join(self.static_folder, OUTPUT_DIR, MANIFEST)
+        try:
+            with open(path, 'rb') as fh:
+                raw = fh.read()
+        except FileNotFoundError:
+            return
+        self.manifest = json.loads(raw)
+        # Fingerprinted path -> precompressed copies that exist on disk
+        self.hashed = {
+            hashed: [(encoding, suffix) for encoding, suffix in ENCODINGS
+                     if os.path.exists(os.path.join(self.static_folder, hashed + suffix))]
+            for hashed in self.manifest.values()
+        }
+        # Folded into page ETags and fragment keys (caching.py), since the
+        # markup changes with the asset URLs
+        self.version = hashlib.sha1(raw).hexdigest()[:12]
+
+    def _fingerprinted_url(self, endpoint, values):
+        if endpoint == 'static' and self.manifest:
+            hashed = self.manifest.get(values.get('filename'))
+            if hashed is not None:
+                values['filename'] = hashed
+
+    # --- Serving ---
+
+    def serve(self, filename):
+        encodings = self.hashed.get(filename)
+        if encodings is None:
+            response = current_app.send_static_file(filename)
+            if filename.startswith(CONTENT_ADDRESSED):
+                self._immutable(response)
+            return response
+
+        response = None
+        for encoding, suffix in encodings:
+            if request.accept_encodings[encoding]:
+                response = send_from_directory(self.static_folder, filename + suffix,
+                                               mimetype=mimetypes.guess_type(filename)[0])
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = current_app.send_static_file(filename)
+        if encodings:
+            response.vary.add('Accept-Encoding')
+        return self._immutable(response)
+
+    def _immutable(self, response):
+        if response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+            response.cache_control.immutable = True
+        return response
+
+
+# -------------------------------
+# CLI: flask assets ...
+# -------------------------------
+assets_cli = AppGroup('assets', help="Build fingerprinted, precompressed static assets.")
+
+
+@assets_cli.command('build')
+def build_command():
+    """Fingerprint and precompress static/css, static/js and static/images."""
+    manifest, stats = build(current_app.static_folder)
+    current_app.extensions['assets'].load()
+    compressed = ', '.join(f"{encoding} {size / 1024:.0f} KB"
+                           for encoding, size in sorted(stats['compressed_bytes'].items())) or 'none'
+    click.echo(f"{stats['files']} assets, {stats['written']} new ({stats['bytes'] / 1024:.0f} KB); "
+               f"precompressed: {compressed}.")
+    if brotli is None:
+        click.echo("Brotli is not installed: only gzip copies were written.")
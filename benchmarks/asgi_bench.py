@@ -0,0 +1,146 @@
+"""Compare sync gunicorn with the ASGI mode against a slow dog facts API.
+
+    python benchmarks/asgi_bench.py --pets 100k --delay 0.2 --concurrency 1,8,32
+    python benchmarks/asgi_bench.py --workers 4 --requests 400 --json asgi.json
+
+The facts stub answers after `--delay` seconds. Both servers run with the
+same number of workers and the app's default configuration, so in both modes
+facts are refreshed off the request path and pages render from the cached
+pool. For each concurrency level it reports p50/p95/p99 latency and
+throughput of `/about` (templates + facts), `/pets.json` (async database
+session under uvicorn) and `/pets` (the Flask app in both modes).
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dogapi_stub import serve as serve_stub
+from loadtest import free_port, parse_count, summarize
+from search_bench import fill
+
+PATHS = {
+    'about': '/about',
+    'pets.json': '/pets.json?species=Dog&per_page=20',
+    'pets': '/pets?species=Dog',
+}
+
+
+def server_command(mode, port, workers):
+    bind = f'127.0.0.1:{port}'
+    if mode == 'gunicorn':
+        return [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', bind, '--log-level', 'warning', 'app:app']
+    return [sys.executable, '-m', 'uvicorn', '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port),
+            '--log-level', 'warning', 'asgi:application']
+
+
+def wait_until_up(base, server):
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            urllib.request.urlopen(f'{base}/faq', timeout=5).read()
+            return
+        except (urllib.error.URLError, ConnectionError):
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise RuntimeError("server did not start")
+            time.sleep(0.2)
+
+
+def drive(url, requests, concurrency):
+    lock = threading.Lock()
+    samples, errors = [], 0
+
+    def worker(count):
+        nonlocal errors
+        for _ in range(count):
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    response.read()
+                    failed = False
+            except (urllib.error.URLError, ConnectionError):
+                failed = True
+            with lock:
+                samples.append(time.perf_counter() - t0)
+                errors += failed
+
+    shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, shares))
+    return samples, errors, time.perf_counter() - started
+
+
+def run(mode, workers, levels, requests, env):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(server_command(mode, port, workers), cwd=ROOT, env=env)
+    try:
+        wait_until_up(base, server)
+        results = []
+        for name, path in PATHS.items():
+            for _ in range(workers * 2):  # warm up every worker
+                urllib.request.urlopen(base + path, timeout=60).read()
+            for concurrency in levels:
+                samples, errors, wall = drive(base + path, requests, concurrency)
+                row = summarize(name, 'GET', path, samples, errors, wall)
+                row['concurrency'] = concurrency
+                results.append(row)
+                print(f"{mode:<9} {name:<10} {concurrency:>5} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+                      f"{row['p99_ms']:>9.1f} {row['rps']:>9.1f} {errors:>7}")
+        return results
+    finally:
+        server.terminate()
+        server.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', default='10k', help="catalogue size, e.g. 10k, 100k, 1m")
+    parser.add_argument('--delay', type=float, default=0.2, help="seconds the facts stub takes to answer")
+    parser.add_argument('--workers', type=int, default=2, help="workers for both servers")
+    parser.add_argument('--concurrency', default='1,8,32', help="client threads, comma-separated levels")
+    parser.add_argument('--requests', type=int, default=200, help="requests per path and level")
+    parser.add_argument('--mode', choices=['gunicorn', 'uvicorn', 'both'], default='both')
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-asgi-')
+    stub = serve_stub(delay=args.delay)
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'asgi.db')}",
+               DOG_FACTS_URL=f"http://127.0.0.1:{stub.server_port}/api/v2/facts",
+               DOG_FACTS_CACHE_FILE=os.path.join(tmpdir, 'dog_facts.json'),
+               HTTP_CACHE_ENABLED='0')
+    os.environ.update(env)
+
+    pets = parse_count(args.pets)
+    print(f"Seeding {pets} pets...", file=sys.stderr)
+    from app import app
+    fill(app, pets)
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    modes = ['gunicorn', 'uvicorn'] if args.mode == 'both' else [args.mode]
+    print(f"{'server':<9} {'path':<10} {'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} "
+          f"{'errors':>7}   ({args.workers} workers, stub delay {args.delay}s)")
+    output = {
+        'meta': {'pets': pets, 'delay': args.delay, 'workers': args.workers, 'requests': args.requests},
+        'modes': {mode: run(mode, args.workers, levels, args.requests, env) for mode in modes},
+    }
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(output, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
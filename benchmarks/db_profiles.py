@@ -0,0 +1,144 @@
+"""Concurrent read/write throughput under each database engine profile.
+
+    python benchmarks/db_profiles.py --pets 100k --readers 4 --writers 2 --seconds 10
+    python benchmarks/db_profiles.py --database-url postgresql://localhost/pawfect_bench
+
+For each `DB_PROFILE` (`stock`, `tuned`) a fresh database is filled with
+synthetic pets, then `--readers` processes page through the filtered listing
+while `--writers` processes edit random pets through the ORM (so every write
+also bumps the catalogue version, the facet counts and the change log, as a
+real edit does). Each process runs for `--seconds`; the table shows
+operations per second, p50/p95 latency and failed operations (e.g.
+"database is locked") per role. With `--database-url` both profiles share
+that database and the pet table is emptied first!
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROFILES = ('stock', 'tuned')
+
+
+def _app(env):
+    os.environ.update(env)
+    from app import app
+    return app
+
+
+def seed(env, pets):
+    from search_bench import fill
+    fill(_app(env), pets)
+
+
+def work(env, role, seconds, seed_value, results):
+    app = _app(env)
+    from models import db, Pet
+    from pagination import paginate
+    import search
+
+    rng = random.Random(seed_value)
+    samples, errors = [], 0
+    with app.app_context():
+        top = db.session.query(db.func.max(Pet.id)).scalar()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                if role == 'read':
+                    query = search.filter_pets(Pet.query, species=rng.choice(['Dog', 'Cat', 'Bird']))
+                    page = paginate(query, per_page=24)
+                    if page.next_cursor:
+                        paginate(query, after=page.next_cursor, per_page=24)
+                else:
+                    pet = db.session.get(Pet, rng.randint(1, top))
+                    if pet is not None:
+                        pet.age = rng.randint(0, 15)
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                errors += 1
+                continue
+            finally:
+                db.session.remove()
+            samples.append(time.perf_counter() - t0)
+    results.put((role, samples, errors, seconds))
+
+
+def run(profile, database_url, pets, readers, writers, seconds):
+    env = {
+        'DATABASE_URL': database_url,
+        'DB_PROFILE': profile,
+        'DOG_FACTS_BACKGROUND': '0',
+        'SUBMISSION_QUEUE_MODE': 'sync',
+        'FRAGMENT_CACHE_ENABLED': '0',
+    }
+    ctx = multiprocessing.get_context('spawn')
+    seeder = ctx.Process(target=seed, args=(env, pets))
+    seeder.start()
+    seeder.join()
+
+    results = ctx.Queue()
+    processes = [ctx.Process(target=work, args=(env, role, seconds, i, results))
+                 for i, role in enumerate(['read'] * readers + ['write'] * writers)]
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    rows = []
+    for role in ('read', 'write'):
+        samples = sorted(s for r, batch, _, _ in collected if r == role for s in batch)
+        errors = sum(e for r, _, e, _ in collected if r == role)
+        if not samples and not errors:
+            continue
+        cuts = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+        row = {
+            'profile': profile,
+            'role': role,
+            'ops': len(samples),
+            'ops_per_s': len(samples) / seconds,
+            'p50_ms': cuts[49] * 1000 if samples else 0.0,
+            'p95_ms': cuts[94] * 1000 if samples else 0.0,
+            'errors': errors,
+        }
+        rows.append(row)
+        print(f"{profile:<7} {role:<6} {row['ops_per_s']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} "
+              f"{errors:>7}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', type=int, default=100000)
+    parser.add_argument('--readers', type=int, default=4, help="reader processes")
+    parser.add_argument('--writers', type=int, default=2, help="writer processes")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--database-url', help="defaults to a fresh SQLite file per profile")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-db-')
+    print(f"{'profile':<7} {'role':<6} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}   "
+          f"({args.readers} readers, {args.writers} writers, {args.pets} pets)")
+    results = []
+    for profile in args.profiles.split(','):
+        url = args.database_url or f"sqlite:///{os.path.join(tmpdir, f'{profile}.db')}"
+        results += run(profile, url, args.pets, args.readers, args.writers, args.seconds)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
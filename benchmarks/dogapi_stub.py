@@ -0,0 +1,72 @@
+"""Local stand-in for dogapi.dog's /api/v2/facts endpoint.
+
+    python benchmarks/dogapi_stub.py --port 8099 --delay 0.5 --fail-rate 0.2
+    DOG_FACTS_URL=http://127.0.0.1:8099/api/v2/facts flask run
+
+Useful for exercising the facts provider's timeout, circuit breaker and
+fallback behaviour without depending on the real API.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    fail_rate = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/api/v2/facts':
+            self.send_error(404)
+            return
+        time.sleep(self.delay)
+        if random.random() < self.fail_rate:
+            self.send_error(503)
+            return
+        limit = int(parse_qs(url.query).get('limit', ['3'])[0])
+        body = json.dumps({
+            'data': [
+                {'id': str(i), 'type': 'fact', 'attributes': {'body': f"Stub dog fact number {i}."}}
+                for i in range(limit)
+            ]
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, delay=0.0, fail_rate=0.0):
+    """Start the stub on a background thread and return the server.
+
+    The facts URL is `http://127.0.0.1:{server.server_port}/api/v2/facts`.
+    """
+    handler = type('ConfiguredStubHandler', (StubHandler,), {'delay': delay, 'fail_rate': fail_rate})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds to sleep before answering")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    args = parser.parse_args()
+    server = serve(args.port, args.delay, args.fail_rate)
+    print(f"Stub dog facts API on http://127.0.0.1:{server.server_port}/api/v2/facts")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,334 @@
+"""Load test every route against a synthetic catalogue.
+
+    python benchmarks/loadtest.py --pets 100k --requests 200 --json results.json
+    python benchmarks/loadtest.py --pets 1m --mode gunicorn --workers 4 --concurrency 16
+    python benchmarks/loadtest.py --pets 100k --compare results.json
+
+A throwaway SQLite database is filled with `--pets` synthetic pets and
+`--submissions` contact submissions, the dog facts API is replaced by the
+local stub, and each scenario below is driven `--requests` times through the
+Flask test client (in a fresh process) and/or a local gunicorn. For every
+scenario it reports p50/p95/p99 latency and throughput, plus peak RSS per
+mode. `--json` writes the results; `--compare` checks them against an
+earlier file and exits non-zero if any p95 got slower than `--threshold`.
+"""
+import argparse
+import concurrent.futures
+import io
+import itertools
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dogapi_stub import serve as serve_stub
+from search_bench import fill
+
+IMAGE = os.path.join(ROOT, 'static', 'images', 'Beagle.png')
+
+# One value per listing filter; /pets is hit with every combination of them
+FILTERS = {'name': 'char', 'age': '3', 'breed': 'retr', 'species': 'Dog'}
+
+CONTACT_FORM = {'first_name': 'Load', 'surname': 'Test', 'email': 'load@example.com',
+                'message': 'Benchmark submission', 'terms': 'on'}
+PET_FORM = {'name': 'Bench', 'age': '3', 'breed': 'Beagle', 'species': 'Dog'}
+
+
+def parse_count(value):
+    value = value.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(value[-1:], 1)
+    return int(float(value.rstrip('km')) * multiplier)
+
+
+def scenarios():
+    """Yield `(name, method, path, form, with_image)` for every benchmarked request."""
+    yield 'home', 'GET', '/', None, False
+    for size in range(len(FILTERS) + 1):
+        for keys in itertools.combinations(FILTERS, size):
+            query = '&'.join(f"{key}={FILTERS[key]}" for key in keys)
+            yield f"pets[{','.join(keys) or 'all'}]", 'GET', f"/pets?{query}" if query else '/pets', None, False
+    yield 'add', 'GET', '/add', None, False
+    yield 'add:post', 'POST', '/add', PET_FORM, True
+    yield 'edit', 'GET', '/edit/1', None, False
+    yield 'edit:post', 'POST', '/edit/1', PET_FORM, False
+    yield 'contact', 'GET', '/contact', None, False
+    yield 'contact:post', 'POST', '/contact', CONTACT_FORM, False
+    yield 'faq', 'GET', '/faq', None, False
+    yield 'faq:post', 'POST', '/faq', CONTACT_FORM, False
+
+
+def summarize(name, method, path, samples, errors, wall):
+    samples = sorted(samples)
+    cuts = statistics.quantiles(samples, n=100, method='inclusive') if len(samples) > 1 else samples * 99
+    return {
+        'scenario': name,
+        'method': method,
+        'path': path,
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': cuts[49] * 1000,
+        'p95_ms': cuts[94] * 1000,
+        'p99_ms': cuts[98] * 1000,
+        'rps': len(samples) / wall if wall else 0.0,
+    }
+
+
+# -------------------------------
+# Seeding
+# -------------------------------
+def seed(pets, submissions, batch=10000):
+    from sqlalchemy import insert
+    from app import app
+    from models import db, Submission
+
+    fill(app, pets)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(Submission.__table__.delete())
+            for start in range(0, submissions, batch):
+                connection.execute(insert(Submission), [
+                    dict(CONTACT_FORM, terms=True, message=f"Seeded submission {i}")
+                    for i in range(start, min(start + batch, submissions))
+                ])
+
+
+# -------------------------------
+# Flask test client (runs in a child process so RSS is its own)
+# -------------------------------
+def run_test_client(requests):
+    from app import app
+
+    client = app.test_client()
+    with open(IMAGE, 'rb') as fh:
+        image = fh.read()
+    results = []
+    for name, method, path, form, with_image in scenarios():
+        def call():
+            if method == 'GET':
+                return client.get(path)
+            data = dict(form)
+            if with_image:
+                data['image'] = (io.BytesIO(image), 'bench.png')
+            return client.post(path, data=data)
+
+        call()  # warm up
+        samples, errors = [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            response = call()
+            samples.append(time.perf_counter() - t0)
+            errors += response.status_code >= 400
+        results.append(summarize(name, method, path, samples, errors, time.perf_counter() - started))
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'results': results, 'peak_rss_mb': peak_rss_mb}))
+
+
+# -------------------------------
+# gunicorn over HTTP
+# -------------------------------
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None  # time the POST itself, not the page it redirects to
+
+
+def encode_multipart(form, image):
+    boundary = uuid.uuid4().hex
+    parts = []
+    for key, value in form.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+    if image is not None:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="bench.png"\r\n'
+                     f'Content-Type: image/png\r\n\r\n'.encode() + image + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_tree(pid):
+    """Sum of VmHWM over a process and its children, in MB (Linux only)."""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as fh:
+            pids += [int(child) for child in fh.read().split()]
+    except OSError:
+        return None
+    total_kb = 0
+    for child in pids:
+        try:
+            with open(f'/proc/{child}/status') as fh:
+                total_kb += next(int(line.split()[1]) for line in fh if line.startswith('VmHWM:'))
+        except (OSError, StopIteration):
+            continue
+    return total_kb / 1024
+
+
+def run_gunicorn(requests, workers, concurrency, env):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+                               '--log-level', 'warning', 'app:app'], cwd=ROOT, env=env)
+    opener = urllib.request.build_opener(_NoRedirect)
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                opener.open(f'{base}/about', timeout=5).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.2)
+
+        with open(IMAGE, 'rb') as fh:
+            image = fh.read()
+        results = []
+        for name, method, path, form, with_image in scenarios():
+            def call():
+                data, headers = None, {}
+                if method == 'POST':
+                    data, content_type = encode_multipart(form, image if with_image else None)
+                    headers['Content-Type'] = content_type
+                request = urllib.request.Request(base + path, data=data, headers=headers, method=method)
+                t0 = time.perf_counter()
+                try:
+                    with opener.open(request, timeout=60) as response:
+                        response.read()
+                        status = response.status
+                except urllib.error.HTTPError as e:
+                    status = e.code
+                except (urllib.error.URLError, ConnectionError):
+                    status = 599
+                return time.perf_counter() - t0, status
+
+            for _ in range(workers):  # warm up every worker
+                call()
+            lock = threading.Lock()
+            samples, errors = [], 0
+
+            def worker(count):
+                nonlocal errors
+                for _ in range(count):
+                    seconds, status = call()
+                    with lock:
+                        samples.append(seconds)
+                        errors += status >= 400
+
+            shares = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+            started = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(worker, shares))
+            results.append(summarize(name, method, path, samples, errors, time.perf_counter() - started))
+        return {'results': results, 'peak_rss_mb': peak_rss_tree(server.pid)}
+    finally:
+        server.terminate()
+        server.wait(30)
+
+
+# -------------------------------
+# Reporting
+# -------------------------------
+def print_table(mode, run):
+    print(f"\n{mode}  (peak RSS {run['peak_rss_mb'] or 0:.0f} MB)")
+    print(f"{'scenario':<34} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+    for row in run['results']:
+        print(f"{row['scenario']:<34} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+              f"{row['rps']:>9.1f} {row['errors']:>7}")
+
+
+def compare(current, baseline_path, threshold):
+    with open(baseline_path) as fh:
+        baseline = json.load(fh)
+    regressions = []
+    for mode, run in current['modes'].items():
+        before = {row['scenario']: row for row in baseline.get('modes', {}).get(mode, {}).get('results', [])}
+        for row in run['results']:
+            old = before.get(row['scenario'])
+            if old and old['p95_ms'] and row['p95_ms'] > old['p95_ms'] * (1 + threshold):
+                regressions.append((mode, row['scenario'], old['p95_ms'], row['p95_ms']))
+    for mode, scenario, old, new in regressions:
+        print(f"REGRESSION {mode} {scenario}: p95 {old:.2f} -> {new:.2f} ms ({new / old - 1:+.0%})")
+    if not regressions:
+        print(f"No p95 regressions beyond {threshold:.0%} against {baseline_path}.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', default='1k', help="catalogue size, e.g. 1k, 100k, 1m")
+    parser.add_argument('--submissions', default='10k')
+    parser.add_argument('--requests', type=int, default=200, help="requests per scenario")
+    parser.add_argument('--mode', choices=['testclient', 'gunicorn', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads against gunicorn")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', help="earlier --json output to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed p95 slowdown for --compare")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_test_client(args.requests)
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-load-')
+    stub = serve_stub()
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'load.db')}",
+               DOG_FACTS_URL=f"http://127.0.0.1:{stub.server_port}/api/v2/facts",
+               DOG_FACTS_CACHE_FILE=os.path.join(tmpdir, 'dog_facts.json'))
+    os.environ.update(env)
+
+    pets, submissions = parse_count(args.pets), parse_count(args.submissions)
+    print(f"Seeding {pets} pets and {submissions} submissions...", file=sys.stderr)
+    seed(pets, submissions)
+
+    output = {
+        'meta': {
+            'pets': pets,
+            'submissions': submissions,
+            'requests': args.requests,
+            'workers': args.workers,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'commit': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                     capture_output=True, text=True).stdout.strip(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'modes': {},
+    }
+    if args.mode in ('testclient', 'both'):
+        stdout = subprocess.run([sys.executable, __file__, '--child', '--requests', str(args.requests)],
+                                env=env, capture_output=True, text=True, check=True, cwd=ROOT).stdout
+        output['modes']['testclient'] = json.loads(stdout.strip().splitlines()[-1])
+        print_table('testclient', output['modes']['testclient'])
+    if args.mode in ('gunicorn', 'both'):
+        output['modes']['gunicorn'] = run_gunicorn(args.requests, args.workers, args.concurrency, env)
+        print_table(f'gunicorn ({args.workers} workers, {args.concurrency} clients)', output['modes']['gunicorn'])
+
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(output, fh, indent=2)
+    if args.compare and compare(output, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
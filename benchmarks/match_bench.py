@@ -0,0 +1,101 @@
+"""Time /match scoring and top-k over synthetic catalogues.
+
+    python benchmarks/match_bench.py --sizes 10000,100000,1000000
+
+For each size a throwaway SQLite database is filled with synthetic pets, the
+NumPy snapshot is loaded once, and a few preference profiles are scored and
+ranked (median of `--repeat` runs). It also times catching the snapshot up
+after a single edit, which is what a worker pays after each mutation.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_bench import fill
+
+PROFILES = {
+    'species+age': {'species': ['Dog'], 'min_age': 2, 'max_age': 4},
+    'breeds': {'breeds': {'retriever': 1.0, 'collie': 0.6, 'beagle': 0.3}},
+    'terms': {'terms': ['char', 'lu']},
+    'everything': {'species': ['Dog', 'Cat'], 'min_age': 1, 'max_age': 5,
+                   'breeds': {'retriever': 1.0, 'tabby': 0.5}, 'terms': ['char']},
+}
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(app, sizes, repeat, k):
+    from models import db, Pet
+    import matching
+
+    results = []
+    for size in sizes:
+        fill(app, size)
+        with app.app_context():
+            with db.engine.connect() as connection:
+                started = time.perf_counter()
+                snapshot = matching.load_snapshot(connection)
+                load_s = time.perf_counter() - started
+
+            engine = app.extensions['matching']
+            engine._snapshot = snapshot
+            pet = db.session.get(Pet, 1)
+            pet.age = (pet.age + 1) % 15
+            db.session.commit()
+            started = time.perf_counter()
+            engine.snapshot()
+            refresh_ms = (time.perf_counter() - started) * 1000
+
+            for name, preferences in PROFILES.items():
+                snapshot = engine.snapshot()
+                row = {
+                    'pets': size,
+                    'profile': name,
+                    'score_ms': timed(lambda: matching.score(snapshot, **preferences), repeat),
+                    'match_ms': timed(lambda: matching.top_k(snapshot, matching.score(snapshot, **preferences), k),
+                                      repeat),
+                    'load_s': load_s,
+                    'refresh_ms': refresh_ms,
+                }
+                results.append(row)
+                print(f"{size:>9} {name:>12} {row['score_ms']:>9.2f} {row['match_ms']:>9.2f} "
+                      f"{load_s:>8.2f} {refresh_ms:>10.2f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-match-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ.setdefault('DOG_FACTS_BACKGROUND', '0')
+    from app import app
+
+    print(f"{'pets':>9} {'profile':>12} {'score ms':>9} {'top-k ms':>9} {'load s':>8} {'refresh ms':>10}   (median)")
+    results = run(app, [int(size) for size in args.sizes.split(',')], args.repeat, args.k)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Measure the cost of the request instrumentation in metrics.py.
+
+    python benchmarks/metrics_overhead.py --requests 2000
+    python benchmarks/metrics_overhead.py --profiler     # profiler.py instead
+
+Runs the same request mix through the Flask test client in two fresh
+processes, one with METRICS_ENABLED=0 and one with METRICS_ENABLED=1, and
+reports the per-request difference, plus the raw cost of a histogram
+observation. With `--profiler` the two processes differ in PROFILER_ENABLED
+instead (sampling every request, keeping none).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+URLS = ['/pets.json?per_page=24', '/pets?per_page=24', '/about', '/faq']
+
+
+def child(requests):
+    from app import app, seed_pets
+    from search_bench import create_schema
+
+    create_schema(app)
+    with app.app_context():
+        seed_pets()
+    client = app.test_client()
+    for url in URLS:  # warm up templates and the connection pool
+        client.get(url)
+    results = {}
+    for url in URLS:
+        started = time.perf_counter()
+        for _ in range(requests):
+            client.get(url)
+        results[url] = (time.perf_counter() - started) / requests * 1e6
+    print(json.dumps(results))
+
+
+def run(enabled, requests, database_url, variable='METRICS_ENABLED'):
+    env = dict(os.environ, DATABASE_URL=database_url, DOG_FACTS_BACKGROUND='0',
+               DOG_FACTS_URL='http://127.0.0.1:9/unused', SUBMISSION_QUEUE_MODE='sync',
+               PROFILER_THRESHOLD_MS='1000000')
+    env[variable] = '1' if enabled else '0'
+    output = subprocess.run([sys.executable, __file__, '--child', '--requests', str(requests)],
+                            env=env, capture_output=True, text=True, check=True, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--profiler', action='store_true', help="measure the sampling profiler instead")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.requests)
+        return
+
+    from metrics import Histogram
+
+    histogram = Histogram('bench_seconds', "benchmark", ('endpoint',))
+    per_observe = min(timeit.repeat(lambda: histogram.observe(0.0123, 'list_pets'), number=100000, repeat=5))
+    print(f"Histogram.observe: {per_observe / 100000 * 1e9:.0f} ns")
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pawfect-metrics-'), 'bench.db')}"
+    # Alternate the two modes and keep the best of each to damp noise
+    baseline, instrumented = {}, {}
+    for _ in range(args.rounds):
+        for enabled, best in ((False, baseline), (True, instrumented)):
+            for url, micros in run(enabled, args.requests, database_url,
+                                   'PROFILER_ENABLED' if args.profiler else 'METRICS_ENABLED').items():
+                best[url] = min(best.get(url, micros), micros)
+    print(f"{'url':<28} {'off (us)':>10} {'on (us)':>10} {'overhead':>10}")
+    for url in URLS:
+        off, on = baseline[url], instrumented[url]
+        print(f"{url:<28} {off:>10.1f} {on:>10.1f} {(on - off) / off:>9.1%}")
+
+
+if __name__ == '__main__':
+    main()
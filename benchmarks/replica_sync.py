@@ -0,0 +1,42 @@
+"""Keep a SQLite copy of the database as a local stand-in for a read replica.
+
+    python benchmarks/replica_sync.py instance/test.db instance/replica.db --interval 2
+    DATABASE_REPLICA_URLS=sqlite:///replica.db flask run
+
+Every `--interval` seconds the primary file is copied into the replica with
+SQLite's online backup API, so the replica lags the primary by up to that
+long, which is enough to watch health checks, round-robin and
+read-your-writes pinning at work. `--once` copies a single time and exits.
+"""
+import argparse
+import sqlite3
+import time
+
+
+def copy(primary, replica):
+    source = sqlite3.connect(primary)
+    target = sqlite3.connect(replica)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('primary')
+    parser.add_argument('replica')
+    parser.add_argument('--interval', type=float, default=2.0, help="seconds between copies (the replica lag)")
+    parser.add_argument('--once', action='store_true')
+    args = parser.parse_args()
+
+    while True:
+        copy(args.primary, args.replica)
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
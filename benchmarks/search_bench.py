@@ -0,0 +1,145 @@
+"""Compare ILIKE filtering with the trigram search index.
+
+    python benchmarks/search_bench.py --sizes 10000,100000,1000000
+
+For each catalogue size a throwaway SQLite database is filled with synthetic
+pets, then the first listing page (LIMIT 24, ordered by id) and the full match
+count are timed for a handful of name and breed terms, once with the original
+`ILIKE '%term%'` filter and once through `search.match()`. Pass
+`--database-url` to run against PostgreSQL instead (the pet table is emptied!).
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SYLLABLES = ['ba', 'bel', 'char', 'co', 'da', 'el', 'fi', 'go', 'ha', 'is', 'ju', 'ka', 'lee',
+             'lu', 'ma', 'na', 'ol', 'pe', 'qui', 'ro', 'sa', 'ti', 'un', 'vi', 'wil', 'xo', 'yo', 'zu']
+BREEDS = ['Golden Retriever', 'Beagle', 'Bulldog', 'Siberian Husky', 'Tabby', 'Siamese', 'Persian',
+          'Bengal', 'Lop', 'Rex', 'Angora', 'Macaw', 'Cockatiel', 'Parakeet', 'Leopard Gecko',
+          'Bearded Dragon', 'Corn Snake', 'Box Turtle', 'Veiled Chameleon', 'Labrador Retriever',
+          'Border Collie', 'Dachshund', 'Maine Coon', 'Ragdoll', 'Sphynx', 'Holland Lop']
+SPECIES = ['Dog', 'Cat', 'Rabbit', 'Bird', 'Reptile']
+
+TERMS = [
+    ('name', 'char'),   # common
+    ('name', 'belzu'),  # rare
+    ('name', 'qqq'),    # no match
+    ('breed', 'retr'),
+    ('breed', 'chamel'),
+]
+
+
+def synthetic_rows(count, seed=42):
+    rng = random.Random(seed)
+    for _ in range(count):
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        yield {
+            'img': 'images/Beagle.png',
+            'name': name,
+            'age': rng.randint(0, 15),
+            'breed': rng.choice(BREEDS),
+            'species': rng.choice(SPECIES),
+        }
+
+
+def create_schema(app):
+    """Bring a throwaway database up to date with the migrations."""
+    from flask_migrate import upgrade
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))
+
+
+def fill(app, count, batch=10000):
+    from sqlalchemy import insert
+    from models import db, Pet
+    import search
+
+    create_schema(app)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            search.drop_index(connection)
+            connection.execute(Pet.__table__.delete())
+        rows = synthetic_rows(count)
+        with db.engine.begin() as connection:
+            while True:
+                chunk = [row for _, row in zip(range(batch), rows)]
+                if not chunk:
+                    break
+                connection.execute(insert(Pet), chunk)
+        started = time.perf_counter()
+        with db.engine.begin() as connection:
+            search.create_index(connection)
+        return time.perf_counter() - started
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(app, sizes, repeat):
+    from models import Pet
+    import search
+
+    results = []
+    for size in sizes:
+        build_seconds = fill(app, size)
+        with app.app_context():
+            for field, term in TERMS:
+                col = getattr(Pet, field)
+                ilike = Pet.query.filter(col.ilike(f"%{term}%"))
+                indexed = Pet.query.filter(search.match(col, term))
+                row = {
+                    'pets': size,
+                    'field': field,
+                    'term': term,
+                    'matches': indexed.count(),
+                    'ilike_page_ms': timed(lambda: ilike.order_by(Pet.id).limit(24).all(), repeat),
+                    'index_page_ms': timed(lambda: indexed.order_by(Pet.id).limit(24).all(), repeat),
+                    'ilike_count_ms': timed(ilike.count, repeat),
+                    'index_count_ms': timed(indexed.count, repeat),
+                    'index_build_s': build_seconds,
+                }
+                results.append(row)
+                print(f"{size:>9} {field:>5} {term!r:>9} {row['matches']:>8} "
+                      f"{row['ilike_page_ms']:>9.2f} {row['index_page_ms']:>9.2f} "
+                      f"{row['ilike_count_ms']:>9.2f} {row['index_count_ms']:>9.2f}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', help="defaults to a temporary SQLite file")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-search-')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    os.environ.setdefault('DOG_FACTS_BACKGROUND', '0')
+    from app import app
+
+    print(f"{'pets':>9} {'field':>5} {'term':>9} {'matches':>8} "
+          f"{'ilike pg':>9} {'index pg':>9} {'ilike cnt':>9} {'index cnt':>9}   (ms, median)")
+    results = run(app, [int(size) for size in args.sizes.split(',')], args.repeat)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(results, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Time import-to-first-response and measure per-worker memory under gunicorn.
+
+    python benchmarks/startup_bench.py --pets 100k --workers 4
+    python benchmarks/startup_bench.py --ref HEAD~1      # compare with an older checkout
+
+Cold start: a fresh interpreter imports `app`, then serves `--path` through
+the test client; the median of `--repeat` runs is reported for both steps.
+With `--ref`, the same is measured in a temporary git worktree of that
+revision against the same database.
+
+gunicorn: `--workers` sync workers are started with and without `--preload`.
+It reports the time until the first successful response, then touches every
+worker (a listing and a /match) and reads RSS, PSS and USS per process from
+/proc/<pid>/smaps_rollup. PSS splits shared pages between the processes that
+map them, so the total PSS is the memory the server really costs, and
+RSS - USS per worker is what it shares copy-on-write with the master.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from loadtest import free_port, parse_count
+from search_bench import fill
+
+COLD_START = '''
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get({path!r})
+served = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'first_response_ms': (served - imported) * 1000,
+                  'status': response.status_code}}))
+'''
+
+
+# -------------------------------
+# Cold start
+# -------------------------------
+def cold_start(cwd, path, repeat, env):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', COLD_START.format(path=path)], cwd=cwd, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'import_ms': statistics.median(run['import_ms'] for run in runs),
+        'first_response_ms': statistics.median(run['first_response_ms'] for run in runs),
+        'status': runs[-1]['status'],
+    }
+
+
+def worktree(ref):
+    path = tempfile.mkdtemp(prefix='pawfect-ref-')
+    subprocess.run(['git', 'worktree', 'add', '--detach', path, ref], cwd=ROOT, check=True,
+                   capture_output=True)
+    return path
+
+
+# -------------------------------
+# gunicorn
+# -------------------------------
+def memory(pid):
+    """`{'rss': MB, 'pss': MB, 'uss': MB}` from smaps_rollup (Linux only)."""
+    fields = {}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as fh:
+            for line in fh:
+                parts = line.split()
+                if len(parts) >= 2 and parts[1].isdigit():
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        'rss': fields.get('Rss', 0) / 1024,
+        'pss': fields.get('Pss', 0) / 1024,
+        'uss': (fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)) / 1024,
+    }
+
+
+def children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as fh:
+            return [int(child) for child in fh.read().split()]
+    except OSError:
+        return []
+
+
+def run_gunicorn(workers, preload, path, env):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    command = [sys.executable, '-m', 'gunicorn', '-w', str(workers), '-b', f'127.0.0.1:{port}',
+               '--log-level', 'warning'] + (['--preload'] if preload else []) + ['app:app']
+    started = time.perf_counter()
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                urllib.request.urlopen(base + path, timeout=30).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("gunicorn did not start")
+                time.sleep(0.05)
+        first_response_s = time.perf_counter() - started
+
+        # Give every worker real work so their private pages show up
+        for _ in range(workers * 8):
+            urllib.request.urlopen(base + path, timeout=30).read()
+            urllib.request.urlopen(base + '/match?species=Dog&min_age=2', timeout=60).read()
+        time.sleep(0.5)
+        master = memory(server.pid)
+        per_worker = [memory(pid) for pid in children(server.pid)]
+        per_worker = [usage for usage in per_worker if usage]
+        return {
+            'preload': preload,
+            'first_response_s': first_response_s,
+            'master': master,
+            'workers': per_worker,
+            'total_pss_mb': (master['pss'] if master else 0) + sum(usage['pss'] for usage in per_worker),
+        }
+    finally:
+        server.terminate()
+        server.wait(30)
+
+
+def print_gunicorn(run):
+    label = 'preload' if run['preload'] else 'no preload'
+    print(f"\ngunicorn ({label}): first response after {run['first_response_s']:.2f}s, "
+          f"total PSS {run['total_pss_mb']:.1f} MB")
+    print(f"{'process':<10} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8} {'shared MB':>10}")
+    rows = [('master', run['master'])] + [(f'worker {i}', usage) for i, usage in enumerate(run['workers'])]
+    for name, usage in rows:
+        if usage:
+            print(f"{name:<10} {usage['rss']:>8.1f} {usage['pss']:>8.1f} {usage['uss']:>8.1f} "
+                  f"{usage['rss'] - usage['uss']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', default='10k', help="catalogue size, e.g. 10k, 100k, 1m")
+    parser.add_argument('--path', default='/pets', help="page requested first")
+    parser.add_argument('--repeat', type=int, default=5, help="cold starts per checkout")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ref', help="also measure cold starts of this git revision")
+    parser.add_argument('--skip-gunicorn', action='store_true')
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-startup-')
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'startup.db')}",
+               DOG_FACTS_URL='http://127.0.0.1:9/unused',
+               DOG_FACTS_CACHE_FILE=os.path.join(tmpdir, 'dog_facts.json'),
+               GUNICORN_PRELOAD='0')
+    os.environ.update(env)
+    pets = parse_count(args.pets)
+    print(f"Seeding {pets} pets...", file=sys.stderr)
+    from app import app
+    fill(app, pets)
+
+    output = {'meta': {'pets': pets, 'workers': args.workers, 'path': args.path}, 'cold_start': {}, 'gunicorn': []}
+    checkouts = [('current', ROOT)]
+    if args.ref:
+        checkouts.append((args.ref, worktree(args.ref)))
+    print(f"{'checkout':<12} {'import ms':>10} {'first response ms':>18}   (median of {args.repeat})")
+    try:
+        for name, cwd in checkouts:
+            result = cold_start(cwd, args.path, args.repeat, env)
+            output['cold_start'][name] = result
+            print(f"{name:<12} {result['import_ms']:>10.1f} {result['first_response_ms']:>18.1f}")
+    finally:
+        for name, cwd in checkouts[1:]:
+            subprocess.run(['git', 'worktree', 'remove', '--force', cwd], cwd=ROOT, capture_output=True)
+
+    if not args.skip_gunicorn:
+        for preload in (False, True):
+            run = run_gunicorn(args.workers, preload, args.path, env)
+            output['gunicorn'].append(run)
+            print_gunicorn(run)
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(output, fh, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Time `/pets/suggest` lookups against the prefix index.
+
+    python benchmarks/suggest_bench.py --sizes 10000,100000,1000000
+
+For each catalogue size a throwaway SQLite database is filled with synthetic
+pets (see search_bench.py). The script reports the time to build the index and
+its median lookup time for a few prefixes, both uncached ("cold") and
+answered from the per-prefix memo. For comparison it also reports a
+whole `/pets/suggest` request through the test client, and the
+`LIKE 'prefix%'` queries the endpoint would otherwise run.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_bench import fill, timed
+
+PREFIXES = ['c', 'char', 'belzu', 'retr', 'qqq']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-suggest-')
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'suggest.db')}",
+                      DOG_FACTS_URL='http://127.0.0.1:9/unused',
+                      DOG_FACTS_CACHE_FILE=os.path.join(tmpdir, 'dog_facts.json'))
+    from sqlalchemy import func, select
+    from app import app, suggest_index as index
+    from models import db, Pet
+
+    client = app.test_client()
+    print(f"{'pets':>9} {'prefix':<8} {'cold us':>9} {'index us':>9} {'request us':>11} {'LIKE ms':>9}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        fill(app, size)
+        with app.app_context():
+            # fill() bypasses the change log: rebuild, then never look at it again
+            index.fields = None
+            index.max_lag = float('inf')
+            started = time.perf_counter()
+            index.refresh()
+            print(f"{size:>9} built in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+            for prefix in PREFIXES:
+                cold = timed(lambda: (index.fields['name']._memo.clear(), index.fields['breed']._memo.clear(),
+                                      index.suggest(prefix)), args.repeat) * 1000
+                lookup = timed(lambda: index.suggest(prefix), args.repeat) * 1000
+                request = timed(lambda: client.get(f'/pets/suggest?q={prefix}'), args.repeat) * 1000
+
+                def like():
+                    for column in (Pet.name, Pet.breed):
+                        db.session.execute(select(column, func.count()).where(column.ilike(f'{prefix}%'))
+                                           .group_by(column).order_by(func.count().desc()).limit(8)).all()
+                print(f"{size:>9} {prefix:<8} {cold:>9.1f} {lookup:>9.1f} {request:>11.1f} {timed(like, 5):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
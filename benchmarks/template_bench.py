@@ -0,0 +1,93 @@
+"""First-request latency with a cold and a warm compiled-template cache.
+
+    python benchmarks/template_bench.py --repeat 5
+
+Each run is a fresh interpreter, like a new gunicorn worker. It imports the
+app and requests `--paths` in turn through the test client, reporting the
+time to the first response of each and the template time of that response
+(from the `Server-Timing` header). Three setups are compared:
+
+* `no cache` - TEMPLATE_BYTECODE_CACHE=0, every template compiled from source
+* `cold cache` - the on-disk cache is emptied before each run
+* `warm cache` - after `flask templates compile`, as on a deploy
+
+The fragment cache is disabled so every page really renders.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_bench import fill
+
+FIRST_REQUESTS = '''
+import json, re, time
+from app import app
+client = app.test_client()
+results = {{}}
+for path in {paths!r}:
+    started = time.perf_counter()
+    response = client.get(path)
+    elapsed = (time.perf_counter() - started) * 1000
+    template = re.search(r'tpl;dur=([0-9.]+)', response.headers.get('Server-Timing', ''))
+    results[path] = {{'ms': elapsed, 'tpl_ms': float(template.group(1)) if template else None,
+                      'status': response.status_code}}
+print(json.dumps(results))
+'''
+
+
+def run(paths, env):
+    output = subprocess.run([sys.executable, '-c', FIRST_REQUESTS.format(paths=paths)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pets', type=int, default=1000)
+    parser.add_argument('--paths', default='/,/pets,/about,/faq')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    paths = args.paths.split(',')
+
+    tmpdir = tempfile.mkdtemp(prefix='pawfect-templates-')
+    cache_dir = os.path.join(tmpdir, 'jinja_cache')
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(tmpdir, 'templates.db')}",
+               DOG_FACTS_URL='http://127.0.0.1:9/unused',
+               DOG_FACTS_CACHE_FILE=os.path.join(tmpdir, 'dog_facts.json'),
+               FRAGMENT_CACHE_ENABLED='0', HTTP_CACHE_ENABLED='0', ADMISSION_ENABLED='0',
+               TEMPLATE_CACHE_DIR=cache_dir)
+    os.environ.update(env)
+    from app import app
+    fill(app, args.pets)
+
+    setups = [
+        ('no cache', dict(env, TEMPLATE_BYTECODE_CACHE='0'), None),
+        ('cold cache', env, lambda: shutil.rmtree(cache_dir, ignore_errors=True)),
+        ('warm cache', env, lambda: subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'templates',
+                                                    'compile'], cwd=ROOT, env=env, check=True,
+                                                   capture_output=True)),
+    ]
+    print(f"{'setup':<12} {'path':<10} {'first ms':>9} {'template ms':>12}   (median of {args.repeat})")
+    for name, setup_env, prepare in setups:
+        runs = []
+        for _ in range(args.repeat):
+            if prepare:
+                prepare()
+            runs.append(run(paths, setup_env))
+        for path in paths:
+            first = statistics.median(result[path]['ms'] for result in runs)
+            template = statistics.median(result[path]['tpl_ms'] or 0 for result in runs)
+            print(f"{name:<12} {path:<10} {first:>9.1f} {template:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
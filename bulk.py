@@ -0,0 +1,221 @@
+"""Streaming bulk import and export of pets.
+
+    flask pets import shelter.csv --chunk-size 5000 --rejects rejects.ndjson
+    flask pets export pets.ndjson
+
+Both directions work in fixed-size chunks, so memory use does not depend on
+the size of the file. Imported rows go through the same `validate_pet()`
+rules as the /add form; valid rows are written with COPY on PostgreSQL and a
+batched executemany INSERT elsewhere, one transaction per chunk.
+"""
+import csv
+import io
+import json
+import os
+import sys
+import time
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import insert, select, text
+
+from caching import bump_catalog_version
+from models import db, Pet, validate_pet
+import matching
+import stats
+
+COLUMNS = ('img', 'name', 'age', 'breed', 'species')
+EXPORT_COLUMNS = ('id',) + COLUMNS
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+# -------------------------------
+# Reading / writing rows
+# -------------------------------
+def read_rows(fh, fmt):
+    """Yield `(line number, row dict)`; rows that cannot be parsed yield an
+    error string instead of a dict."""
+    if fmt == 'csv':
+        reader = csv.DictReader(fh)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, f"Invalid JSON: {e}"
+                continue
+            yield line_number, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def write_rows(fh, rows, fmt, header=True):
+    if fmt == 'csv':
+        writer = csv.writer(fh)
+        if header:
+            writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            fh.write(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + '\n')
+
+
+# -------------------------------
+# Bulk insert
+# -------------------------------
+def insert_chunk(connection, rows):
+    """Insert `rows`; returns the ids they were given."""
+    if connection.dialect.name == 'postgresql':
+        # COPY reports no ids: take them from the sequence first and copy them in
+        ids = connection.execute(text("SELECT nextval(pg_get_serial_sequence('pet', 'id')) "
+                                      "FROM generate_series(1, :count)"), {'count': len(rows)}).scalars().all()
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([pet_id] + [row[key] for key in COLUMNS] for pet_id, row in zip(ids, rows))
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY pet (id, {', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+        return ids
+    return connection.execute(insert(Pet.__table__).returning(Pet.__table__.c.id), rows).scalars().all()
+
+
+def import_pets(fh, fmt, chunk_size=5000, dry_run=False, on_reject=None, on_progress=None):
+    """Validate and insert every row of `fh`; returns `(imported, rejected)`."""
+    imported = rejected = 0
+    chunk = []
+
+    def flush():
+        nonlocal imported
+        if chunk and not dry_run:
+            with db.engine.begin() as connection:
+                ids = insert_chunk(connection, chunk)
+                # Bulk inserts bypass the session hooks that keep these in step
+                bump_catalog_version(connection)
+                stats.apply_deltas(connection, stats.count_rows(chunk))
+                # Ids of concurrent inserts may fall inside the range; readers re-read it whole
+                matching.record_changes(connection, min(ids), max(ids))
+                matching.prune_changes(connection)
+        imported += len(chunk)
+        chunk.clear()
+        if on_progress:
+            on_progress(imported, rejected)
+
+    for line_number, row in read_rows(fh, fmt):
+        try:
+            if isinstance(row, str):
+                raise ValueError(row)
+            fields = validate_pet(row)
+            if not fields['img']:
+                raise ValueError("Img is required")
+        except ValueError as e:
+            rejected += 1
+            if on_reject:
+                on_reject(line_number, row, str(e))
+            continue
+        chunk.append(fields)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return imported, rejected
+
+
+def export_pets(fh, fmt, chunk_size=5000):
+    """Write every pet to `fh`, reading the table in id order one chunk at a time."""
+    columns = [Pet.__table__.c[name] for name in EXPORT_COLUMNS]
+    exported = 0
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql' and fmt == 'csv':
+            cursor = connection.connection.cursor()
+            try:
+                cursor.copy_expert(
+                    f"COPY (SELECT {', '.join(EXPORT_COLUMNS)} FROM pet ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)",
+                    fh)
+                return cursor.rowcount
+            finally:
+                cursor.close()
+
+        last_id = 0
+        while True:
+            rows = connection.execute(
+                select(*columns).where(Pet.id > last_id).order_by(Pet.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            write_rows(fh, rows, fmt, header=(exported == 0))
+            exported += len(rows)
+            last_id = rows[-1][0]
+    if exported == 0 and fmt == 'csv':
+        write_rows(fh, [], fmt)
+    return exported
+
+
+# -------------------------------
+# CLI: flask pets ...
+# -------------------------------
+pets_cli = AppGroup('pets', help="Bulk import and export pets.")
+
+
+@pets_cli.command('import')
+@click.argument('path', type=click.Path(allow_dash=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help="Defaults to the file extension.")
+@click.option('--chunk-size', type=int, default=5000, show_default=True)
+@click.option('--rejects', type=click.Path(), help="Write rejected rows here as NDJSON.")
+@click.option('--dry-run', is_flag=True, help="Validate without writing to the database.")
+def import_command(path, fmt, chunk_size, rejects, dry_run):
+    """Import pets from a CSV or NDJSON file ('-' for stdin).
+
+    CSV files need a header row with img, name, age, breed and species.
+    """
+    fmt = detect_format(path, fmt)
+    started = time.monotonic()
+    reject_fh = open(rejects, 'w') if rejects else None
+
+    def on_reject(line_number, row, error):
+        if reject_fh:
+            reject_fh.write(json.dumps({'line': line_number, 'error': error, 'row': row}) + '\n')
+
+    def on_progress(imported, rejected):
+        rate = imported / max(time.monotonic() - started, 1e-6)
+        click.echo(f"\r{imported} imported, {rejected} rejected ({rate:,.0f} rows/s)", nl=False, err=True)
+
+    fh = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        imported, rejected = import_pets(fh, fmt, chunk_size, dry_run, on_reject, on_progress)
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+        if reject_fh:
+            reject_fh.close()
+    click.echo(err=True)
+    verb = "Validated" if dry_run else "Imported"
+    click.echo(f"{verb} {imported} pets, rejected {rejected} in {time.monotonic() - started:.1f}s.")
+
+
+@pets_cli.command('export')
+@click.argument('path', type=click.Path(allow_dash=True), default='-')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help="Defaults to the file extension.")
+@click.option('--chunk-size', type=int, default=5000, show_default=True)
+def export_command(path, fmt, chunk_size):
+    """Export all pets as CSV or NDJSON (to stdout by default)."""
+    fmt = detect_format(path, fmt)
+    fh = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+    try:
+        exported = export_pets(fh, fmt, chunk_size)
+    finally:
+        if fh is not sys.stdout:
+            fh.close()
+    if path != '-':
+        click.echo(f"Exported {exported} pets to {os.path.basename(path)}.")
+
+
+def init_app(app):
+    app.cli.add_command(pets_cli)
@@ -0,0 +1,118 @@
+"""Catalogue version and conditional GET.
+
+Any change to the `pet` table bumps the single row of `catalog_version` in the
+same transaction, so every gunicorn worker (and every host sharing the
+database) agrees on when the catalogue last changed. Views wrapped in
+`@conditional` derive a weak ETag from that version, the request path and
+query string and a digest of the templates, and answer `If-None-Match` with a
+304 before the view runs, so a repeat visitor or a CDN revalidating its copy
+costs one primary-key lookup instead of a query and a render.
+"""
+import functools
+import hashlib
+import os
+
+from flask import current_app, make_response, request, session
+from sqlalchemy import event, insert, select, update
+
+from models import db, CatalogVersion, Pet
+
+
+# -------------------------------
+# Catalogue version
+# -------------------------------
+def catalog_version():
+    return db.session.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar() or 0
+
+
+def bump_catalog_version(connection):
+    """Bump the version inside the caller's transaction."""
+    result = connection.execute(
+        update(CatalogVersion).where(CatalogVersion.id == 1).values(version=CatalogVersion.version + 1))
+    if result.rowcount == 0:
+        connection.execute(insert(CatalogVersion).values(id=1, version=1))
+
+
+def ensure_catalog_version(connection):
+    if connection.execute(select(CatalogVersion.id).where(CatalogVersion.id == 1)).first() is None:
+        connection.execute(insert(CatalogVersion).values(id=1, version=0))
+
+
+def _before_flush(session, flush_context, instances):
+    changed = any(isinstance(obj, Pet) for obj in session.new) or \
+        any(isinstance(obj, Pet) for obj in session.deleted) or \
+        any(isinstance(obj, Pet) and session.is_modified(obj) for obj in session.dirty)
+    if changed:
+        bump_catalog_version(session.connection())
+
+
+# -------------------------------
+# Conditional GET
+# -------------------------------
+def conditional(catalog=False, static=False):
+    """Serve 304s for unchanged GETs of the decorated view.
+
+    With `catalog=True` the ETag also covers the catalogue version. Responses
+    must be revalidated (`no-cache`) unless `static=True`, in which case they
+    may be reused for `STATIC_PAGE_MAX_AGE` seconds.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            http_cache = current_app.extensions.get('http_cache')
+            # Flashed messages are per visitor and shown once: never cache them
+            if http_cache is None or not http_cache.enabled or request.method not in ('GET', 'HEAD') \
+                    or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            etag = http_cache.etag(catalog_version() if catalog else None)
+            if static:
+                cache_control = f'public, max-age={http_cache.static_max_age}'
+            else:
+                cache_control = 'public, no-cache'
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
+
+
+class HttpCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('HTTP_CACHE_ENABLED', os.getenv('HTTP_CACHE_ENABLED', '1') == '1')
+        app.config.setdefault('STATIC_PAGE_MAX_AGE', int(os.getenv('STATIC_PAGE_MAX_AGE', 300)))
+        self.enabled = app.config['HTTP_CACHE_ENABLED']
+        self.static_max_age = app.config['STATIC_PAGE_MAX_AGE']
+        self.template_digest = self._template_digest(app)
+        if not event.contains(db.session, 'before_flush', _before_flush):
+            event.listen(db.session, 'before_flush', _before_flush)
+        app.extensions['http_cache'] = self
+
+    def _template_digest(self, app):
+        # Same templates give the same digest in every worker, so a deploy
+        # that changes the markup invalidates every ETag
+        digest = hashlib.sha1()
+        folder = os.path.join(app.root_path, app.template_folder)
+        for dirpath, dirnames, filenames in sorted(os.walk(folder)):
+            for filename in sorted(filenames):
+                with open(os.path.join(dirpath, filename), 'rb') as fh:
+                    digest.update(filename.encode() + b'\0' + fh.read())
+        # Pages link fingerprinted asset URLs, so a new asset build changes them too
+        assets = app.extensions.get('assets')
+        if assets is not None:
+            digest.update(assets.version.encode())
+        return digest.hexdigest()[:12]
+
+    def etag(self, version=None):
+        key = f"{self.template_digest}:{version}:{request.path}?{request.query_string.decode('latin-1')}"
+        return hashlib.sha1(key.encode()).hexdigest()[:20]
@@ -0,0 +1,148 @@
+"""Database configuration: the URL and a per-backend engine profile.
+
+`DB_PROFILE=tuned` (the default) applies the settings below; `DB_PROFILE=stock`
+leaves SQLAlchemy's and the driver's defaults alone, which is what the app
+ran with before and what benchmarks/db_profiles.py compares against.
+
+SQLite runs in WAL mode with `synchronous=NORMAL`, so readers no longer block
+on a writer and commits skip most fsyncs, waits up to `SQLITE_BUSY_TIMEOUT`
+ms for a lock instead of failing with "database is locked", and reads through
+a memory map. PostgreSQL gets a sized pool that is pinged before use and
+recycled periodically, plus a server-side statement timeout so a runaway
+query cannot hold a worker forever.
+
+Both profiles keep a larger compiled-statement cache: SQLAlchemy's
+`query_cache_size` and, on SQLite, the driver's prepared statement cache.
+psycopg2 has no server-side prepared statements, so there is nothing further
+to tune there.
+"""
+import os
+import weakref
+
+from sqlalchemy import event
+
+PROFILES = {
+    'sqlite': {
+        'engine': {
+            'query_cache_size': 1200,
+            'connect_args': {'timeout': 30, 'cached_statements': 256},
+        },
+    },
+    'postgresql': {
+        'engine': {
+            'query_cache_size': 1200,
+            'pool_pre_ping': True,
+            'pool_timeout': 10,
+        },
+    },
+}
+
+
+def database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///test.db')
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def backend(url):
+    return url.split(':', 1)[0].split('+')[0]
+
+
+def engine_options(config, url=None):
+    """Keyword arguments for `create_engine()` under the configured profile,
+    for the primary database or the given `url` (a replica)."""
+    url = url or config['SQLALCHEMY_DATABASE_URI']
+    profile = PROFILES.get(backend(url))
+    if config['DB_PROFILE'] != 'tuned' or profile is None:
+        return {}
+    options = dict(profile['engine'], connect_args=dict(profile['engine'].get('connect_args', {})))
+    if backend(url) == 'postgresql':
+        options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_recycle=config['DB_POOL_RECYCLE'])
+    return options
+
+
+# -------------------------------
+# Per-connection settings
+# -------------------------------
+def _sqlite_pragmas(config):
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+
+def _postgresql_settings(config):
+    return [
+        f"SET statement_timeout = {int(config['DB_STATEMENT_TIMEOUT'])}",
+    ]
+
+
+def tune_engine(engine, config):
+    """Run the profile's per-connection statements on every new connection.
+
+    Call before the engine hands out its first connection. Works on the sync
+    engine behind an `AsyncEngine` too (`engine.sync_engine`).
+    """
+    if config['DB_PROFILE'] != 'tuned':
+        return
+    name = engine.dialect.name
+    if name == 'sqlite':
+        if engine.url.database in (None, '', ':memory:'):
+            return  # in-memory databases have no journal to switch
+        statements = _sqlite_pragmas(config)
+    elif name == 'postgresql':
+        statements = _postgresql_settings(config)
+    else:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+        if name == 'postgresql':
+            # psycopg2 opened a transaction for the SET; keep it past the
+            # rollback the pool does on check-in
+            dbapi_connection.commit()
+
+
+# Engines whose pools a forked child must not reuse; fork hooks cannot be
+# unregistered, so a single one walks whichever engines are still alive
+_fork_engines = weakref.WeakSet()
+
+
+def _dispose_after_fork():
+    for engine in list(_fork_engines):
+        engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+def reset_after_fork(engine):
+    """Drop pooled connections inherited from a parent process (gunicorn
+    `--preload`), without closing the parent's sockets."""
+    _fork_engines.add(engine)
+
+
+def init_app(app):
+    """Set the database URL and engine options; call before `db.init_app()`."""
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', database_url())
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    app.config.setdefault('DB_PROFILE', os.getenv('DB_PROFILE', 'tuned'))
+    app.config.setdefault('DB_POOL_SIZE', int(os.getenv('DB_POOL_SIZE', 10)))
+    app.config.setdefault('DB_MAX_OVERFLOW', int(os.getenv('DB_MAX_OVERFLOW', 20)))
+    app.config.setdefault('DB_POOL_RECYCLE', int(os.getenv('DB_POOL_RECYCLE', 1800)))
+    app.config.setdefault('DB_STATEMENT_TIMEOUT', int(os.getenv('DB_STATEMENT_TIMEOUT', 30000)))
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT', int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)))
+    app.config.setdefault('SQLITE_MMAP_SIZE', int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)))
+    if app.config['DB_PROFILE'] not in ('tuned', 'stock'):
+        raise RuntimeError("DB_PROFILE must be 'tuned' or 'stock'")
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
@@ -0,0 +1,326 @@
+"""Cached, non-blocking dog facts provider.
+
+Templates never wait on dogapi.dog: facts are served from a pool that a
+background thread keeps warm, shared between gunicorn workers through a small
+JSON cache file in the instance folder.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from blinker import Namespace
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - only needed in ASGI mode
+    httpx = None
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Sent after every HTTP call to the facts API with `seconds` and `ok`
+_signals = Namespace()
+facts_fetched = _signals.signal('dog-facts-fetched')
+
+# Fallback facts if the API is slow, failing or not fetched yet
+FALLBACK_FACTS = [
+    "All my dogs were named Charlie",
+    "Dogs can learn over 1000 words",
+    "They dream just like humans!"
+]
+
+
+# -------------------------------
+# Circuit breaker
+# -------------------------------
+class CircuitBreaker:
+    """Stops calling a failing upstream for `cooldown` seconds after
+    `threshold` consecutive failures, then lets a single trial call through.
+
+    Until that trial is recorded every other caller is refused; a trial that
+    never reports back is given up on after another `cooldown`.
+    """
+
+    def __init__(self, threshold=3, cooldown=60):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state != 'half-open':
+                return state == 'closed'
+            now = time.monotonic()
+            if self.trial_started is not None and now - self.trial_started < self.cooldown:
+                return False
+            self.trial_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_started = None
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+# -------------------------------
+# Facts provider
+# -------------------------------
+class DogFactsProvider:
+    def __init__(self, app=None):
+        self.pool = []
+        self.fetched_at = 0.0
+        self.breaker = CircuitBreaker()
+        self._cache_mtime = None
+        self._last_stat = 0.0
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # ASGI mode: refresh on the server's event loop instead of a thread
+        self._loop = None
+        self._client = None
+        self._pending = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DOG_FACTS_URL', os.getenv('DOG_FACTS_URL', 'https://dogapi.dog/api/v2/facts'))
+        app.config.setdefault('DOG_FACTS_POOL_SIZE', int(os.getenv('DOG_FACTS_POOL_SIZE', 30)))
+        app.config.setdefault('DOG_FACTS_TTL', int(os.getenv('DOG_FACTS_TTL', 600)))
+        app.config.setdefault('DOG_FACTS_STALE_TTL', int(os.getenv('DOG_FACTS_STALE_TTL', 86400)))
+        app.config.setdefault('DOG_FACTS_TIMEOUT', float(os.getenv('DOG_FACTS_TIMEOUT', 2.0)))
+        app.config.setdefault('DOG_FACTS_BREAKER_THRESHOLD', 3)
+        app.config.setdefault('DOG_FACTS_BREAKER_COOLDOWN', 60)
+        app.config.setdefault('DOG_FACTS_BACKGROUND', os.getenv('DOG_FACTS_BACKGROUND', '1') == '1')
+        app.config.setdefault('DOG_FACTS_CACHE_FILE',
+                              os.getenv('DOG_FACTS_CACHE_FILE', os.path.join(app.instance_path, 'dog_facts.json')))
+
+        self.url = app.config['DOG_FACTS_URL']
+        self.pool_size = app.config['DOG_FACTS_POOL_SIZE']
+        self.ttl = app.config['DOG_FACTS_TTL']
+        self.stale_ttl = app.config['DOG_FACTS_STALE_TTL']
+        self.timeout = app.config['DOG_FACTS_TIMEOUT']
+        self.background = app.config['DOG_FACTS_BACKGROUND']
+        self.cache_file = app.config['DOG_FACTS_CACHE_FILE']
+        self.breaker = CircuitBreaker(app.config['DOG_FACTS_BREAKER_THRESHOLD'],
+                                      app.config['DOG_FACTS_BREAKER_COOLDOWN'])
+        app.extensions['dog_facts'] = self
+
+    # --- Reading ---
+
+    def get_facts(self, count=3):
+        """Return `count` facts without ever touching the network."""
+        self._load_shared_cache()
+        age = time.time() - self.fetched_at
+        if age >= self.ttl:
+            # stale-while-revalidate: serve what we have, refresh off-thread
+            self._schedule_refresh()
+        if not self.pool or age >= self.ttl + self.stale_ttl:
+            return list(FALLBACK_FACTS[:count])
+        return random.sample(self.pool, min(count, len(self.pool)))
+
+    def _load_shared_cache(self):
+        # Another worker may have refreshed the file; a stat once a second is cheap
+        now = time.monotonic()
+        if now - self._last_stat < 1.0:
+            return
+        self._last_stat = now
+        try:
+            mtime = os.stat(self.cache_file).st_mtime
+        except OSError:
+            return
+        if mtime == self._cache_mtime:
+            return
+        try:
+            with open(self.cache_file) as fh:
+                data = json.load(fh)
+            self.pool = data['facts']
+            self.fetched_at = data['fetched_at']
+            self._cache_mtime = mtime
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable dog facts cache: %s", e)
+
+    # --- Refreshing ---
+
+    def _schedule_refresh(self):
+        if self._loop is not None:
+            if self._pending is None or self._pending.done():
+                self._pending = asyncio.run_coroutine_threadsafe(self.refresh_async(), self._loop)
+            return
+        if not self.background:
+            self.refresh()
+            return
+        self._ensure_thread()
+        self._wakeup.set()
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='dog-facts-refresher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(timeout=self.ttl)
+            self._wakeup.clear()
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Dog facts refresh crashed")
+
+    def refresh(self):
+        """Fetch a new pool of facts if the shared cache is stale.
+
+        Only one worker fetches at a time; the others keep serving the cached
+        pool and pick up the new file on their next read.
+        """
+        if not self._due():
+            return False
+        with self._refresh_lock() as acquired:
+            if not acquired or not self.breaker.allow():
+                return False
+            facts = self.fetch()
+            if not facts:
+                return False
+            self._write_shared_cache(facts)
+            return True
+
+    async def refresh_async(self):
+        """`refresh()` for the event loop, using an async HTTP client."""
+        if not self._due():
+            return False
+        with self._refresh_lock() as acquired:
+            if not acquired or not self.breaker.allow():
+                return False
+            facts = await self.fetch_async()
+            if not facts:
+                return False
+            self._write_shared_cache(facts)
+            return True
+
+    def _due(self):
+        self._last_stat = 0.0
+        self._load_shared_cache()
+        return time.time() - self.fetched_at >= self.ttl and self.breaker.state != 'open'
+
+    def fetch(self):
+        started = time.perf_counter()
+        try:
+            response = requests.get(self.url, params={'limit': self.pool_size}, timeout=self.timeout)
+            response.raise_for_status()
+            facts = [item['attributes']['body'] for item in response.json().get('data', [])]
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            return self._fetch_failed(started, e)
+        return self._fetch_succeeded(started, facts)
+
+    async def fetch_async(self):
+        started = time.perf_counter()
+        try:
+            if self._client is None:
+                self._client = httpx.AsyncClient(timeout=self.timeout)
+            response = await self._client.get(self.url, params={'limit': self.pool_size})
+            response.raise_for_status()
+            facts = [item['attributes']['body'] for item in response.json().get('data', [])]
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            return self._fetch_failed(started, e)
+        return self._fetch_succeeded(started, facts)
+
+    def _fetch_failed(self, started, error):
+        self.breaker.record_failure()
+        facts_fetched.send(self, seconds=time.perf_counter() - started, ok=False)
+        logger.warning("Error fetching dog facts: %s", error)
+        return []
+
+    def _fetch_succeeded(self, started, facts):
+        self.breaker.record_success()
+        facts_fetched.send(self, seconds=time.perf_counter() - started, ok=True)
+        return facts
+
+    # --- ASGI mode ---
+
+    def use_event_loop(self, loop):
+        """Refresh on `loop` with httpx instead of on a thread (see asgi.py)."""
+        if httpx is None:
+            raise RuntimeError("httpx is required to refresh dog facts on an event loop")
+        self._loop = loop
+
+    async def close_async(self):
+        self._loop = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _write_shared_cache(self, facts):
+        self.pool = facts
+        self.fetched_at = time.time()
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as fh:
+            json.dump({'facts': facts, 'fetched_at': self.fetched_at}, fh)
+        os.replace(tmp_path, self.cache_file)
+        self._cache_mtime = os.stat(self.cache_file).st_mtime
+
+    def _refresh_lock(self):
+        return _FileLock(f"{self.cache_file}.lock")
+
+
+class _FileLock:
+    """Non-blocking inter-process lock; yields False if someone else holds it."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fh = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.fh = open(self.path, 'w')
+        try:
+            fcntl.flock(self.fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.fh.close()
+            self.fh = None
+            return False
+        return True
+
+    def __exit__(self, *exc):
+        if self.fh is not None:
+            fcntl.flock(self.fh, fcntl.LOCK_UN)
+            self.fh.close()
+            self.fh = None
+        return False
@@ -0,0 +1,204 @@
+"""Featured pets on the home page, rotated on a schedule.
+
+Every `FEATURED_ROTATION` seconds (an hour by default) a new selection of
+`FEATURED_COUNT` pets is drawn, spread across species: species take turns,
+in an order shuffled for the rotation, and each contributes at most
+`FEATURED_PER_SPECIES` pets. The draw is seeded by the rotation number, so
+every worker picks the same pets without sharing any state.
+
+The selection is kept in each worker as a snapshot of plain dicts, and the
+home page renders it without a query. It is redrawn, by the next request,
+when:
+
+* the rotation moves on;
+* this worker edits or deletes a featured pet (seen in the session's
+  changes, after the commit).
+
+Edits made by other workers are found in the `pet_change` log. A background
+thread reads the log at most every `FEATURED_CHECK_INTERVAL` seconds while
+the home page is being served, and redraws only if an entry covers one of
+the featured pets; requests keep the current selection meanwhile.
+
+    flask featured show     # the current selection
+"""
+import os
+import random
+import threading
+import time
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import event, select
+
+import matching
+from models import db, Pet, PetFacet
+
+
+class Selection:
+    def __init__(self, pets, rotation, cursor):
+        self.pets = pets
+        self.ids = frozenset(pet['id'] for pet in pets)
+        self.rotation = rotation
+        # Position in the change log (matching.py) the pets were read at
+        self.cursor = cursor
+        # For the `{% cache %}` block around the cards
+        self.key = f"{rotation}:{','.join(str(pet['id']) for pet in pets)}:{cursor.seq}"
+
+    def __iter__(self):
+        return iter(self.pets)
+
+    def __len__(self):
+        return len(self.pets)
+
+
+def draw(connection, rotation, count, per_species):
+    """Pick up to `count` pets for a rotation; the same inputs give the same pets."""
+    rng = random.Random(rotation)
+    species = connection.execute(select(PetFacet.value, PetFacet.count)
+                                 .where(PetFacet.facet == 'species', PetFacet.count > 0)
+                                 .order_by(PetFacet.value)).all()
+    rng.shuffle(species)
+    # Distinct offsets into each species, drawn up front so the order of the
+    # species never changes which pets a species contributes
+    offsets = {value: rng.sample(range(total), min(total, per_species)) for value, total in species}
+    pets = []
+    for turn in range(per_species):
+        for value, _ in species:
+            if len(pets) >= count:
+                return pets
+            if turn >= len(offsets[value]):
+                continue
+            pet = connection.execute(select(*Pet.__table__.c).where(Pet.species == value).order_by(Pet.id)
+                                     .offset(offsets[value][turn]).limit(1)).first()
+            if pet is not None:
+                pets.append(dict(pet._mapping))
+    return pets
+
+
+def _after_flush(session, flush_context):
+    # New pets cannot be featured yet; only real edits and deletions count
+    touched = {obj.id for obj in session.deleted if isinstance(obj, Pet)}
+    touched.update(obj.id for obj in session.dirty if isinstance(obj, Pet) and session.is_modified(obj))
+    if touched:
+        session.info.setdefault('featured_touched', set()).update(touched)
+
+
+def _after_commit(session):
+    touched = session.info.pop('featured_touched', None)
+    if touched and has_app_context():
+        featured = current_app.extensions.get('featured')
+        if featured is not None and featured.selection is not None and touched & featured.selection.ids:
+            featured.selection = None
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('featured_touched', None)
+
+
+class FeaturedPets:
+    def __init__(self, app=None):
+        self.selection = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self._checking = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FEATURED_COUNT', int(os.getenv('FEATURED_COUNT', 4)))
+        app.config.setdefault('FEATURED_PER_SPECIES', int(os.getenv('FEATURED_PER_SPECIES', 1)))
+        app.config.setdefault('FEATURED_ROTATION', int(os.getenv('FEATURED_ROTATION', 3600)))
+        app.config.setdefault('FEATURED_CHECK_INTERVAL', float(os.getenv('FEATURED_CHECK_INTERVAL', 5)))
+        self.count = app.config['FEATURED_COUNT']
+        self.per_species = app.config['FEATURED_PER_SPECIES']
+        self.rotation_seconds = app.config['FEATURED_ROTATION']
+        self.check_interval = app.config['FEATURED_CHECK_INTERVAL']
+        # Edits in other workers are found in the change log (matching.py)
+        matching.track_changes()
+        if not event.contains(db.session, 'after_flush', _after_flush):
+            event.listen(db.session, 'after_flush', _after_flush)
+            event.listen(db.session, 'after_commit', _after_commit)
+            event.listen(db.session, 'after_soft_rollback', _after_soft_rollback)
+        app.add_template_global(self.current, 'featured_pets')
+        app.extensions['featured'] = self
+        app.cli.add_command(featured_cli)
+
+    def rotation(self):
+        return int(time.time() // self.rotation_seconds)
+
+    def current(self):
+        """The featured pets. A request only queries to draw a selection: the
+        first in a worker, after each rotation and after this worker edited a
+        featured pet. Checking for other workers' edits runs in the background."""
+        selection = self.selection
+        if selection is not None and selection.rotation == self.rotation():
+            if time.monotonic() - self.checked_at >= self.check_interval:
+                self.check_in_background(current_app._get_current_object())
+            return selection
+        with self._lock:
+            selection = self.selection
+            rotation = self.rotation()
+            if selection is None or selection.rotation != rotation:
+                with db.engine.connect() as connection:
+                    selection = self._draw(connection, rotation)
+            return selection
+
+    def _draw(self, connection, rotation):
+        cursor = matching.cursor_at(connection)
+        self.selection = Selection(draw(connection, rotation, self.count, self.per_species), rotation, cursor)
+        self.checked_at = time.monotonic()
+        return self.selection
+
+    def check_in_background(self, app):
+        """Start a check unless one is running; callers go on with the current selection."""
+        if not self._checking.acquire(blocking=False):
+            return
+        threading.Thread(target=self._check_and_release, args=(app,), name='featured-check', daemon=True).start()
+
+    def _check_and_release(self, app):
+        try:
+            with app.app_context():
+                self.check()
+        except Exception as e:
+            app.logger.warning("Could not check the featured pets for changes: %s", e)
+            self.checked_at = time.monotonic()
+        finally:
+            self._checking.release()
+
+    def check(self):
+        """Redraw the selection if the change log covers a featured pet."""
+        with self._lock:
+            selection = self.selection
+            if selection is None:
+                return
+            with db.engine.connect() as connection:
+                changes, cursor = matching.read_changes(connection, selection.cursor)
+                if changes is None or self._touched(selection, changes):
+                    self._draw(connection, self.rotation())
+                else:
+                    selection.cursor = cursor
+                    self.checked_at = time.monotonic()
+
+    def _touched(self, selection, changes):
+        """Whether any of the change log entries covers a featured pet."""
+        if not selection.ids:
+            # Nothing to feature yet: try again once pets arrive
+            return bool(changes)
+        return any(first_id <= pet_id <= last_id for _, first_id, last_id in changes for pet_id in selection.ids)
+
+
+# -------------------------------
+# CLI: flask featured ...
+# -------------------------------
+featured_cli = AppGroup('featured', help="Inspect the featured pets.")
+
+
+@featured_cli.command('show')
+def show_command():
+    """List the pets featured in the current rotation."""
+    featured = current_app.extensions['featured']
+    selection = featured.current()
+    click.echo(f"Rotation {selection.rotation} (every {featured.rotation_seconds}s):")
+    for pet in selection:
+        click.echo(f"  #{pet['id']} {pet['name']} ({pet['species']}, {pet['breed']})")
@@ -0,0 +1,232 @@
+"""Rendered-fragment cache for templates.
+
+    {% cache 'pet-grid', catalog_version(), grid_key %}
+      ... expensive markup ...
+    {% endcache %}
+
+The rendered HTML of the block is stored under its name, the key values
+given and a digest of the templates. Keys that include `catalog_version()`
+change whenever a pet is added, edited or deleted, so stale entries are
+never served and simply age out of the LRU.
+
+Two backends: `memory` (per-process LRU, the default) and `sqlite` (a small
+database in the instance folder shared by all gunicorn workers, evicted by
+last use). Markup that is not final yet, such as an `<img>` standing in for
+photo derivatives still being built, calls `mark_volatile()` so the block is
+rendered but not stored.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import click
+from flask import current_app, g, has_request_context
+from flask.cli import AppGroup
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+import caching
+
+
+def mark_volatile():
+    """Keep the enclosing `{% cache %}` block (if any) out of the cache."""
+    if has_request_context():
+        g._fragment_volatile = True
+
+
+def request_catalog_version():
+    # Template helper: one lookup per request however many blocks use it
+    if not has_request_context():
+        return caching.catalog_version()
+    if '_fragment_catalog_version' not in g:
+        g._fragment_catalog_version = caching.catalog_version()
+    return g._fragment_catalog_version
+
+
+# -------------------------------
+# Backends
+# -------------------------------
+class MemoryBackend:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires and expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=0):
+        with self._lock:
+            self._entries[key] = (time.time() + timeout if timeout else 0, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """LRU shared between processes through a WAL-mode SQLite file."""
+
+    # Recording every hit would turn reads into writes; once a minute is
+    # plenty to tell recently used entries from stale ones
+    TOUCH_INTERVAL = 60
+
+    def __init__(self, path, max_entries=1000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._sets = 0
+
+    def _connection(self):
+        # sqlite3 connections must not cross threads or a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS fragment "
+                         "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, used REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_fragment_used ON fragment (used)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        row = conn.execute("SELECT value, expires, used FROM fragment WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, used = row
+        now = time.time()
+        if expires and expires < now:
+            return None
+        if now - used > self.TOUCH_INTERVAL:
+            conn.execute("UPDATE fragment SET used = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value, timeout=0):
+        conn = self._connection()
+        now = time.time()
+        try:
+            conn.execute("INSERT OR REPLACE INTO fragment (key, value, expires, used) VALUES (?, ?, ?, ?)",
+                         (key, value, now + timeout if timeout else 0, now))
+            self._sets += 1
+            if self._sets % 50 == 0:
+                self._evict(conn)
+        except sqlite3.OperationalError:
+            pass  # locked by another worker; the fragment is simply not cached this time
+
+    def _evict(self, conn):
+        conn.execute("DELETE FROM fragment WHERE key IN (SELECT key FROM fragment ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                     (self.max_entries,))
+        conn.execute("DELETE FROM fragment WHERE expires > 0 AND expires < ?", (time.time(),))
+
+    def clear(self):
+        self._connection().execute("DELETE FROM fragment")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM fragment").fetchone()[0]
+
+
+# -------------------------------
+# Jinja extension
+# -------------------------------
+class CacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_cache', [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _cache(self, args, caller):
+        cache = current_app.extensions.get('fragment_cache')
+        if cache is None or not cache.enabled:
+            return caller()
+        return cache.fetch(args, caller)
+
+
+class FragmentCache:
+    def __init__(self, app=None):
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_ENABLED', os.getenv('FRAGMENT_CACHE_ENABLED', '1') == '1')
+        app.config.setdefault('FRAGMENT_CACHE_BACKEND', os.getenv('FRAGMENT_CACHE_BACKEND', 'memory'))
+        app.config.setdefault('FRAGMENT_CACHE_SIZE', int(os.getenv('FRAGMENT_CACHE_SIZE', 1000)))
+        app.config.setdefault('FRAGMENT_CACHE_TIMEOUT', int(os.getenv('FRAGMENT_CACHE_TIMEOUT', 0)))
+        app.config.setdefault('FRAGMENT_CACHE_PATH', os.path.join(app.instance_path, 'fragments.sqlite3'))
+        self.enabled = app.config['FRAGMENT_CACHE_ENABLED']
+        self.timeout = app.config['FRAGMENT_CACHE_TIMEOUT']
+        if app.config['FRAGMENT_CACHE_BACKEND'] == 'sqlite':
+            self.backend = SQLiteBackend(app.config['FRAGMENT_CACHE_PATH'], app.config['FRAGMENT_CACHE_SIZE'])
+        else:
+            self.backend = MemoryBackend(app.config['FRAGMENT_CACHE_SIZE'])
+        # Markup changes with every deploy of the templates
+        http_cache = app.extensions.get('http_cache')
+        self.prefix = http_cache.template_digest if http_cache is not None else ''
+
+        app.jinja_env.add_extension(CacheExtension)
+        app.add_template_global(request_catalog_version, 'catalog_version')
+        app.extensions['fragment_cache'] = self
+        app.cli.add_command(fragments_cli)
+
+    def key(self, args):
+        return hashlib.sha1(f"{self.prefix}:{args!r}".encode()).hexdigest()
+
+    def fetch(self, args, render):
+        key = self.key(args)
+        value = self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return Markup(value)
+        self.misses += 1
+        outer = g.pop('_fragment_volatile', False)
+        value = render()
+        volatile = g.pop('_fragment_volatile', False)
+        g._fragment_volatile = outer or volatile
+        if not volatile:
+            self.backend.set(key, str(value), self.timeout)
+        return value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.backend)}
+
+
+# -------------------------------
+# CLI: flask fragments ...
+# -------------------------------
+fragments_cli = AppGroup('fragments', help="Manage the rendered-fragment cache.")
+
+
+@fragments_cli.command('clear')
+def clear_command():
+    """Drop every cached fragment."""
+    current_app.extensions['fragment_cache'].backend.clear()
+    click.echo("Fragment cache cleared.")
@@ -0,0 +1,27 @@
+"""gunicorn settings, picked up automatically by `gunicorn app:app`.
+
+    gunicorn app:app -w 4 --preload      # or GUNICORN_PRELOAD=1
+
+With `--preload` the master builds the app, compiles every template and
+loads the matching snapshot once before forking, so workers start warm and
+share those pages copy-on-write instead of each building their own copy.
+Pooled database connections are never inherited (see config.reset_after_fork).
+Settings that only hold per worker are refused with more than one worker.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '0') == '1'
+
+
+def on_starting(server):
+    from dotenv import load_dotenv
+    from admission import check_workers
+    load_dotenv()
+    if os.getenv('ADMISSION_ENABLED', '1') == '1':
+        check_workers(os.getenv('ADMISSION_BACKEND', 'sqlite'), server.cfg.workers)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from app import app, warm_up
+        warm_up(app)
@@ -0,0 +1,237 @@
+"""Responsive derivatives (resized WebP/JPEG) of pet photos.
+
+The seeded PNGs are several megabytes each and were sent at full size to
+~300px wide cards. `responsive_image()` renders a `<picture>` whose `srcset`
+points at downsized copies instead. Derivatives are built on a small thread
+pool, never on the request thread, and stored under `static/derived` keyed by
+the SHA-256 of the source image, so identical photos share their derivatives
+and a changed photo never serves a stale thumbnail. Until a photo's
+derivatives exist the helper simply emits the original image.
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import url_for
+from flask.cli import AppGroup
+from markupsafe import Markup
+
+from fragments import mark_volatile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow is optional
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('webp', 'jpeg')
+QUALITY = {'webp': 80, 'jpeg': 82}
+DEFAULT_SIZES = '(max-width: 600px) 100vw, (max-width: 992px) 50vw, 25vw'
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImagePipeline:
+    def __init__(self, app=None):
+        self.enabled = Image is not None
+        # static path -> {'webp': [(path, width), ...], 'jpeg': [...]}
+        self._ready = {}
+        self._pending = set()
+        self._failed = set()
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_DERIVED_FOLDER', os.path.join(app.static_folder, 'derived'))
+        app.config.setdefault('IMAGE_WIDTHS', (320, 640, 960))
+        app.config.setdefault('IMAGE_WORKERS', int(os.getenv('IMAGE_WORKERS', 2)))
+        # Only photos under these folders are ever opened (uploads: storage.py)
+        app.config.setdefault('IMAGE_SOURCE_FOLDERS', [os.path.join(app.static_folder, 'images'),
+                                                       app.config.get('UPLOAD_FOLDER',
+                                                                      os.path.join(app.static_folder, 'uploads'))])
+        self.static_folder = app.static_folder
+        self.source_folders = [os.path.realpath(folder) for folder in app.config['IMAGE_SOURCE_FOLDERS']]
+        self.derived_folder = app.config['IMAGE_DERIVED_FOLDER']
+        self.widths = sorted(app.config['IMAGE_WIDTHS'])
+        self.workers = app.config['IMAGE_WORKERS']
+        app.extensions['images'] = self
+        app.add_template_global(self.responsive_image)
+        app.cli.add_command(images_cli)
+
+    # --- Template helper ---
+
+    def responsive_image(self, path, alt='', sizes=DEFAULT_SIZES):
+        """`<picture>` for a static image path, or a plain `<img>` until its
+        derivatives are ready."""
+        original = url_for('static', filename=path)
+        variants = self.variants(path)
+        if not variants:
+            if self.enabled and path and path not in self._failed:
+                mark_volatile()  # don't let a fragment cache keep the fallback
+            return Markup('<img src="%s" alt="%s" loading="lazy" decoding="async">') % (original, alt)
+
+        webp = ', '.join(f"{url_for('static', filename=rel)} {width}w" for rel, width in variants['webp'])
+        jpeg = ', '.join(f"{url_for('static', filename=rel)} {width}w" for rel, width in variants['jpeg'])
+        # Plain src for browsers without srcset support: the second-smallest JPEG
+        fallback, _ = variants['jpeg'][min(1, len(variants['jpeg']) - 1)]
+        return Markup(
+            '<picture>'
+            '<source type="image/webp" srcset="%s" sizes="%s">'
+            '<img src="%s" srcset="%s" sizes="%s" alt="%s" loading="lazy" decoding="async">'
+            '</picture>'
+        ) % (webp, sizes, url_for('static', filename=fallback), jpeg, sizes, alt)
+
+    def variants(self, path):
+        """Derivatives of `path` if they exist; otherwise queue them and return None."""
+        if not self.enabled or not path:
+            return None
+        ready = self._ready.get(path)
+        if ready is not None or path in self._failed:
+            return ready
+        self.submit(path)
+        return None
+
+    # --- Processing ---
+
+    def source(self, path):
+        """Absolute path of a static image path, or None if it is outside the photo folders."""
+        if not path or os.path.isabs(path) or '\\' in path:
+            return None
+        source = os.path.realpath(os.path.join(self.static_folder, path))
+        if any(source.startswith(folder + os.sep) for folder in self.source_folders):
+            return source
+        return None
+
+    def submit(self, path):
+        """Build derivatives for a static image path on the worker pool."""
+        if not self.enabled or path in self._failed:
+            return None
+        if self.source(path) is None:
+            self._failed.add(path)
+            logger.warning("Not building derivatives for %r: outside the photo folders", path)
+            return None
+        with self._lock:
+            if path in self._pending:
+                return None
+            self._pending.add(path)
+        return self._pool().submit(self._build_safely, path)
+
+    def _pool(self):
+        # Pools do not survive a fork, so each gunicorn worker gets its own
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='image-derivatives')
+        return self._executor
+
+    def _build_safely(self, path):
+        try:
+            return self.build(path)
+        except FileNotFoundError:
+            self._failed.add(path)
+            logger.warning("No source image for %s; serving it without derivatives", path)
+        except Exception:
+            # Do not retry on every render; `flask images build` retries
+            self._failed.add(path)
+            logger.exception("Could not build derivatives for %s", path)
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def build(self, path):
+        """Synchronously build (or find cached) derivatives for `path`."""
+        source = self.source(path)
+        if source is None:
+            raise ValueError(f"{path!r} is not inside the photo folders")
+        digest = file_digest(source)
+        rel_dir = os.path.relpath(os.path.join(self.derived_folder, digest[:2]), self.static_folder)
+        out_dir = os.path.join(self.static_folder, rel_dir)
+
+        with Image.open(source) as image:
+            source_width = image.width
+            widths = [w for w in self.widths if w < source_width] or [source_width]
+            expected = {(fmt, w): os.path.join(rel_dir, f"{digest[:32]}-{w}.{fmt}") for fmt in FORMATS for w in widths}
+            missing = [key for key, rel in expected.items()
+                       if not os.path.exists(os.path.join(self.static_folder, rel))]
+            if missing:
+                os.makedirs(out_dir, exist_ok=True)
+                image = ImageOps.exif_transpose(image)
+                # Largest first, each width resized from the previous one
+                current = image
+                for width in sorted(widths, reverse=True):
+                    height = max(1, round(current.height * width / current.width))
+                    if width != current.width:
+                        current = current.resize((width, height), Image.LANCZOS)
+                    for fmt in FORMATS:
+                        if (fmt, width) in missing:
+                            self._save(current, fmt, os.path.join(self.static_folder, expected[(fmt, width)]))
+
+        variants = {fmt: [(expected[(fmt, w)].replace(os.sep, '/'), w) for w in widths] for fmt in FORMATS}
+        self._ready[path] = variants
+        return variants
+
+    def _save(self, image, fmt, target):
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            # JPEG has no alpha; flatten transparent PNGs onto white
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        options = {'quality': QUALITY[fmt]}
+        if fmt == 'jpeg':
+            options.update(optimize=True, progressive=True)
+        else:
+            options.update(method=4)
+        image.save(tmp_path, format=fmt.upper(), **options)
+        os.replace(tmp_path, target)
+
+
+# -------------------------------
+# CLI: flask images ...
+# -------------------------------
+images_cli = AppGroup('images', help="Manage responsive image derivatives.")
+
+
+@images_cli.command('build')
+def build_command():
+    """Build derivatives for every pet photo and static image."""
+    from flask import current_app
+    from models import Pet
+
+    pipeline = current_app.extensions['images']
+    if not pipeline.enabled:
+        raise click.ClickException("Pillow is not installed.")
+    paths = {pet.img for pet in Pet.query.with_entities(Pet.img)}
+    images_dir = os.path.join(current_app.static_folder, 'images')
+    paths.update(f"images/{name}" for name in os.listdir(images_dir)
+                 if name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')))
+    built = 0
+    for path in sorted(paths):
+        source = pipeline.source(path)
+        if source is None:
+            click.echo(f"outside the photo folders: {path}")
+            continue
+        if not os.path.exists(source):
+            click.echo(f"missing: {path}")
+            continue
+        pipeline.build(path)
+        built += 1
+    click.echo(f"Derivatives ready for {built} images.")
@@ -0,0 +1,371 @@
+"""Adopter-to-pet matching over a column-oriented NumPy snapshot.
+
+`/match` ranks the whole catalogue against an adopter's preferences:
+
+* `species` - preferred species (any of them scores `WEIGHTS['species']`)
+* `min_age` / `max_age` - full marks inside the range, fading out over
+  `AGE_FALLOFF` years outside it
+* `breeds` - `{breed substring: affinity 0..1}`, e.g. `{"retriever": 1}`
+* `terms` - free-text words matched against names and breeds
+
+Each worker keeps the catalogue as parallel NumPy arrays (ids, ages, and
+species, breed and name codes into small vocabularies) and scores every row
+in a handful of vectorised operations, then takes the top k with
+`argpartition`. Text is only ever matched against the distinct values. Writers
+append the id ranges they touch to `pet_change`; before answering, the
+snapshot replays the log entries it has not seen, re-reading only those rows.
+If it has fallen behind the retained log it reloads from scratch.
+
+Log ids are handed out when a writer inserts its entry but only become
+visible when it commits, so on PostgreSQL an entry can appear after one with
+a higher id. Readers keep a `ChangeCursor`, which remembers the ids it has
+seen in the last `REPLAY_WINDOW`, and look through that window again on every
+read for entries that committed late. The same cursor is used by suggest.py
+and featured.py.
+"""
+import threading
+
+import numpy as np
+from sqlalchemy import delete, event, func, select
+
+from models import db, Pet, PetChange
+
+WEIGHTS = {'species': 3.0, 'age': 2.0, 'breed': 2.0, 'term': 1.0}
+AGE_FALLOFF = 3.0
+MAX_TERMS = 10
+MAX_LIMIT = 100
+
+# Log entries kept for lagging workers; older ones force a full reload
+CHANGELOG_KEEP = 10000
+# Pruning runs once this many entries past CHANGELOG_KEEP have piled up
+PRUNE_EVERY = 1000
+# Ids below a reader's newest that are read again for late commits
+REPLAY_WINDOW = 1000
+LOAD_CHUNK = 50000
+
+
+# -------------------------------
+# Change log (written in the same transaction as the change)
+# -------------------------------
+def record_changes(connection, first_id, last_id):
+    connection.execute(PetChange.__table__.insert().values(first_id=first_id, last_id=last_id))
+
+
+def prune_changes(connection):
+    # Two queries: SQLite only answers a lone min() or max() from the index
+    newest = connection.execute(select(func.max(PetChange.id))).scalar()
+    if newest is None:
+        return
+    oldest = connection.execute(select(func.min(PetChange.id))).scalar()
+    if newest - oldest >= CHANGELOG_KEEP + PRUNE_EVERY:
+        connection.execute(delete(PetChange).where(PetChange.id <= newest - CHANGELOG_KEEP))
+
+
+def _after_flush(session, flush_context):
+    ids = [obj.id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+           if isinstance(obj, Pet) and obj.id is not None]
+    if not ids:
+        return
+    connection = session.connection()
+    if len(ids) == 1:
+        record_changes(connection, ids[0], ids[0])
+    else:
+        connection.execute(PetChange.__table__.insert(), [{'first_id': i, 'last_id': i} for i in ids])
+    prune_changes(connection)
+
+
+def track_changes():
+    """Log ORM changes to pets in `pet_change` (idempotent)."""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+class ChangeCursor:
+    """How far a reader has got: the newest log id it has seen, and every id
+    it has seen within `REPLAY_WINDOW` of it."""
+
+    def __init__(self, seq=0, seen=()):
+        self.seq = seq
+        self.seen = frozenset(seen)
+
+    @property
+    def low(self):
+        return self.seq - REPLAY_WINDOW
+
+
+def cursor_at(connection):
+    """A cursor at the current end of the log; take it before reading the pets."""
+    newest = connection.execute(select(func.max(PetChange.id))).scalar() or 0
+    seen = connection.execute(select(PetChange.id).where(PetChange.id > newest - REPLAY_WINDOW)).scalars()
+    return ChangeCursor(newest, seen)
+
+
+def has_changes(connection, cursor):
+    """Whether the log has entries `cursor` has not seen; one cheap query."""
+    newest, count = connection.execute(select(func.max(PetChange.id), func.count())
+                                       .where(PetChange.id > cursor.low)).one()
+    return (newest or 0) > cursor.seq or count != len(cursor.seen)
+
+
+def read_changes(connection, cursor):
+    """`(changes, cursor)`: the `(id, first_id, last_id)` entries `cursor` has
+    not seen, in log order, and a cursor past them. `changes` is None if the
+    log has been pruned past the cursor, and the reader has to reload."""
+    rows = connection.execute(select(PetChange.id, PetChange.first_id, PetChange.last_id)
+                              .where(PetChange.id > cursor.low).order_by(PetChange.id)).all()
+    changes = [row for row in rows if row[0] not in cursor.seen]
+    if changes and connection.execute(select(func.min(PetChange.id))).scalar() > cursor.seq + 1:
+        return None, cursor
+    seq = max([cursor.seq] + [row[0] for row in rows[-1:]])
+    return changes, ChangeCursor(seq, (row[0] for row in rows if row[0] > seq - REPLAY_WINDOW))
+
+
+# -------------------------------
+# Snapshot
+# -------------------------------
+class Snapshot:
+    """Immutable column arrays; refreshing builds a new one."""
+
+    def __init__(self, ids, ages, species, breeds, names, species_vocab, breed_vocab, name_vocab, name_values,
+                 cursor):
+        self.ids = ids
+        self.ages = ages
+        self.species = species
+        self.breeds = breeds
+        self.names = names
+        self.species_vocab = species_vocab
+        self.breed_vocab = breed_vocab
+        # Append-only and shared between snapshots; only touched under the
+        # engine lock. Scoring reads `name_values`, never the dict.
+        self.name_vocab = name_vocab
+        self.name_values = name_values
+        self.cursor = cursor
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _encode(values, vocab, added=None):
+    codes = []
+    for value in values:
+        code = vocab.get(value)
+        if code is None:
+            code = vocab[value] = len(vocab)
+            if added is not None:
+                added.append(value)
+        codes.append(code)
+    return codes
+
+
+def _columns(rows, species_vocab, breed_vocab, name_vocab, new_names):
+    ids, ages, species, breeds, names = zip(*rows) if rows else ((), (), (), (), ())
+    return (
+        np.array(ids, dtype=np.int64),
+        np.array(ages, dtype=np.int32),
+        np.array(_encode(species, species_vocab), dtype=np.int32),
+        np.array(_encode(breeds, breed_vocab), dtype=np.int32),
+        np.array(_encode([name.lower() for name in names], name_vocab, new_names), dtype=np.int32),
+    )
+
+
+def _name_array(names):
+    return np.array([name.encode('utf-8') for name in names], dtype=np.bytes_)
+
+
+def _select_rows():
+    return select(Pet.id, Pet.age, Pet.species, Pet.breed, Pet.name)
+
+
+def load_snapshot(connection):
+    """Read the whole pet table, one keyset chunk at a time."""
+    cursor = cursor_at(connection)
+    species_vocab, breed_vocab, name_vocab, names = {}, {}, {}, []
+    parts = []
+    last_id = 0
+    while True:
+        rows = connection.execute(_select_rows().where(Pet.id > last_id).order_by(Pet.id).limit(LOAD_CHUNK)).all()
+        if not rows:
+            break
+        parts.append(_columns(rows, species_vocab, breed_vocab, name_vocab, names))
+        last_id = rows[-1][0]
+    if not parts:
+        parts.append(_columns([], species_vocab, breed_vocab, name_vocab, names))
+    columns = [np.concatenate([part[i] for part in parts]) for i in range(5)]
+    return Snapshot(*columns, species_vocab, breed_vocab, name_vocab, _name_array(names), cursor)
+
+
+def apply_changes(snapshot, connection):
+    """Return a snapshot with the logged changes it has not seen applied, or
+    None if the log no longer reaches back that far."""
+    changes, cursor = read_changes(connection, snapshot.cursor)
+    if changes is None:
+        return None
+    if not changes:
+        return snapshot
+
+    ranges = {(first_id, last_id) for _, first_id, last_id in changes}
+    singles = sorted({first_id for first_id, last_id in ranges if first_id == last_id})
+    spans = [(first_id, last_id) for first_id, last_id in ranges if first_id != last_id]
+
+    rows = []
+    for start in range(0, len(singles), 500):
+        rows += connection.execute(_select_rows().where(Pet.id.in_(singles[start:start + 500]))).all()
+    for first_id, last_id in spans:
+        rows += connection.execute(_select_rows().where(Pet.id.between(first_id, last_id))).all()
+
+    # Drop every touched id (deleted ones simply do not come back) and append
+    # the current version of the rows that still exist
+    touched = np.array(singles, dtype=np.int64)
+    keep = ~np.isin(snapshot.ids, touched)
+    for first_id, last_id in spans:
+        keep &= (snapshot.ids < first_id) | (snapshot.ids > last_id)
+    species_vocab, breed_vocab = dict(snapshot.species_vocab), dict(snapshot.breed_vocab)
+    new_names = []
+    fresh = _columns(rows, species_vocab, breed_vocab, snapshot.name_vocab, new_names)
+    old = (snapshot.ids, snapshot.ages, snapshot.species, snapshot.breeds, snapshot.names)
+    columns = [np.concatenate([column[keep], new]) for column, new in zip(old, fresh)]
+    name_values = np.concatenate([snapshot.name_values, _name_array(new_names)]) if new_names \
+        else snapshot.name_values
+    return Snapshot(*columns, species_vocab, breed_vocab, snapshot.name_vocab, name_values, cursor)
+
+
+# -------------------------------
+# Scoring
+# -------------------------------
+def _vocab_mask(vocab, predicate):
+    mask = np.zeros(len(vocab), dtype=bool)
+    for value, code in vocab.items():
+        mask[code] = predicate(value.lower())
+    return mask
+
+
+def score(snapshot, species=(), min_age=None, max_age=None, breeds=None, terms=()):
+    """Score every pet in the snapshot; returns a float32 array aligned with `snapshot.ids`."""
+    scores = np.zeros(len(snapshot), dtype=np.float32)
+    if species:
+        wanted = {value.lower() for value in species}
+        scores += WEIGHTS['species'] * _vocab_mask(snapshot.species_vocab, wanted.__contains__)[snapshot.species]
+    if min_age is not None or max_age is not None:
+        low = min_age if min_age is not None else 0
+        high = max_age if max_age is not None else np.iinfo(np.int32).max
+        ages = snapshot.ages.astype(np.float32)
+        distance = np.maximum(low - ages, 0) + np.maximum(ages - high, 0)
+        scores += WEIGHTS['age'] * np.clip(1 - distance / AGE_FALLOFF, 0, 1)
+    if breeds:
+        affinity = np.zeros(len(snapshot.breed_vocab), dtype=np.float32)
+        for value, code in snapshot.breed_vocab.items():
+            value = value.lower()
+            affinity[code] = max((weight for fragment, weight in breeds.items() if fragment.lower() in value),
+                                 default=0.0)
+        scores += WEIGHTS['breed'] * affinity[snapshot.breeds]
+    for term in list(terms)[:MAX_TERMS]:
+        term = term.lower()
+        in_breed = _vocab_mask(snapshot.breed_vocab, lambda value: term in value)[snapshot.breeds]
+        in_name = (np.strings.find(snapshot.name_values, term.encode('utf-8')) >= 0)[snapshot.names]
+        scores += WEIGHTS['term'] * (in_breed | in_name)
+    return scores
+
+
+def top_k(snapshot, scores, k):
+    """`[(pet id, score)]` for the k best scores, ties broken by lowest id."""
+    k = min(k, len(scores))
+    if k == 0:
+        return []
+    kth = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    threshold = scores[kth].min()
+    # argpartition cuts ties at the k-th score arbitrarily: keep the lowest ids
+    above = np.flatnonzero(scores > threshold)
+    ties = np.flatnonzero(scores == threshold)
+    need = k - len(above)
+    if len(ties) > need:
+        ties = ties[np.argpartition(snapshot.ids[ties], need - 1)[:need]]
+    candidates = np.concatenate([above, ties])
+    chosen = candidates[np.lexsort((snapshot.ids[candidates], -scores[candidates]))]
+    return list(zip(snapshot.ids[chosen].tolist(), scores[chosen].tolist()))
+
+
+def _split(value, name):
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(',') if part.strip()]
+    if value is not None and not isinstance(value, list):
+        raise ValueError(f"{name} must be a string or a list")
+    return [str(part).strip() for part in value or () if str(part).strip()]
+
+
+def _optional_int(value, name):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number") from None
+
+
+def parse_preferences(data):
+    """Preferences from a JSON body or query args; raises ValueError.
+
+    Query args use `species=Dog,Cat`, `breeds=retriever:1,beagle:0.5` and
+    `q=free text`; JSON bodies may use lists and a `{breed: weight}` object.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Preferences must be a JSON object")
+    breeds = data.get('breeds') or {}
+    if not isinstance(breeds, dict):
+        parsed = {}
+        for part in _split(breeds, "breeds"):
+            fragment, _, weight = part.partition(':')
+            try:
+                parsed[fragment.strip()] = float(weight) if weight else 1.0
+            except ValueError:
+                raise ValueError(f"Invalid breed weight: {part}") from None
+        breeds = parsed
+    try:
+        breeds = {str(fragment): max(0.0, min(float(weight), 1.0)) for fragment, weight in breeds.items() if fragment}
+    except (TypeError, ValueError):
+        raise ValueError("Breed weights must be numbers") from None
+    terms = data.get('terms', data.get('q')) or []
+    if isinstance(terms, str):
+        terms = terms.split()
+    elif not isinstance(terms, list):
+        raise ValueError("terms must be a string or a list")
+    return {
+        'species': _split(data.get('species'), "species"),
+        'min_age': _optional_int(data.get('min_age'), "min_age"),
+        'max_age': _optional_int(data.get('max_age'), "max_age"),
+        'breeds': breeds,
+        'terms': [str(term) for term in terms if str(term).strip()],
+    }
+
+
+# -------------------------------
+# Flask integration
+# -------------------------------
+class MatchEngine:
+    def __init__(self, app=None):
+        self._snapshot = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        track_changes()
+        app.extensions['matching'] = self
+
+    def snapshot(self):
+        """The current snapshot, caught up with the change log."""
+        with db.engine.connect() as connection:
+            snapshot = self._snapshot
+            if snapshot is not None and not has_changes(connection, snapshot.cursor):
+                return snapshot
+            with self._lock:
+                snapshot = self._snapshot
+                if snapshot is not None:
+                    snapshot = apply_changes(snapshot, connection)
+                if snapshot is None:
+                    snapshot = load_snapshot(connection)
+                self._snapshot = snapshot
+            return snapshot
+
+    def match(self, limit=20, **preferences):
+        snapshot = self.snapshot()
+        return top_k(snapshot, score(snapshot, **preferences), min(limit, MAX_LIMIT))
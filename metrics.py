@@ -0,0 +1,315 @@
+"""Per-request performance instrumentation.
+
+For every request this records wall time, SQL query count and time (from
+SQLAlchemy engine events), template render time (Flask's template signals)
+and outbound HTTP time (the dog facts API), exposes them as Prometheus
+histograms at `/metrics`, and adds a `Server-Timing` header so the same
+numbers show up in the browser's network panel.
+
+Each gunicorn worker keeps its own registry. With `METRICS_DIR` set, workers
+also write periodic snapshots there and `/metrics` sums the snapshots of all
+live workers, so a scrape sees the whole server rather than one worker.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import Response, abort, before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import admission
+import dog_facts
+import submissions
+from workers import pid_alive
+
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+SNAPSHOT_INTERVAL = 5.0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+# -------------------------------
+# Metric types
+# -------------------------------
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def merge(self, snapshot):
+        for labels, value in snapshot:
+            self.inc(*labels, amount=value)
+
+    def render(self):
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {value}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(entry)] for labels, entry in self._values.items()]
+
+    def merge(self, snapshot):
+        with self._lock:
+            for labels, other in snapshot:
+                labels = tuple(labels)
+                entry = self._values.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(other):
+                    entry[i] += value
+
+    def render(self):
+        for labels, entry in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), entry[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {entry[-1]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.gauges = {}
+
+    def add(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name, help, collect):
+        """Register a gauge whose value is read from `collect()` at scrape time."""
+        self.gauges[name] = (help, collect)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def render(self, extra_snapshots=()):
+        # Sum other workers' snapshots into a scratch copy of each metric
+        lines = []
+        for name, metric in self.metrics.items():
+            merged = type(metric)(metric.name, metric.help, metric.labelnames,
+                                  **({'buckets': metric.buckets} if metric.kind == 'histogram' else {}))
+            merged.merge(metric.snapshot())
+            for snapshot in extra_snapshots:
+                merged.merge(snapshot.get(name, []))
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(merged.render())
+        for name, (help, collect) in self.gauges.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {collect()}")
+        return '\n'.join(lines) + '\n'
+
+
+# -------------------------------
+# Flask integration
+# -------------------------------
+class Metrics:
+    def __init__(self, app=None):
+        self.registry = Registry()
+        r = self.registry
+        self.requests = r.add(Counter(
+            'pawfect_requests_total', "Requests handled.", ('endpoint', 'method', 'status')))
+        self.duration = r.add(Histogram(
+            'pawfect_request_duration_seconds', "Wall time per request.", ('endpoint', 'method')))
+        self.sql_queries = r.add(Histogram(
+            'pawfect_request_sql_queries', "SQL statements per request.", ('endpoint',), COUNT_BUCKETS))
+        self.sql_time = r.add(Histogram(
+            'pawfect_request_sql_seconds', "Time in SQL statements per request.", ('endpoint',)))
+        self.template_time = r.add(Histogram(
+            'pawfect_request_template_seconds', "Template render time per request.", ('endpoint',)))
+        self.http_time = r.add(Histogram(
+            'pawfect_request_http_seconds', "Outbound HTTP time per request.", ('endpoint',)))
+        self.outbound = r.add(Histogram(
+            'pawfect_outbound_http_seconds', "Outbound HTTP calls, including background ones.",
+            ('target', 'outcome')))
+        self.submission_flush = r.add(Histogram(
+            'pawfect_submission_flush_seconds', "Write-behind submission batch latency."))
+        self.admission = r.add(Counter(
+            'pawfect_admission_total', "Write requests admitted or shed by admission control.",
+            ('endpoint', 'outcome')))
+        self.admission_wait = r.add(Histogram(
+            'pawfect_admission_wait_seconds', "Time write requests spent queued for a slot.", ('endpoint',)))
+        self._last_snapshot = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', os.getenv('METRICS_ENABLED', '1') == '1')
+        app.config.setdefault('METRICS_DIR', os.getenv('METRICS_DIR'))
+        app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        self.snapshot_dir = app.config['METRICS_DIR']
+        self.token = app.config['METRICS_TOKEN']
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+        dog_facts.facts_fetched.connect(self._on_facts_fetched)
+        submissions.batch_flushed.connect(self._on_batch_flushed)
+        admission.admission_decided.connect(self._on_admission)
+
+        queue = app.extensions.get('submission_queue')
+        if queue is not None:
+            self.registry.gauge('pawfect_submission_queue_depth', "Submissions waiting to be written.",
+                                lambda: queue.depth)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+
+    # --- Collection ---
+
+    def _before_request(self):
+        g.perf = {'start': time.perf_counter(), 'sql': 0, 'sql_time': 0.0, 'tpl_time': 0.0, 'http_time': 0.0}
+
+    def _after_request(self, response):
+        perf = g.pop('perf', None)
+        if perf is None:
+            return response
+        elapsed = time.perf_counter() - perf['start']
+        endpoint = request.endpoint or 'unmatched'
+        self.requests.inc(endpoint, request.method, response.status_code)
+        self.duration.observe(elapsed, endpoint, request.method)
+        self.sql_queries.observe(perf['sql'], endpoint)
+        self.sql_time.observe(perf['sql_time'], endpoint)
+        self.template_time.observe(perf['tpl_time'], endpoint)
+        self.http_time.observe(perf['http_time'], endpoint)
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.1f}, '
+            f'db;dur={perf["sql_time"] * 1000:.1f};desc="{perf["sql"]} queries", '
+            f'tpl;dur={perf["tpl_time"] * 1000:.1f}, '
+            f'http;dur={perf["http_time"] * 1000:.1f}'
+        )
+        if self.snapshot_dir and time.monotonic() - self._last_snapshot > SNAPSHOT_INTERVAL:
+            self._write_snapshot()
+        return response
+
+    def _current(self):
+        return g.get('perf') if has_request_context() else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('perf_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['perf_started'].pop()
+        perf = self._current()
+        if perf is not None:
+            perf['sql'] += 1
+            perf['sql_time'] += time.perf_counter() - started
+
+    def _handle_error(self, context):
+        if context.connection is not None and context.connection.info.get('perf_started'):
+            context.connection.info['perf_started'].pop()
+
+    def _before_render(self, app, template, context):
+        perf = self._current()
+        if perf is not None:
+            perf.setdefault('tpl_started', []).append(time.perf_counter())
+
+    def _after_render(self, app, template, context):
+        perf = self._current()
+        if perf is not None and perf.get('tpl_started'):
+            perf['tpl_time'] += time.perf_counter() - perf['tpl_started'].pop()
+
+    def _on_facts_fetched(self, sender, seconds, ok):
+        self.outbound.observe(seconds, 'dogfacts', 'ok' if ok else 'error')
+        perf = self._current()
+        if perf is not None:
+            perf['http_time'] += seconds
+
+    def _on_batch_flushed(self, sender, seconds, rows):
+        self.submission_flush.observe(seconds)
+
+    def _on_admission(self, sender, endpoint, outcome, waited):
+        self.admission.inc(endpoint, outcome)
+        if outcome != admission.RATE_LIMITED:
+            self.admission_wait.observe(waited, endpoint)
+
+    # --- Exposition ---
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.snapshot_dir, f"metrics-{pid}.json")
+
+    def _write_snapshot(self):
+        self._last_snapshot = time.monotonic()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        with open(f"{path}.tmp", 'w') as fh:
+            json.dump(self.registry.snapshot(), fh)
+        os.replace(f"{path}.tmp", path)
+
+    def _other_workers(self):
+        if not self.snapshot_dir:
+            return []
+        own = self._snapshot_path(os.getpid())
+        snapshots = []
+        for path in glob.glob(os.path.join(self.snapshot_dir, 'metrics-*.json')):
+            try:
+                pid = int(os.path.basename(path)[len('metrics-'):-len('.json')])
+                if path == own or not pid_alive(pid):
+                    continue
+                with open(path) as fh:
+                    snapshots.append(json.load(fh))
+            except (OSError, ValueError):
+                continue  # worker exited mid-read
+        return snapshots
+
+    def metrics_view(self):
+        if self.token and request.headers.get('Authorization') != f"Bearer {self.token}":
+            abort(401)
+        return Response(self.registry.render(self._other_workers()),
+                        mimetype='text/plain; version=0.0.4')
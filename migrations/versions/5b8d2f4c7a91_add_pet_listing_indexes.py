@@ -0,0 +1,32 @@
+"""add pet listing indexes
+
+Revision ID: 5b8d2f4c7a91
+Revises: 19e041eff26b
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d2f4c7a91'
+down_revision = '19e041eff26b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.create_index('ix_pet_species_id', ['species', 'id'], unique=False)
+        batch_op.create_index('ix_pet_species_age_id', ['species', 'age', 'id'], unique=False)
+        batch_op.create_index('ix_pet_age_id', ['age', 'id'], unique=False)
+        batch_op.create_index('ix_pet_breed_id', ['breed', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.drop_index('ix_pet_breed_id')
+        batch_op.drop_index('ix_pet_age_id')
+        batch_op.drop_index('ix_pet_species_age_id')
+        batch_op.drop_index('ix_pet_species_id')
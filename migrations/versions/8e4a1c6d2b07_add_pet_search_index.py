@@ -0,0 +1,61 @@
+"""add pet search index
+
+Revision ID: 8e4a1c6d2b07
+Revises: 5b8d2f4c7a91
+Create Date: 2026-10-18 11:40:05.918226
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4a1c6d2b07'
+down_revision = '5b8d2f4c7a91'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    # IF NOT EXISTS: `flask search create` may have built the index already
+    if dialect == 'sqlite':
+        # FTS5 trigram table over pet.name / pet.breed, kept in sync by triggers
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS pet_search USING fts5("
+            "name, breed, content='pet', content_rowid='id', tokenize='trigram')"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS pet_search_ai AFTER INSERT ON pet BEGIN "
+            "INSERT INTO pet_search(rowid, name, breed) VALUES (new.id, new.name, new.breed); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS pet_search_ad AFTER DELETE ON pet BEGIN "
+            "INSERT INTO pet_search(pet_search, rowid, name, breed) "
+            "VALUES ('delete', old.id, old.name, old.breed); END"
+        )
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS pet_search_au AFTER UPDATE OF name, breed ON pet BEGIN "
+            "INSERT INTO pet_search(pet_search, rowid, name, breed) "
+            "VALUES ('delete', old.id, old.name, old.breed); "
+            "INSERT INTO pet_search(rowid, name, breed) VALUES (new.id, new.name, new.breed); END"
+        )
+        op.execute("INSERT INTO pet_search(pet_search) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index('ix_pet_name_trgm', 'pet', ['name'], postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'}, if_not_exists=True)
+        op.create_index('ix_pet_breed_trgm', 'pet', ['breed'], postgresql_using='gin',
+                        postgresql_ops={'breed': 'gin_trgm_ops'}, if_not_exists=True)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS pet_search_au")
+        op.execute("DROP TRIGGER IF EXISTS pet_search_ad")
+        op.execute("DROP TRIGGER IF EXISTS pet_search_ai")
+        op.execute("DROP TABLE IF EXISTS pet_search")
+    elif dialect == 'postgresql':
+        op.drop_index('ix_pet_breed_trgm', table_name='pet')
+        op.drop_index('ix_pet_name_trgm', table_name='pet')
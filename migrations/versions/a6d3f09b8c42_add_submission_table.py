@@ -0,0 +1,35 @@
+"""add submission table
+
+Revision ID: a6d3f09b8c42
+Revises: f3c8d61b27e5
+Create Date: 2026-10-18 21:05:37.640219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3f09b8c42'
+down_revision = 'f3c8d61b27e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Older databases got this table from db.create_all() on startup
+    op.create_table(
+        'submission',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_name', sa.String(length=100), nullable=False),
+        sa.Column('surname', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('terms', sa.Boolean(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('submission')
@@ -0,0 +1,26 @@
+"""add pet img index
+
+Revision ID: c2f97a3e5d18
+Revises: 8e4a1c6d2b07
+Create Date: 2026-10-18 14:05:52.337190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2f97a3e5d18'
+down_revision = '8e4a1c6d2b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.create_index('ix_pet_img', ['img'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pet', schema=None) as batch_op:
+        batch_op.drop_index('ix_pet_img')
@@ -0,0 +1,33 @@
+"""add catalog version
+
+Revision ID: d41b7e9a0c36
+Revises: c2f97a3e5d18
+Create Date: 2026-10-18 16:40:11.918204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41b7e9a0c36'
+down_revision = 'c2f97a3e5d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app may already have created the table on startup
+    catalog_version = op.create_table(
+        'catalog_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+    if not op.get_bind().execute(sa.text("SELECT 1 FROM catalog_version WHERE id = 1")).first():
+        op.bulk_insert(catalog_version, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('catalog_version')
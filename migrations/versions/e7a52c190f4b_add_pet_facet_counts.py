@@ -0,0 +1,42 @@
+"""add pet facet counts
+
+Revision ID: e7a52c190f4b
+Revises: d41b7e9a0c36
+Create Date: 2026-10-18 18:02:47.530961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a52c190f4b'
+down_revision = 'd41b7e9a0c36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app may already have created the table on startup
+    op.create_table(
+        'pet_facet',
+        sa.Column('facet', sa.String(length=20), nullable=False),
+        sa.Column('value', sa.String(length=100), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('facet', 'value'),
+        if_not_exists=True,
+    )
+    # Backfill from the existing pets (same buckets as stats.AGE_BUCKETS)
+    op.execute("DELETE FROM pet_facet")
+    op.execute("INSERT INTO pet_facet (facet, value, count) "
+               "SELECT 'species', species, COUNT(*) FROM pet GROUP BY species")
+    op.execute("INSERT INTO pet_facet (facet, value, count) "
+               "SELECT 'breed', breed, COUNT(*) FROM pet GROUP BY breed")
+    op.execute("INSERT INTO pet_facet (facet, value, count) "
+               "SELECT 'age', bucket, COUNT(*) FROM ("
+               "SELECT CASE WHEN age <= 1 THEN 'Under 2' WHEN age <= 3 THEN '2-3' WHEN age <= 6 THEN '4-6' "
+               "WHEN age <= 10 THEN '7-10' ELSE '11+' END AS bucket FROM pet) AS aged GROUP BY bucket")
+
+
+def downgrade():
+    op.drop_table('pet_facet')
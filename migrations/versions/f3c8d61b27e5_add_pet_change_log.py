@@ -0,0 +1,32 @@
+"""add pet change log
+
+Revision ID: f3c8d61b27e5
+Revises: e7a52c190f4b
+Create Date: 2026-10-18 19:26:03.114872
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d61b27e5'
+down_revision = 'e7a52c190f4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The app may already have created the table on startup
+    op.create_table(
+        'pet_change',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('first_id', sa.Integer(), nullable=False),
+        sa.Column('last_id', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table('pet_change')
@@ -0,0 +1,120 @@
+from flask import current_app, has_app_context
+from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as BaseSession
+from sqlalchemy import Select
+
+
+class Session(BaseSession):
+    """Sends SELECTs to a read replica when the replica router allows it
+    (see replicas.py); flushes, raw SQL and anything after a write in the
+    same session stay on the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and isinstance(clause, Select) and not self._flushing and not self.info.get('wrote') \
+                and has_app_context():
+            router = current_app.extensions.get('replicas')
+            engine = router.read_engine() if router is not None else None
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': Session})
+
+
+# -------------------------------
+# Database Models
+# -------------------------------
+class Pet(db.Model):
+    # Composite indexes end in `id` so filtered listings can seek straight to
+    # the page cursor instead of scanning (see pagination.py)
+    __table_args__ = (
+        db.Index('ix_pet_species_id', 'species', 'id'),
+        db.Index('ix_pet_species_age_id', 'species', 'age', 'id'),
+        db.Index('ix_pet_age_id', 'age', 'id'),
+        db.Index('ix_pet_breed_id', 'breed', 'id'),
+        # Reference counting of uploaded photos (storage.py)
+        db.Index('ix_pet_img', 'img'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    img = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    age = db.Column(db.Integer, nullable=False)
+    breed = db.Column(db.String(100), nullable=False)
+    species = db.Column(db.String(100), nullable=False)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'img': self.img,
+            'name': self.name,
+            'age': self.age,
+            'breed': self.breed,
+            'species': self.species,
+        }
+
+    def __repr__(self):
+        return f'<Pet {self.name}>'
+
+
+def validate_pet(data):
+    """Clean the fields of a new pet (a form or an imported row).
+
+    Returns a dict ready for `Pet(**...)`; raises ValueError with a message
+    suitable for flashing.
+    """
+    fields = {}
+    for key in ('img', 'name', 'age', 'breed', 'species'):
+        value = data.get(key)
+        fields[key] = '' if value is None else str(value).strip()
+    if not all(fields[key] for key in ('name', 'age', 'breed', 'species')):
+        raise ValueError("Please fill in all required fields!")
+    try:
+        fields['age'] = int(fields['age'])
+    except ValueError:
+        raise ValueError("Age must be a number") from None
+    for key in ('img', 'name', 'breed', 'species'):
+        if len(fields[key]) > Pet.__table__.c[key].type.length:
+            raise ValueError(f"{key.capitalize()} is too long")
+    if fields['img'] and has_app_context():
+        # The image pipeline opens this path: keep it inside the photo folders
+        images = current_app.extensions.get('images')
+        if images is not None and images.source(fields['img']) is None:
+            raise ValueError("Img must be a path inside images/ or the upload folder")
+    return fields
+
+
+class Submission(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    first_name = db.Column(db.String(100), nullable=False)
+    surname = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(100), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    terms = db.Column(db.Boolean, nullable=False)
+
+    def __repr__(self):
+        return f'<Submission {self.first_name} {self.surname}>'
+
+
+class CatalogVersion(db.Model):
+    # Single row, bumped in the same transaction as any change to `pet`, so
+    # every worker agrees on when the catalogue last changed (caching.py)
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PetFacet(db.Model):
+    # Running pet counts per species / breed / age bucket, kept up to date
+    # with every change to `pet` (stats.py)
+    facet = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PetChange(db.Model):
+    # Append-only log of changed pet id ranges, so in-memory snapshots of the
+    # catalogue can catch up without reloading it (matching.py)
+    id = db.Column(db.Integer, primary_key=True)
+    first_id = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False)
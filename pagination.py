@@ -0,0 +1,126 @@
+"""Keyset (cursor) pagination for the pet listing.
+
+Pages are fetched with `WHERE (sort_key, id) > cursor ORDER BY sort_key, id
+LIMIT n`, so the cost of a page depends on the page size rather than on how
+deep into the catalogue it is, and rows inserted or deleted elsewhere never
+shift the items of the page a visitor is on.
+"""
+import base64
+import json
+
+from sqlalchemy import and_, or_
+
+from models import Pet
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# Allowed ?sort= values; `id` is always the tie-breaker
+SORT_KEYS = {
+    'id': None,
+    'age': Pet.age,
+}
+
+
+class Page:
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def clamp_page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(pet, sort='id'):
+    column = SORT_KEYS[sort]
+    key = [getattr(pet, column.key) if column is not None else None, pet.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort='id'):
+    """Return `(sort_value, id)`; raises ValueError for a malformed cursor or
+    one whose sort value does not fit the `sort` key (a tampered or foreign one)."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pet_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError):
+        raise ValueError("Invalid page cursor")
+    column = SORT_KEYS[sort]
+    # `type() is`, not isinstance(): JSON true/false must not pass for numbers
+    expected = type(None) if column is None else column.type.python_type
+    if type(pet_id) is not int or type(value) is not expected:
+        raise ValueError("Invalid page cursor")
+    return value, pet_id
+
+
+def _after(column, value, pet_id):
+    if column is None:
+        return Pet.id > pet_id
+    return or_(column > value, and_(column == value, Pet.id > pet_id))
+
+
+def _before(column, value, pet_id):
+    if column is None:
+        return Pet.id < pet_id
+    return or_(column < value, and_(column == value, Pet.id < pet_id))
+
+
+def page_query(query, sort='id', after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    """The query for one page: `per_page + 1` rows past the cursor.
+
+    Works on ORM queries and `select()` statements alike, so callers with an
+    async session can run it themselves and hand the rows to `make_page()`.
+    """
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    column = SORT_KEYS[sort]
+    order = [column, Pet.id] if column is not None else [Pet.id]
+
+    if before:
+        value, pet_id = decode_cursor(before, sort)
+        return (query.filter(_before(column, value, pet_id))
+                .order_by(*[c.desc() for c in order])
+                .limit(per_page + 1))
+    query = query.order_by(*order)
+    if after:
+        value, pet_id = decode_cursor(after, sort)
+        query = query.filter(_after(column, value, pet_id))
+    return query.limit(per_page + 1)
+
+
+def make_page(rows, sort='id', after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    """Build the Page from the rows `page_query()` returned; None means
+    everything before the cursor was deleted and the caller should start over."""
+    if before:
+        if not rows:
+            return None
+        has_prev = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        has_next = True
+    else:
+        has_next = len(rows) > per_page
+        items = rows[:per_page]
+        has_prev = after is not None
+
+    return Page(
+        items,
+        per_page,
+        next_cursor=encode_cursor(items[-1], sort) if items and has_next else None,
+        prev_cursor=encode_cursor(items[0], sort) if items and has_prev else None,
+    )
+
+
+def paginate(query, sort='id', after=None, before=None, per_page=DEFAULT_PAGE_SIZE):
+    """Fetch one page of `query` after (or before) the given cursor."""
+    rows = page_query(query, sort, after, before, per_page).all()
+    page = make_page(rows, sort, after, before, per_page)
+    if page is None:
+        return paginate(query, sort, per_page=per_page)
+    return page
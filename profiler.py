@@ -0,0 +1,275 @@
+"""Sampling profiler for slow requests (opt-in).
+
+    PROFILER_ENABLED=1 PROFILER_TOKEN=secret gunicorn app:app
+
+While enabled, a background thread samples the Python stack of every
+in-flight request each `PROFILER_INTERVAL_MS` milliseconds. The SQL statements
+a request runs are recorded alongside, with their durations. A request that
+runs over `PROFILER_THRESHOLD_MS`, or carries `X-Profile: <token>`, keeps its
+profile; the others are discarded when they finish. Kept profiles go into a
+ring buffer of the last `PROFILER_KEEP`. The buffer is per worker, or shared
+by all workers as files in `PROFILER_DIR`.
+
+Stacks are stored collapsed (`frame;frame;frame count` per line), the input
+format of flamegraph.pl, speedscope and most flame graph viewers.
+
+    GET /_profiles                  list (newest first)
+    GET /_profiles/<id>.txt         collapsed stacks
+    GET /_profiles/<id>.json        everything, including the SQL
+
+All three require `Authorization: Bearer <PROFILER_TOKEN>` and are not there
+without a token. A request profiled through the header gets its profile's
+id back in `X-Profile-Id`.
+"""
+import glob
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from flask import Response, abort, g, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_SAMPLES = 20000
+MAX_STATEMENTS = 500
+MAX_STACK_DEPTH = 200
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    # co_qualname is new in Python 3.11
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse(frame):
+    """`root;...;leaf` for a frame and its callers."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profile:
+    def __init__(self, forced):
+        self.id = uuid.uuid4().hex[:12]
+        self.forced = forced
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.stacks = Counter()
+        self.samples = 0
+        self.statements = []
+        self.sql_time = 0.0
+        self.status = None
+        # The sampler thread writes while the request thread records and summarises
+        self._lock = threading.Lock()
+
+    def sample(self, frame):
+        if self.samples < MAX_SAMPLES:
+            stack = collapse(frame)
+            with self._lock:
+                self.stacks[stack] += 1
+                self.samples += 1
+
+    def record(self, statement, seconds):
+        with self._lock:
+            self.sql_time += seconds
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append({'sql': statement, 'ms': round(seconds * 1000, 3)})
+
+    def copy(self):
+        """`(stacks, samples, statements, sql_time)` as of now."""
+        with self._lock:
+            return self.stacks.copy(), self.samples, list(self.statements), self.sql_time
+
+
+class Profiler:
+    def __init__(self, app=None):
+        self._active = {}
+        self._profiles = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILER_ENABLED', os.getenv('PROFILER_ENABLED', '0') == '1')
+        app.config.setdefault('PROFILER_TOKEN', os.getenv('PROFILER_TOKEN'))
+        app.config.setdefault('PROFILER_THRESHOLD_MS', float(os.getenv('PROFILER_THRESHOLD_MS', 500)))
+        app.config.setdefault('PROFILER_INTERVAL_MS', float(os.getenv('PROFILER_INTERVAL_MS', 5)))
+        app.config.setdefault('PROFILER_KEEP', int(os.getenv('PROFILER_KEEP', 50)))
+        app.config.setdefault('PROFILER_DIR', os.getenv('PROFILER_DIR'))
+        app.extensions['profiler'] = self
+        if not app.config['PROFILER_ENABLED']:
+            return
+        self.token = app.config['PROFILER_TOKEN']
+        self.threshold = app.config['PROFILER_THRESHOLD_MS'] / 1000
+        self.interval = app.config['PROFILER_INTERVAL_MS'] / 1000
+        self.keep = app.config['PROFILER_KEEP']
+        self.directory = app.config['PROFILER_DIR']
+        self._profiles = deque(maxlen=self.keep)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+        if self.token:
+            app.add_url_rule('/_profiles', 'profiles', self.list_view)
+            app.add_url_rule('/_profiles/<profile_id>.<fmt>', 'profile', self.profile_view)
+
+    # --- Sampling ---
+
+    def _ensure_sampler(self):
+        # Threads do not survive a fork: each gunicorn worker starts its own
+        if self._thread is None or self._pid != os.getpid():
+            with self._lock:
+                if self._thread is None or self._pid != os.getpid():
+                    self._pid = os.getpid()
+                    self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+                    self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._active:
+                continue
+            frames = sys._current_frames()
+            for ident, profile in list(self._active.items()):
+                frame = frames.get(ident)
+                if frame is not None:
+                    profile.sample(frame)
+            del frames
+
+    def _before_request(self):
+        header = request.headers.get('X-Profile')
+        forced = bool(self.token and header and hmac.compare_digest(header, self.token))
+        self._ensure_sampler()
+        g.profile = self._active[threading.get_ident()] = Profile(forced)
+
+    def _after_request(self, response):
+        profile = g.get('profile')
+        if profile is not None:
+            profile.status = response.status_code
+            if profile.forced:
+                response.headers['X-Profile-Id'] = profile.id
+        return response
+
+    def _teardown_request(self, exc):
+        profile = self._active.pop(threading.get_ident(), None)
+        if profile is None:
+            return
+        elapsed = time.perf_counter() - profile.started
+        if profile.forced or elapsed >= self.threshold:
+            self._store(self._summary(profile, elapsed, exc))
+
+    # --- SQL ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profiler_started'].pop()
+        profile = self._active.get(threading.get_ident())
+        if profile is not None:
+            profile.record(statement, time.perf_counter() - started)
+
+    def _handle_error(self, context):
+        if context.connection is not None and context.connection.info.get('profiler_started'):
+            context.connection.info['profiler_started'].pop()
+
+    # --- Storage ---
+
+    def _summary(self, profile, elapsed, exc):
+        stacks, samples, statements, sql_time = profile.copy()
+        return {
+            'id': profile.id,
+            'time': profile.wall_started,
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': profile.status if exc is None else 500,
+            'duration_ms': round(elapsed * 1000, 1),
+            'sql_ms': round(sql_time * 1000, 1),
+            'sql_count': len(statements),
+            'trigger': 'header' if profile.forced else 'threshold',
+            'interval_ms': self.interval * 1000,
+            'samples': samples,
+            'pid': os.getpid(),
+            'stacks': [[stack, count] for stack, count in stacks.most_common()],
+            'statements': statements,
+        }
+
+    def _store(self, summary):
+        if not self.directory:
+            self._profiles.append(summary)
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"profile-{summary['id']}.json")
+        with open(f"{path}.tmp", 'w') as fh:
+            json.dump(summary, fh)
+        os.replace(f"{path}.tmp", path)
+        # Keep the newest `keep`, whichever worker wrote them
+        paths = sorted(glob.glob(os.path.join(self.directory, 'profile-*.json')), key=_mtime, reverse=True)
+        for old in paths[self.keep:]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+    def profiles(self):
+        """All kept profiles, newest first."""
+        if not self.directory:
+            return sorted(self._profiles, key=lambda summary: summary['time'], reverse=True)
+        summaries = []
+        for path in glob.glob(os.path.join(self.directory, 'profile-*.json')):
+            try:
+                with open(path) as fh:
+                    summaries.append(json.load(fh))
+            except (OSError, ValueError):
+                continue  # pruned mid-read
+        return sorted(summaries, key=lambda summary: summary['time'], reverse=True)
+
+    def get(self, profile_id):
+        return next((summary for summary in self.profiles() if summary['id'] == profile_id), None)
+
+    # --- Views ---
+
+    def _authorize(self):
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {self.token}"):
+            abort(401)
+        # Never profile the profile viewer itself
+        g.pop('profile', None)
+        self._active.pop(threading.get_ident(), None)
+
+    def list_view(self):
+        self._authorize()
+        return jsonify(profiles=[{key: value for key, value in summary.items() if key not in ('stacks', 'statements')}
+                                 for summary in self.profiles()])
+
+    def profile_view(self, profile_id, fmt):
+        self._authorize()
+        summary = self.get(profile_id)
+        if summary is None or fmt not in ('txt', 'json'):
+            abort(404)
+        if fmt == 'json':
+            response = jsonify(summary)
+        else:
+            response = Response(''.join(f"{stack} {count}\n" for stack, count in summary['stacks']),
+                                mimetype='text/plain')
+        response.headers['Content-Disposition'] = f'attachment; filename="profile-{profile_id}.{fmt}"'
+        return response
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime
+    except FileNotFoundError:
+        return 0
@@ -0,0 +1,239 @@
+"""Read replicas for read-only views.
+
+    DATABASE_REPLICA_URLS=postgresql://replica-a/pawfect,postgresql://replica-b/pawfect
+
+Views decorated with `@read_only` send their SELECTs to one of the replicas,
+chosen round-robin per request among the healthy ones; everything else, and
+anything a request reads after it has written, uses the primary. A replica is
+pinged at most every `REPLICA_CHECK_INTERVAL` seconds, on a background thread
+so no request waits for it, and skipped while it is down. Connecting to a
+PostgreSQL replica gives up after `REPLICA_CONNECT_TIMEOUT` seconds.
+
+Read-your-writes: after a request commits a write, the visitor's session
+remembers the catalogue version the primary reached (see caching.py). For the
+next `REPLICA_PIN_SECONDS` their reads only go to a replica whose own
+`catalog_version` has caught up with it, and to the primary otherwise.
+
+To try it locally with two SQLite files, keep a copy of the database up to
+date with `python benchmarks/replica_sync.py` and point
+`DATABASE_REPLICA_URLS` at the copy.
+
+    flask replicas status    # health and lag of each replica
+"""
+import contextlib
+import functools
+import itertools
+import os
+import threading
+import time
+
+import click
+from flask import current_app, g, has_request_context, request, session
+from flask.cli import AppGroup
+from sqlalchemy import create_engine, event, make_url, select, text
+
+import config
+from models import db, CatalogVersion
+
+
+@contextlib.contextmanager
+def use_primary():
+    """Read from the primary inside the block, even in a `@read_only` view."""
+    previous = g.get('_db_read_only', False)
+    g._db_read_only = False
+    try:
+        yield
+    finally:
+        g._db_read_only = previous
+
+
+def read_only(view):
+    """Let the GET/HEAD requests of this view read from a replica."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g._db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _catalog_version(connection):
+    return connection.execute(select(CatalogVersion.version).where(CatalogVersion.id == 1)).scalar() or 0
+
+
+def _after_flush(session, flush_context):
+    session.info['wrote'] = True
+
+
+def _after_commit(session):
+    if session.info.get('wrote') and has_request_context():
+        g._db_wrote = True
+
+
+class Replica:
+    def __init__(self, engine):
+        self.engine = engine
+        # Unknown until the first check: reads stay on the primary meanwhile
+        self.healthy = None
+        self.checked_at = 0.0
+        self._checking = threading.Lock()
+
+    def check_in_background(self, app):
+        """Start a check unless one is running; callers go on with the last result."""
+        if not self._checking.acquire(blocking=False):
+            return
+        threading.Thread(target=self._check_and_release, args=(app,), name='replica-check', daemon=True).start()
+
+    def _check_and_release(self, app):
+        try:
+            with app.app_context():
+                self.check()
+        finally:
+            self._checking.release()
+
+    def check(self):
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+            self.healthy = True
+        except Exception as e:
+            if self.healthy is not False:
+                current_app.logger.warning("Read replica %s is down: %s", self.engine.url, e)
+            self.healthy = False
+        self.checked_at = time.monotonic()
+        return self.healthy
+
+    def version(self):
+        with self.engine.connect() as connection:
+            return _catalog_version(connection)
+
+
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.replicas = []
+        self._turn = itertools.count()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DATABASE_REPLICA_URLS', os.getenv('DATABASE_REPLICA_URLS', ''))
+        app.config.setdefault('REPLICA_CHECK_INTERVAL', float(os.getenv('REPLICA_CHECK_INTERVAL', 5)))
+        app.config.setdefault('REPLICA_PIN_SECONDS', int(os.getenv('REPLICA_PIN_SECONDS', 300)))
+        app.config.setdefault('REPLICA_CONNECT_TIMEOUT', int(os.getenv('REPLICA_CONNECT_TIMEOUT', 2)))
+        self.check_interval = app.config['REPLICA_CHECK_INTERVAL']
+        self.pin_seconds = app.config['REPLICA_PIN_SECONDS']
+        for url in app.config['DATABASE_REPLICA_URLS'].split(','):
+            url = url.strip().replace('postgres://', 'postgresql://', 1)
+            if url:
+                self.replicas.append(Replica(self._create_engine(app, url)))
+        app.cli.add_command(replicas_cli)
+        app.extensions['replicas'] = self
+        if not self.replicas:
+            return
+        if not event.contains(db.session, 'after_flush', _after_flush):
+            event.listen(db.session, 'after_flush', _after_flush)
+            event.listen(db.session, 'after_commit', _after_commit)
+        app.after_request(self._pin_after_write)
+
+    def _create_engine(self, app, url):
+        parsed = make_url(url)
+        if parsed.get_backend_name() == 'sqlite' and parsed.database and parsed.database != ':memory:' \
+                and not os.path.isabs(parsed.database):
+            # Relative to the instance folder, like the primary
+            parsed = parsed.set(database=os.path.join(app.instance_path, parsed.database))
+        options = config.engine_options(app.config, url)
+        if parsed.get_backend_name() == 'postgresql':
+            options['connect_args'] = dict(options.get('connect_args', {}),
+                                           connect_timeout=app.config['REPLICA_CONNECT_TIMEOUT'])
+        engine = create_engine(parsed, **options)
+        config.tune_engine(engine, app.config)
+        config.reset_after_fork(engine)
+
+        @event.listens_for(engine, 'handle_error')
+        def on_error(context):
+            if context.is_disconnect:
+                self._mark_down(engine)
+        return engine
+
+    def _mark_down(self, engine):
+        for replica in self.replicas:
+            if replica.engine is engine:
+                replica.healthy = False
+                replica.checked_at = time.monotonic()
+
+    # --- Routing ---
+
+    def read_engine(self):
+        """The replica engine for this request's reads, or None for the primary."""
+        if not self.replicas or not has_request_context() or not g.get('_db_read_only'):
+            return None
+        if '_db_replica' not in g:
+            g._db_replica = self._choose()
+        return g._db_replica
+
+    def _choose(self):
+        pinned = self._pinned_version()
+        start = next(self._turn)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if time.monotonic() - replica.checked_at > self.check_interval:
+                replica.check_in_background(current_app._get_current_object())
+            if not replica.healthy:
+                continue
+            if pinned is not None:
+                try:
+                    if replica.version() < pinned:
+                        continue
+                except Exception:
+                    continue
+            return replica.engine
+        return None
+
+    # --- Read-your-writes ---
+
+    def _pinned_version(self):
+        # Only touch the session if there is one: reading it adds `Vary: Cookie`
+        if current_app.config['SESSION_COOKIE_NAME'] not in request.cookies:
+            return None
+        pin = session.get('_db_pin')
+        if not pin:
+            return None
+        version, expires = pin
+        if time.time() > expires:
+            session.pop('_db_pin', None)
+            return None
+        return version
+
+    def _pin_after_write(self, response):
+        if g.get('_db_wrote'):
+            with db.engine.connect() as connection:
+                session['_db_pin'] = [_catalog_version(connection), time.time() + self.pin_seconds]
+        return response
+
+    def status(self):
+        """`[(url, healthy, versions behind the primary or None)]`."""
+        with db.engine.connect() as connection:
+            primary = _catalog_version(connection)
+        rows = []
+        for replica in self.replicas:
+            healthy = replica.check()
+            rows.append((replica.engine.url.render_as_string(hide_password=True), healthy,
+                         primary - replica.version() if healthy else None))
+        return rows
+
+
+# -------------------------------
+# CLI: flask replicas ...
+# -------------------------------
+replicas_cli = AppGroup('replicas', help="Inspect the read replicas.")
+
+
+@replicas_cli.command('status')
+def status_command():
+    """Show whether each replica is up and how far behind it is."""
+    router = current_app.extensions['replicas']
+    if not router.replicas:
+        click.echo("No replicas configured (DATABASE_REPLICA_URLS).")
+        return
+    for url, healthy, lag in router.status():
+        click.echo(f"{url}  {'up' if healthy else 'DOWN'}" + (f"  {lag} versions behind" if healthy else ''))
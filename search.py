@@ -0,0 +1,233 @@
+"""Indexed substring search over pet names and breeds.
+
+`Pet.name.ilike('%term%')` cannot use a b-tree index, so every filtered
+listing used to scan the whole table. Here the same filters are answered from
+a trigram index instead:
+
+* SQLite: an FTS5 table (`pet_search`) using the trigram tokenizer, kept in
+  sync with `pet` by triggers on insert, update and delete.
+* PostgreSQL: pg_trgm GIN indexes on `pet.name` and `pet.breed`, which the
+  planner uses for ILIKE '%term%' directly.
+
+If the index is missing (old SQLite, migration not run) or the term is shorter
+than a trigram, `match()` falls back to the original ILIKE filter.
+"""
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, column, func, or_, select, table, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+from models import db, Pet
+
+# Trigram indexes cannot answer shorter substrings
+MIN_TERM_LENGTH = 3
+
+pet_search = table('pet_search', column('rowid'), column('pet_search'))
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pet_search USING fts5("
+    "name, breed, content='pet', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS pet_search_ai AFTER INSERT ON pet BEGIN "
+    "INSERT INTO pet_search(rowid, name, breed) VALUES (new.id, new.name, new.breed); END",
+    "CREATE TRIGGER IF NOT EXISTS pet_search_ad AFTER DELETE ON pet BEGIN "
+    "INSERT INTO pet_search(pet_search, rowid, name, breed) VALUES ('delete', old.id, old.name, old.breed); END",
+    "CREATE TRIGGER IF NOT EXISTS pet_search_au AFTER UPDATE OF name, breed ON pet BEGIN "
+    "INSERT INTO pet_search(pet_search, rowid, name, breed) VALUES ('delete', old.id, old.name, old.breed); "
+    "INSERT INTO pet_search(rowid, name, breed) VALUES (new.id, new.name, new.breed); END",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS pet_search_au",
+    "DROP TRIGGER IF EXISTS pet_search_ad",
+    "DROP TRIGGER IF EXISTS pet_search_ai",
+    "DROP TABLE IF EXISTS pet_search",
+]
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_pet_name_trgm ON pet USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_pet_breed_trgm ON pet USING gin (breed gin_trgm_ops)",
+]
+
+POSTGRES_DROP = [
+    "DROP INDEX IF EXISTS ix_pet_breed_trgm",
+    "DROP INDEX IF EXISTS ix_pet_name_trgm",
+]
+
+# engine url -> whether the index exists, checked once per process
+_available = {}
+
+
+# -------------------------------
+# Index management
+# -------------------------------
+def create_index(connection):
+    """Create the search index if the backend supports it; returns success."""
+    dialect = connection.dialect.name
+    statements = {'sqlite': SQLITE_DDL, 'postgresql': POSTGRES_DDL}.get(dialect)
+    if statements is None:
+        return False
+    try:
+        if dialect == 'sqlite':
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE name = 'pet_search'").first() is not None
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        if dialect == 'sqlite' and not exists:
+            # Index the rows that were there before the triggers
+            rebuild_index(connection)
+    except (OperationalError, ProgrammingError):
+        # e.g. SQLite built without FTS5 / trigram, or no rights to CREATE EXTENSION
+        return False
+    finally:
+        _available.pop(str(connection.engine.url), None)
+    return True
+
+
+def drop_index(connection):
+    statements = {'sqlite': SQLITE_DROP, 'postgresql': POSTGRES_DROP}.get(connection.dialect.name, [])
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    _available.pop(str(connection.engine.url), None)
+
+
+def rebuild_index(connection):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql("INSERT INTO pet_search(pet_search) VALUES ('rebuild')")
+    elif connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql("REINDEX INDEX ix_pet_name_trgm")
+        connection.exec_driver_sql("REINDEX INDEX ix_pet_breed_trgm")
+
+
+def detect_index(connection, key=None):
+    """Check whether the database behind `connection` has the index, and
+    remember the answer under `key` (the engine's URL by default)."""
+    if connection.dialect.name == 'sqlite':
+        sql = "SELECT 1 FROM sqlite_master WHERE name = 'pet_search'"
+    elif connection.dialect.name == 'postgresql':
+        sql = "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_pet_name_trgm'"
+    else:
+        sql = None
+    available = sql is not None and connection.exec_driver_sql(sql).first() is not None
+    _available[key or str(connection.engine.url)] = available
+    return available
+
+
+def index_available():
+    engine = db.engine
+    key = str(engine.url)
+    if key not in _available:
+        with engine.connect() as connection:
+            detect_index(connection, key)
+    return _available[key]
+
+
+def _fts_phrase(term, column_name=None):
+    phrase = '"' + term.replace('"', '""') + '"'
+    return f"{column_name} : {phrase}" if column_name else phrase
+
+
+def _use_fts(term):
+    return (len(term) >= MIN_TERM_LENGTH and db.engine.dialect.name == 'sqlite'
+            and index_available())
+
+
+# -------------------------------
+# Querying
+# -------------------------------
+def match(col, term):
+    """Filter clause for "`col` contains `term`", case-insensitively."""
+    if _use_fts(term):
+        matches = select(pet_search.c.rowid).where(
+            pet_search.c.pet_search.op('MATCH')(_fts_phrase(term, col.key)))
+        return Pet.id.in_(matches)
+    # PostgreSQL answers this from the pg_trgm index when it exists
+    return col.ilike(f"%{term}%")
+
+
+# Query args understood by filter_pets()
+FILTER_KEYS = ('name', 'age', 'breed', 'species')
+
+
+def filter_pets(query, name='', age='', breed='', species=''):
+    """Apply the listing filters; raises ValueError if `age` is not a number."""
+    if name:
+        query = query.filter(match(Pet.name, name))
+    if age:
+        try:
+            age = int(age)
+        except ValueError:
+            raise ValueError("Age must be a number") from None
+        query = query.filter(Pet.age == age)
+    if breed:
+        query = query.filter(match(Pet.breed, breed))
+    if species:
+        query = query.filter(Pet.species == species)
+    return query
+
+
+def ranked(term, limit=20):
+    """Pets whose name or breed contains `term`, best matches first."""
+    term = term.strip()
+    if not term:
+        return []
+
+    if _use_fts(term):
+        rows = db.session.execute(
+            text("SELECT rowid FROM pet_search WHERE pet_search MATCH :q "
+                 "ORDER BY bm25(pet_search, 2.0, 1.0), rowid LIMIT :limit"),
+            {'q': _fts_phrase(term), 'limit': limit},
+        ).all()
+        ids = [row[0] for row in rows]
+        pets = {pet.id: pet for pet in Pet.query.filter(Pet.id.in_(ids))}
+        return [pets[pet_id] for pet_id in ids if pet_id in pets]
+
+    query = Pet.query.filter(or_(Pet.name.ilike(f"%{term}%"), Pet.breed.ilike(f"%{term}%")))
+    if db.engine.dialect.name == 'postgresql' and index_available():
+        score = func.greatest(func.word_similarity(term, Pet.name), func.word_similarity(term, Pet.breed))
+        return query.order_by(score.desc(), Pet.id).limit(limit).all()
+
+    # Exact name, then name prefix, then any other substring hit
+    score = case(
+        (func.lower(Pet.name) == term.lower(), 0),
+        (Pet.name.ilike(f"{term}%"), 1),
+        (Pet.name.ilike(f"%{term}%"), 2),
+        else_=3,
+    )
+    return query.order_by(score, Pet.id).limit(limit).all()
+
+
+# -------------------------------
+# CLI: flask search ...
+# -------------------------------
+search_cli = AppGroup('search', help="Manage the pet name/breed search index.")
+
+
+@search_cli.command('create')
+def create_command():
+    """Create the search index if it does not exist yet."""
+    with db.engine.begin() as connection:
+        if create_index(connection):
+            click.echo("Search index ready.")
+        else:
+            click.echo("This database does not support the search index; ILIKE will be used.")
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the index from the pet table."""
+    with db.engine.begin() as connection:
+        rebuild_index(connection)
+    click.echo("Search index rebuilt.")
+
+
+@search_cli.command('drop')
+def drop_command():
+    """Drop the index and fall back to ILIKE filtering."""
+    with db.engine.begin() as connection:
+        drop_index(connection)
+    click.echo("Search index dropped.")
+
+
+def init_app(app):
+    app.cli.add_command(search_cli)
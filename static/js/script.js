@@ -30,6 +30,59 @@ items.forEach(item => {
   });
 });
 
+// -------------------------------------------
+// Name / Breed Typeahead (pets filter form)
+// -------------------------------------------
+const petFilter = document.getElementById('custom-pet-filter');
+if (petFilter && petFilter.dataset.suggestUrl) {
+  ['name', 'breed'].forEach(field => {
+    const input = petFilter.querySelector(`input[name="${field}"]`);
+    const list = input && document.getElementById(input.getAttribute('list'));
+    if (!list) return;
+
+    const initialOptions = list.innerHTML;
+    const cache = new Map();
+    let timer = null;
+    let inFlight = null;
+
+    const show = suggestions => {
+      list.replaceChildren(...suggestions.map(({ value, count }) => {
+        const option = document.createElement('option');
+        option.value = value;
+        option.textContent = `${value} (${count})`;
+        return option;
+      }));
+    };
+
+    const lookup = async q => {
+      if (cache.has(q)) return show(cache.get(q));
+      if (inFlight) inFlight.abort();
+      inFlight = new AbortController();
+      try {
+        const params = new URLSearchParams({ q, field });
+        const response = await fetch(`${petFilter.dataset.suggestUrl}?${params}`, { signal: inFlight.signal });
+        if (!response.ok) return;
+        const suggestions = (await response.json())[field] || [];
+        cache.set(q, suggestions);
+        if (input.value.trim().toLowerCase() === q) show(suggestions);
+      } catch (error) {
+        if (error.name !== 'AbortError') throw error;
+      }
+    };
+
+    // Wait for a pause in typing, so a word costs one request, not one per key
+    input.addEventListener('input', () => {
+      clearTimeout(timer);
+      const q = input.value.trim().toLowerCase();
+      if (!q) {
+        list.innerHTML = initialOptions;
+        return;
+      }
+      timer = setTimeout(() => lookup(q), 150);
+    });
+  });
+}
+
 // -------------------------------------------
 // Form Submission Handler with Confetti + Alert
 // -------------------------------------------
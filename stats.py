@@ -0,0 +1,172 @@
+"""Incrementally maintained pet counts per species, breed and age bucket.
+
+The `pet_facet` table holds one running count per facet value. Every pet
+insert, update and delete applies its +1/-1 deltas in the same transaction
+(a session `before_flush` hook, plus explicit calls from bulk import and
+seeding), so the species dropdown, the counts next to the filters and the
+stats section read a few dozen rows instead of scanning `pet`.
+
+    flask stats rebuild    # recompute from the pet table
+"""
+from collections import Counter
+
+import click
+from flask import g, has_request_context
+from flask.cli import AppGroup
+from sqlalchemy import event, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import attributes
+
+from models import db, Pet, PetFacet
+
+FACETS = ('species', 'breed', 'age')
+
+# (label, lowest age, highest age)
+AGE_BUCKETS = [
+    ('Under 2', 0, 1),
+    ('2-3', 2, 3),
+    ('4-6', 4, 6),
+    ('7-10', 7, 10),
+    ('11+', 11, None),
+]
+
+
+def age_bucket(age):
+    for label, low, high in AGE_BUCKETS:
+        if age >= low and (high is None or age <= high):
+            return label
+    return AGE_BUCKETS[0][0]
+
+
+def facet_values(species, breed, age):
+    return [('species', species), ('breed', breed), ('age', age_bucket(age))]
+
+
+# -------------------------------
+# Applying deltas
+# -------------------------------
+def apply_deltas(connection, deltas):
+    """Add `{(facet, value): delta}` to the running counts."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    rows = [{'facet': facet, 'value': value, 'count': delta} for (facet, value), delta in deltas.items()]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(PetFacet)
+        stmt = stmt.on_conflict_do_update(index_elements=['facet', 'value'],
+                                          set_={'count': PetFacet.count + stmt.excluded['count']})
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        result = connection.execute(update(PetFacet)
+                                    .where(PetFacet.facet == row['facet'], PetFacet.value == row['value'])
+                                    .values(count=PetFacet.count + row['count']))
+        if result.rowcount == 0:
+            connection.execute(PetFacet.__table__.insert(), row)
+
+
+def count_rows(rows, sign=1):
+    """Deltas for a batch of new (or, with sign=-1, removed) pet dicts."""
+    deltas = Counter()
+    for row in rows:
+        for key in facet_values(row['species'], row['breed'], row['age']):
+            deltas[key] += sign
+    return deltas
+
+
+def _old_value(pet, name):
+    history = attributes.get_history(pet, name)
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else getattr(pet, name)
+
+
+def _before_flush(session, flush_context, instances):
+    deltas = Counter()
+    for pet in session.new:
+        if isinstance(pet, Pet):
+            for key in facet_values(pet.species, pet.breed, pet.age):
+                deltas[key] += 1
+    for pet in session.deleted:
+        if isinstance(pet, Pet):
+            for key in facet_values(*(_old_value(pet, name) for name in FACETS)):
+                deltas[key] -= 1
+    for pet in session.dirty:
+        if isinstance(pet, Pet) and session.is_modified(pet):
+            old = facet_values(*(_old_value(pet, name) for name in FACETS))
+            new = facet_values(pet.species, pet.breed, pet.age)
+            for before, after in zip(old, new):
+                if before != after:
+                    deltas[before] -= 1
+                    deltas[after] += 1
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+# -------------------------------
+# Rebuilding
+# -------------------------------
+def rebuild(connection):
+    """Recompute every count from the pet table."""
+    connection.execute(PetFacet.__table__.delete())
+    deltas = Counter()
+    for species, breed, age, count in connection.execute(
+            select(Pet.species, Pet.breed, Pet.age, func.count()).group_by(Pet.species, Pet.breed, Pet.age)):
+        for key in facet_values(species, breed, age):
+            deltas[key] += count
+    apply_deltas(connection, deltas)
+
+
+def ensure(connection):
+    """Build the counts once for a database that has pets but no counts yet."""
+    if connection.execute(select(PetFacet.facet).limit(1)).first() is None and \
+            connection.execute(select(Pet.id).limit(1)).first() is not None:
+        rebuild(connection)
+
+
+# -------------------------------
+# Reading
+# -------------------------------
+def facets():
+    """`{'species': [(value, count), ...], 'breed': [...], 'age': [...], 'total': n}`.
+
+    Species and breeds are sorted by name, age buckets youngest first.
+    Cached for the rest of the request.
+    """
+    if has_request_context() and '_pet_facets' in g:
+        return g._pet_facets
+    result = {facet: [] for facet in FACETS}
+    for facet, value, count in db.session.execute(
+            select(PetFacet.facet, PetFacet.value, PetFacet.count).where(PetFacet.count > 0)):
+        result[facet].append((value, count))
+    result['species'].sort()
+    result['breed'].sort()
+    order = {label: i for i, (label, _, _) in enumerate(AGE_BUCKETS)}
+    result['age'].sort(key=lambda item: order.get(item[0], len(order)))
+    result['total'] = sum(count for _, count in result['species'])
+    if has_request_context():
+        g._pet_facets = result
+    return result
+
+
+# -------------------------------
+# CLI: flask stats ...
+# -------------------------------
+stats_cli = AppGroup('stats', help="Manage the precomputed pet counts.")
+
+
+@stats_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the species, breed and age counts from the pet table."""
+    with db.engine.begin() as connection:
+        rebuild(connection)
+    click.echo(f"Counted {facets()['total']} pets.")
+
+
+def init_app(app):
+    if not event.contains(db.session, 'before_flush', _before_flush):
+        event.listen(db.session, 'before_flush', _before_flush)
+    app.add_template_global(facets, 'pet_facets')
+    app.cli.add_command(stats_cli)
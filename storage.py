@@ -0,0 +1,276 @@
+"""Content-addressed storage for uploaded pet photos.
+
+Uploads are stored as `uploads/<aa>/<sha256>.<ext>` where the name is the
+SHA-256 of the file's bytes, computed while streaming it to a temporary file.
+Identical photos are therefore written once and shared by every `Pet` that
+uses them, files are never overwritten in place, and a file is only visible
+under its final name once it has been completely written (atomic rename).
+
+`Pet.img` is the reference count: a file no pet points at is an orphan.
+`release()` removes a file as soon as its last pet lets go of it, and
+`flask uploads gc` sweeps up anything left behind (crashed requests, files
+from before this scheme).
+
+Views decorated with `@streamed_upload` never buffer an upload: the multipart
+parser writes each file straight into a temporary file in the upload folder,
+hashing it as it goes, and `save()` only has to rename it. The type is sniffed
+from the first bytes (the filename is not trusted), a file that is not a PNG,
+JPEG or GIF, or grows past `UPLOAD_MAX_BYTES`, stops being written at once,
+and a request whose `Content-Length` is over the limit is refused with 413
+before its body is read. Temporary files that are never saved are deleted
+when the request ends.
+"""
+import functools
+import hashlib
+import os
+import tempfile
+import time
+
+import click
+from flask import Request, current_app, g, request
+from flask.cli import AppGroup
+
+from models import db, Pet
+
+CHUNK_SIZE = 64 * 1024
+TEMP_PREFIX = '.incoming-'
+# Magic bytes -> stored extension
+IMAGE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SNIFF_BYTES = max(len(magic) for magic, _ in IMAGE_SIGNATURES)
+# Room for the text fields next to the file in a multipart body
+FORM_OVERHEAD = 64 * 1024
+
+
+def too_large(max_bytes):
+    return f"The image is larger than {max_bytes / (1024 * 1024):.3g} MB"
+
+
+def sniff(head):
+    """The image type of a file from its first bytes, or None."""
+    for magic, extension in IMAGE_SIGNATURES:
+        if head.startswith(magic):
+            return extension
+    return None
+
+
+class IncomingUpload:
+    """Temporary file the multipart parser streams one upload into.
+
+    Hashes and sniffs the bytes as they arrive; once the file turns out not
+    to be an image, or to be too large, the rest is dropped instead of written.
+    """
+
+    def __init__(self, folder, max_bytes):
+        os.makedirs(folder, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(prefix=TEMP_PREFIX, dir=folder)
+        self.file = os.fdopen(fd, 'w+b')
+        self.max_bytes = max_bytes
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+        self.extension = None
+        self.error = None
+
+    def write(self, data):
+        self.size += len(data)
+        if self.error:
+            return len(data)
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self.extension = sniff(self.head)
+                if self.extension is None:
+                    return self._reject("Allowed image types: png, jpg, jpeg, gif")
+        if self.size > self.max_bytes:
+            return self._reject(too_large(self.max_bytes))
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def _reject(self, error):
+        self.error = error
+        self.file.truncate(0)
+        return 0
+
+    def finish(self):
+        """Check the complete file; raises ValueError if it cannot be stored."""
+        if self.error is None and self.extension is None:
+            self.extension = sniff(self.head)
+            if self.extension is None:
+                self.error = "Allowed image types: png, jpg, jpeg, gif"
+        if self.error:
+            raise ValueError(self.error)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def close(self):
+        self.file.close()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+class UploadRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if g.get('_stream_uploads'):
+            store = current_app.extensions['uploads']
+            return IncomingUpload(store.folder, store.max_bytes)
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+
+
+def streamed_upload(view):
+    """Stream this view's uploads into the store instead of buffering them.
+
+    Must run before anything reads `request.form` or `request.files`.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method == 'POST':
+            g._stream_uploads = True
+            request.max_content_length = current_app.extensions['uploads'].max_bytes + FORM_OVERHEAD
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class UploadStore:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Files younger than this are never collected: their pet row may not
+        # be committed yet, or a concurrent upload may have just reused them
+        app.config.setdefault('UPLOAD_GC_GRACE', int(os.getenv('UPLOAD_GC_GRACE', 3600)))
+        app.config.setdefault('UPLOAD_MAX_BYTES', int(os.getenv('UPLOAD_MAX_BYTES', 10 * 1024 * 1024)))
+        self.static_folder = app.static_folder
+        self.folder = app.config['UPLOAD_FOLDER']
+        self.grace = app.config['UPLOAD_GC_GRACE']
+        self.max_bytes = app.config['UPLOAD_MAX_BYTES']
+        app.request_class = UploadRequest
+        app.extensions['uploads'] = self
+        app.cli.add_command(uploads_cli)
+
+    # --- Paths ---
+
+    def static_path(self, path):
+        """`uploads/ab/abcd.png` -> absolute path on disk."""
+        return os.path.join(self.static_folder, path)
+
+    def is_upload(self, path):
+        return bool(path) and os.path.abspath(self.static_path(path)).startswith(os.path.abspath(self.folder) + os.sep)
+
+    # --- Writing ---
+
+    def save(self, file):
+        """Store an uploaded image and return its static path (for `Pet.img`).
+
+        Raises ValueError if the file is not a PNG, JPEG or GIF, or is too large.
+        """
+        incoming = file.stream
+        if not isinstance(incoming, IncomingUpload):
+            # Not streamed by @streamed_upload: copy it through the same checks
+            incoming = IncomingUpload(self.folder, self.max_bytes)
+            try:
+                for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+                    incoming.write(chunk)
+            except BaseException:
+                incoming.close()
+                raise
+        try:
+            incoming.finish()
+            name = incoming.digest.hexdigest()
+            rel_path = f"{name[:2]}/{name}.{incoming.extension}"
+            target = os.path.join(self.folder, rel_path)
+            if os.path.exists(target):
+                # Already stored: keep one copy, and refresh its mtime so the
+                # garbage collector's grace period covers this new reference
+                os.utime(target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(incoming.path, target)
+                incoming.path = None
+        finally:
+            incoming.close()
+
+        folder = os.path.relpath(self.folder, self.static_folder).replace(os.sep, '/')
+        return f"{folder}/{rel_path}"
+
+    # --- Reference counting ---
+
+    def refcount(self, path):
+        return Pet.query.filter(Pet.img == path).count()
+
+    def release(self, path):
+        """Delete an upload once no pet references it. Call after committing."""
+        if not self.is_upload(path) or self.refcount(path):
+            return False
+        full_path = self.static_path(path)
+        try:
+            if time.time() - os.stat(full_path).st_mtime < self.grace:
+                # Possibly being reused by an in-flight upload; leave it to gc
+                return False
+            os.remove(full_path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    # --- Garbage collection ---
+
+    def orphans(self, grace=None):
+        """Yield `(absolute path, size)` of uploads no pet references."""
+        grace = self.grace if grace is None else grace
+        if not os.path.isdir(self.folder):
+            return
+        referenced = {img for (img,) in db.session.query(Pet.img).yield_per(5000)}
+        cutoff = time.time() - grace
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                full_path = os.path.join(root, name)
+                stat = os.stat(full_path)
+                if stat.st_mtime > cutoff:
+                    continue
+                rel_path = os.path.relpath(full_path, self.static_folder).replace(os.sep, '/')
+                if name.startswith(TEMP_PREFIX) or rel_path not in referenced:
+                    yield full_path, stat.st_size
+
+    def collect(self, grace=None, dry_run=False):
+        """Remove orphaned uploads; returns `(files, bytes)` reclaimed."""
+        files = reclaimed = 0
+        for full_path, size in list(self.orphans(grace)):
+            if not dry_run:
+                try:
+                    os.remove(full_path)
+                except FileNotFoundError:
+                    continue
+            files += 1
+            reclaimed += size
+        return files, reclaimed
+
+
+# -------------------------------
+# CLI: flask uploads ...
+# -------------------------------
+uploads_cli = AppGroup('uploads', help="Manage uploaded pet photos.")
+
+
+@uploads_cli.command('gc')
+@click.option('--grace', type=int, default=None, help="Skip files modified in the last N seconds.")
+@click.option('--dry-run', is_flag=True, help="Only report what would be removed.")
+def gc_command(grace, dry_run):
+    """Delete uploads that no pet references."""
+    from flask import current_app
+
+    store = current_app.extensions['uploads']
+    files, reclaimed = store.collect(grace, dry_run)
+    verb = "Would remove" if dry_run else "Removed"
+    click.echo(f"{verb} {files} orphaned files ({reclaimed / 1024 / 1024:.1f} MB).")
@@ -0,0 +1,277 @@
+"""Write-behind queue for contact / FAQ form submissions.
+
+Views hand submissions to `SubmissionQueue.submit()` and return immediately;
+a background thread per worker inserts them in batches, either when
+`SUBMISSION_BATCH_SIZE` rows are waiting or `SUBMISSION_FLUSH_INTERVAL`
+seconds after the first one arrived, so a traffic spike costs one transaction
+per batch instead of one per request.
+
+With `SUBMISSION_SPOOL_DIR` set, every submission is first appended to a
+per-process spool file and only forgotten once its batch is committed; spool
+files left behind by a crashed worker are replayed by the next one to start.
+Delivery is at-least-once: a crash between commit and spool truncation can
+replay a batch. `SUBMISSION_QUEUE_MODE=sync` writes inline, for tests.
+Under the ASGI entry point the inserts go through an async session on the
+server's event loop instead (see asgi.py).
+"""
+import asyncio
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from blinker import Namespace
+from sqlalchemy import insert
+
+from models import db, Submission
+from workers import pid_alive
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('first_name', 'surname', 'email', 'message', 'terms')
+
+# Sent after every batch with `seconds` and `rows`
+_signals = Namespace()
+batch_flushed = _signals.signal('submission-batch-flushed')
+
+
+class SubmissionQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._spool = None
+        self._stopping = threading.Event()
+        # ASGI mode: write through an async session on this loop
+        self._loop = None
+        self._async_session = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.failed = 0
+        self.overflows = 0
+        self.flush_seconds = deque(maxlen=1000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SUBMISSION_QUEUE_MODE', os.getenv('SUBMISSION_QUEUE_MODE', 'async'))
+        app.config.setdefault('SUBMISSION_QUEUE_SIZE', int(os.getenv('SUBMISSION_QUEUE_SIZE', 1000)))
+        app.config.setdefault('SUBMISSION_BATCH_SIZE', int(os.getenv('SUBMISSION_BATCH_SIZE', 100)))
+        app.config.setdefault('SUBMISSION_FLUSH_INTERVAL', float(os.getenv('SUBMISSION_FLUSH_INTERVAL', 0.5)))
+        app.config.setdefault('SUBMISSION_SPOOL_DIR', os.getenv('SUBMISSION_SPOOL_DIR'))
+        app.config.setdefault('SUBMISSION_SPOOL_FSYNC', os.getenv('SUBMISSION_SPOOL_FSYNC', '1') == '1')
+        self.app = app
+        self.mode = app.config['SUBMISSION_QUEUE_MODE']
+        self.maxsize = app.config['SUBMISSION_QUEUE_SIZE']
+        self.batch_size = app.config['SUBMISSION_BATCH_SIZE']
+        self.interval = app.config['SUBMISSION_FLUSH_INTERVAL']
+        self.spool_dir = app.config['SUBMISSION_SPOOL_DIR']
+        self.spool_fsync = app.config['SUBMISSION_SPOOL_FSYNC']
+        app.extensions['submission_queue'] = self
+
+    # --- Producer side ---
+
+    def submit(self, **data):
+        """Queue a submission; raises ValueError if a required field is missing."""
+        row = {key: data.get(key) for key in FIELDS}
+        row['terms'] = bool(row['terms'])
+        if not all(row[key] for key in FIELDS if key != 'terms'):
+            raise ValueError("Please fill in all required fields!")
+
+        if self.mode == 'sync':
+            self._write([row])
+            return
+        self._ensure_started()
+        try:
+            # Spool and enqueue together so a truncation never drops a row
+            # that is spooled but not yet queued
+            with self._spool_lock:
+                self._append_spool(row)
+                self._queue.put_nowait(row)
+        except queue.Full:
+            # Back-pressure: the flusher is behind, so pay for this write inline
+            self.overflows += 1
+            self._write([row])
+            return
+        self.enqueued += 1
+
+    @property
+    def depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        latencies = sorted(self.flush_seconds)
+        return {
+            'depth': self.depth,
+            'enqueued': self.enqueued,
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'failed': self.failed,
+            'overflows': self.overflows,
+            'flush_p50_seconds': latencies[len(latencies) // 2] if latencies else 0.0,
+            'flush_max_seconds': latencies[-1] if latencies else 0.0,
+        }
+
+    # --- Lifecycle ---
+
+    def _ensure_started(self):
+        # Threads do not survive a fork, so each gunicorn worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            self._stopping.clear()
+            self._spool = None
+            self._recover_spools()
+            self._thread = threading.Thread(target=self._run, name='submission-flusher', daemon=True)
+            self._thread.start()
+            atexit.register(self.drain)
+
+    def drain(self, timeout=10.0):
+        """Flush everything still queued; called on worker shutdown."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    # --- Consumer side ---
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=self.interval)
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return
+                continue
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stopping.is_set():
+                    # Once stopping, take whatever is already queued without waiting
+                    try:
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    except queue.Empty:
+                        break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._flush(batch)
+
+    def _flush(self, batch):
+        started = time.perf_counter()
+        try:
+            self._write(batch)
+        except Exception:
+            # One bad row must not lose the whole batch: retry row by row
+            logger.exception("Batch insert of %d submissions failed; retrying one by one", len(batch))
+            for row in batch:
+                try:
+                    self._write([row])
+                except Exception:
+                    self.failed += 1
+                    logger.exception("Could not save submission; moving it to the dead-letter file")
+                    self._dead_letter(row)
+        seconds = time.perf_counter() - started
+        self.flush_seconds.append(seconds)
+        batch_flushed.send(self, seconds=seconds, rows=len(batch))
+        self.batches += 1
+        self.flushed += len(batch)
+        if self._queue.empty():
+            self._truncate_spool()
+
+    def _write(self, rows):
+        if self._loop is not None:
+            return asyncio.run_coroutine_threadsafe(self._write_async(rows), self._loop).result()
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(Submission), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    async def _write_async(self, rows):
+        async with self._async_session() as session:
+            await session.execute(insert(Submission), rows)
+            await session.commit()
+
+    # --- ASGI mode ---
+
+    def use_async_session(self, loop, session_factory):
+        """Write on `loop` through sessions from `session_factory` (see asgi.py).
+
+        The flusher thread still collects the batches; only the inserts move.
+        """
+        self._loop = loop
+        self._async_session = session_factory
+
+    async def close_async(self):
+        # Flush what is queued while the loop can still run the inserts
+        await asyncio.to_thread(self.drain)
+        self._loop = None
+        self._async_session = None
+
+    # --- Spool ---
+
+    def _spool_path(self, pid):
+        return os.path.join(self.spool_dir, f"submissions-{pid}.spool")
+
+    def _append_spool(self, row):
+        # Caller holds _spool_lock
+        if not self.spool_dir:
+            return
+        if self._spool is None:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            self._spool = open(self._spool_path(os.getpid()), 'a')
+        self._spool.write(json.dumps(row) + '\n')
+        self._spool.flush()
+        if self.spool_fsync:
+            os.fsync(self._spool.fileno())
+
+    def _truncate_spool(self):
+        # Everything appended so far has been committed
+        with self._spool_lock:
+            if self._spool is not None and self._queue.empty():
+                self._spool.truncate(0)
+
+    def _dead_letter(self, row):
+        if not self.spool_dir:
+            logger.error("Lost submission: %r", row)
+            return
+        with self._spool_lock, open(os.path.join(self.spool_dir, 'submissions-failed.ndjson'), 'a') as fh:
+            fh.write(json.dumps(row) + '\n')
+
+    def _recover_spools(self):
+        if not self.spool_dir:
+            return
+        for path in glob.glob(os.path.join(self.spool_dir, 'submissions-*.spool')):
+            pid = int(path.rsplit('-', 1)[1].split('.')[0])
+            if pid != os.getpid() and pid_alive(pid):
+                continue
+            claimed = f"{path}.recovering-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue  # another worker got there first
+            with open(claimed) as fh:
+                rows = [json.loads(line) for line in fh if line.strip()]
+            if rows:
+                self._write(rows)
+                logger.warning("Recovered %d spooled submissions from %s", len(rows), path)
+            os.remove(claimed)
@@ -0,0 +1,273 @@
+"""Typeahead completions for pet names and breeds.
+
+`/pets/suggest?q=ret` answers from an in-memory prefix index instead of the
+database. Each field keeps its distinct values with the number of pets that
+have them, and a sorted list of keys: the lowercased value and each later
+word of it (`golden retriever`, `retriever`). A prefix lookup is a `bisect`
+for the range of keys that start with it, and a NumPy ranking of every value
+in that range by its count, so the most common values come first. There are
+a few keys per distinct value, however many pets share it.
+
+The index is built on first use. Per pet only an id and two small integer
+codes are kept, in NumPy arrays. It is kept current from the same `pet_change`
+log as the matching snapshot (see matching.py): a worker replays the entries
+it has not seen, re-reading only the touched rows. The log is checked at most
+every `SUGGEST_MAX_LAG` seconds, and immediately after this worker commits a
+pet change. If the worker has fallen behind the retained log, it rebuilds.
+Changes are made to a copy that replaces the index in one assignment, so a
+lookup never sees a half-applied change and a failed refresh leaves the last
+good index in place.
+"""
+import bisect
+import os
+import threading
+import time
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+
+import matching
+from models import db, Pet
+
+MAX_LIMIT = 20
+# Answers remembered per field until its counts next change
+MEMO_SIZE = 10000
+# Words of a value, after the first, that can also start a completion
+MAX_WORDS = 4
+LOAD_CHUNK = 50000
+FIELDS = ('name', 'breed')
+
+
+def _keys(value):
+    words = value.casefold().split()
+    return [' '.join(words[i:]) for i in range(min(len(words), MAX_WORDS))]
+
+
+def _after_flush(session, flush_context):
+    if any(isinstance(obj, Pet) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        session.info['pets_changed'] = True
+
+
+def _after_commit(session):
+    if session.info.pop('pets_changed', False) and has_app_context():
+        index = current_app.extensions.get('suggest')
+        if index is not None:
+            index.checked_at = 0.0
+
+
+class Completions:
+    """Distinct values of one field, their pet counts and the prefix entries.
+
+    Changes go to a `copy()`, which readers never see until `finish()` has
+    merged them in and the index has swapped it for the old one.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.counts = []
+        self.codes = {}
+        # Sorted keys and, aligned with them, the code of each key's value
+        self.keys = []
+        self.key_codes = np.zeros(0, dtype=np.int32)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._new_entries = []
+        self._memo = {}
+
+    def copy(self):
+        other = Completions()
+        other.values = list(self.values)
+        other.counts = list(self.counts)
+        other.codes = dict(self.codes)
+        other.keys, other.key_codes = self.keys, self.key_codes
+        return other
+
+    def add(self, value):
+        """Count one more pet with this value; returns its code."""
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+            self.counts.append(0)
+            self._new_entries.extend((key, code) for key in _keys(value))
+        self.counts[code] += 1
+        return code
+
+    def remove(self, code):
+        if code >= 0:
+            self.counts[code] -= 1
+
+    def finish(self):
+        """Merge the new values' keys in; call once after the last change."""
+        if self._new_entries:
+            entries = sorted(list(zip(self.keys, self.key_codes.tolist())) + self._new_entries)
+            self.keys = [key for key, _ in entries]
+            self.key_codes = np.array([code for _, code in entries], dtype=np.int32)
+            self._new_entries = []
+        self._counts = np.array(self.counts, dtype=np.int64)
+        return self
+
+    def complete(self, prefix, limit):
+        """`[(value, pets)]` of the most common values with a word starting with
+        `prefix`; ties are in the order of the matching word."""
+        memo = self._memo
+        result = memo.get((prefix, limit))
+        if result is not None:
+            return result
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', start)
+        codes = self.key_codes[start:end]
+        counts = self._counts[codes]
+        result, seen = [], set()
+        # Every entry under the prefix is ranked; a value may have several
+        for i in np.argsort(-counts, kind='stable').tolist():
+            if counts[i] <= 0 or len(result) == limit:
+                break
+            code = int(codes[i])
+            if code not in seen:
+                seen.add(code)
+                result.append((self.values[code], int(counts[i])))
+        if len(memo) >= MEMO_SIZE:
+            memo.clear()
+        memo[(prefix, limit)] = result
+        return result
+
+
+class SuggestIndex:
+    def __init__(self, app=None):
+        self.fields = None
+        self.ids = None
+        self.codes = None
+        self.cursor = matching.ChangeCursor()
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SUGGEST_MAX_LAG', float(os.getenv('SUGGEST_MAX_LAG', 1)))
+        self.max_lag = app.config['SUGGEST_MAX_LAG']
+        matching.track_changes()
+        if not event.contains(db.session, 'after_flush', _after_flush):
+            event.listen(db.session, 'after_flush', _after_flush)
+            event.listen(db.session, 'after_commit', _after_commit)
+        app.extensions['suggest'] = self
+
+    # --- Building and catching up ---
+    #
+    # Both return `(fields, ids, codes, cursor)` for refresh() to swap in;
+    # nothing a reader can see is changed in place.
+
+    def _load(self, connection):
+        cursor = matching.cursor_at(connection)
+        fields = {field: Completions() for field in FIELDS}
+        ids, codes = [], {field: [] for field in FIELDS}
+        last_id = 0
+        while True:
+            rows = connection.execute(select(Pet.id, Pet.name, Pet.breed).where(Pet.id > last_id)
+                                      .order_by(Pet.id).limit(LOAD_CHUNK)).all()
+            if not rows:
+                break
+            for pet_id, name, breed in rows:
+                ids.append(pet_id)
+                codes['name'].append(fields['name'].add(name))
+                codes['breed'].append(fields['breed'].add(breed))
+            last_id = rows[-1][0]
+        return ({field: completions.finish() for field, completions in fields.items()},
+                np.array(ids, dtype=np.int64),
+                {field: np.array(values, dtype=np.int32) for field, values in codes.items()},
+                cursor)
+
+    def _apply_changes(self, connection):
+        """The index with the unseen change log entries applied; None if the
+        log no longer reaches back that far."""
+        changes, cursor = matching.read_changes(connection, self.cursor)
+        if changes is None:
+            return None
+        if not changes:
+            return self.fields, self.ids, self.codes, cursor
+
+        touched = set()
+        rows = {}
+        query = select(Pet.id, Pet.name, Pet.breed)
+        for first_id, last_id in {(first_id, last_id) for _, first_id, last_id in changes}:
+            if first_id == last_id:
+                touched.add(first_id)
+            else:
+                # Rows of the range that are gone must be dropped too
+                touched.update(self.ids[(self.ids >= first_id) & (self.ids <= last_id)].tolist())
+                span = connection.execute(query.where(Pet.id.between(first_id, last_id)))
+                rows.update((row[0], row) for row in span)
+        singles = sorted(touched - rows.keys())
+        for start in range(0, len(singles), 500):
+            chunk = connection.execute(query.where(Pet.id.in_(singles[start:start + 500])))
+            rows.update((row[0], row) for row in chunk)
+        touched.update(rows)
+
+        fields = {field: completions.copy() for field, completions in self.fields.items()}
+        ids, codes = self.ids, {field: values.copy() for field, values in self.codes.items()}
+        added = []
+        for pet_id in sorted(touched):
+            i = np.searchsorted(ids, pet_id)
+            present = i < len(ids) and ids[i] == pet_id
+            if present:
+                for field in FIELDS:
+                    fields[field].remove(codes[field][i])
+            row = rows.get(pet_id)
+            if row is None:
+                if present:
+                    # Deleted: keep the slot, with no values
+                    for field in FIELDS:
+                        codes[field][i] = -1
+                continue
+            new_codes = {'name': fields['name'].add(row.name), 'breed': fields['breed'].add(row.breed)}
+            if present:
+                for field in FIELDS:
+                    codes[field][i] = new_codes[field]
+            else:
+                added.append((pet_id, new_codes))
+        if added:
+            old_ids = ids
+            ids = np.concatenate([ids, np.array([pet_id for pet_id, _ in added], dtype=np.int64)])
+            codes = {field: np.concatenate([codes[field], np.array([new[field] for _, new in added], dtype=np.int32)])
+                     for field in FIELDS}
+            if len(old_ids) and added[0][0] < old_ids[-1]:
+                order = np.argsort(ids, kind='stable')
+                ids = ids[order]
+                codes = {field: values[order] for field, values in codes.items()}
+        return {field: completions.finish() for field, completions in fields.items()}, ids, codes, cursor
+
+    def refresh(self):
+        """Build the index, or catch up with the change log, if it is due.
+
+        If that fails, the last good index keeps answering until the next try.
+        """
+        if self.fields is not None and time.monotonic() - self.checked_at < self.max_lag:
+            return
+        with self._lock:
+            if self.fields is not None and time.monotonic() - self.checked_at < self.max_lag:
+                return
+            try:
+                with db.engine.connect() as connection:
+                    state = self._apply_changes(connection) if self.fields is not None else None
+                    if state is None:
+                        state = self._load(connection)
+            except Exception:
+                if self.fields is None:
+                    raise
+                current_app.logger.exception("Could not refresh the suggest index; serving the previous one")
+            else:
+                self.fields, self.ids, self.codes, self.cursor = state
+            self.checked_at = time.monotonic()
+
+    # --- Lookup ---
+
+    def suggest(self, q, fields=FIELDS, limit=8):
+        """`{field: [(value, pets)]}` completing `q` for each field."""
+        prefix = ' '.join(q.casefold().split())
+        if not prefix:
+            return {field: [] for field in fields}
+        self.refresh()
+        limit = max(1, min(limit, MAX_LIMIT))
+        index = self.fields
+        return {field: index[field].complete(prefix, limit) for field in fields}
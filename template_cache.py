@@ -0,0 +1,70 @@
+"""Compiled templates shared by every worker.
+
+Jinja turns each template into Python code the first time it is rendered,
+which every new worker used to repeat for `base.html`, the pages and all
+their includes. The compiled code is now also stored on disk, in
+`TEMPLATE_CACHE_DIR` (`instance/jinja_cache`), and loaded from there by any
+worker that needs it. Jinja checks each entry against the template source,
+so an edited template is simply compiled again.
+
+    flask templates compile     # on deploy, before the workers start
+
+fills the cache ahead of time, and `gunicorn --preload` compiles everything in
+the master before forking (see app.warm_up). Outside debug mode templates are
+not checked for changes on every render (`TEMPLATES_AUTO_RELOAD`).
+"""
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+
+
+def init_app(app):
+    app.config.setdefault('TEMPLATE_BYTECODE_CACHE', os.getenv('TEMPLATE_BYTECODE_CACHE', '1') == '1')
+    app.config.setdefault('TEMPLATE_CACHE_DIR',
+                          os.getenv('TEMPLATE_CACHE_DIR', os.path.join(app.instance_path, 'jinja_cache')))
+    if app.config.get('TEMPLATES_AUTO_RELOAD') is None:
+        # Flask's default (None) follows debug mode; make that explicit
+        app.config['TEMPLATES_AUTO_RELOAD'] = os.getenv('TEMPLATES_AUTO_RELOAD', '1' if app.debug else '0') == '1'
+    # Other extensions may have created the environment already
+    app.jinja_env.auto_reload = app.config['TEMPLATES_AUTO_RELOAD']
+    if app.config['TEMPLATE_BYTECODE_CACHE']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+    app.cli.add_command(templates_cli)
+
+
+def compile_all(app):
+    """Load every template, compiling (and caching) any that need it; returns the count."""
+    names = app.jinja_env.list_templates()
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+# -------------------------------
+# CLI: flask templates ...
+# -------------------------------
+templates_cli = AppGroup('templates', help="Manage the compiled template cache.")
+
+
+@templates_cli.command('compile')
+def compile_command():
+    """Compile every template into the on-disk bytecode cache."""
+    started = time.perf_counter()
+    count = compile_all(current_app)
+    where = current_app.config['TEMPLATE_CACHE_DIR'] if current_app.config['TEMPLATE_BYTECODE_CACHE'] \
+        else "memory only (TEMPLATE_BYTECODE_CACHE=0)"
+    click.echo(f"Compiled {count} templates in {(time.perf_counter() - started) * 1000:.0f} ms into {where}.")
+
+
+@templates_cli.command('clear')
+def clear_command():
+    """Empty the on-disk bytecode cache."""
+    cache = current_app.jinja_env.bytecode_cache
+    if cache is not None:
+        cache.clear()
+    click.echo("Template cache cleared.")
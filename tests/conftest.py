@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from models import db  # noqa: E402
+
+
+@pytest.fixture
+def db_app(tmp_path):
+    """A bare app with its own SQLite database and every table created."""
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'test.db'}")
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def make_site(tmp_path):
+    """Build the whole app from `create_app()`, on its own seeded SQLite
+    database; keyword arguments override settings."""
+    from app import create_app, seed_pets
+    apps = []
+
+    def make(**overrides):
+        app = create_app(dict({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'site.db'}",
+            'DOG_FACTS_URL': 'http://127.0.0.1:9/unused',
+            'DOG_FACTS_CACHE_FILE': str(tmp_path / 'dog_facts.json'),
+            'TEMPLATE_BYTECODE_CACHE': False,
+            'ADMISSION_ENABLED': False,
+            'SUBMISSION_QUEUE_MODE': 'sync',
+        }, **overrides))
+        # Serve plain <img>s instead of building derivatives of every photo
+        app.extensions['images'].enabled = False
+        with app.app_context():
+            db.create_all()
+            seed_pets()
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.engine.dispose()
+
+
+@pytest.fixture
+def site(make_site):
+    return make_site()
@@ -0,0 +1,20 @@
+import pytest
+
+import admission
+
+
+def test_memory_backend_is_refused_with_several_workers():
+    admission.check_workers('memory', 1)
+    admission.check_workers('sqlite', 4)
+    with pytest.raises(RuntimeError):
+        admission.check_workers('memory', 2)
+
+
+def test_sqlite_slots_are_shared_between_backends(tmp_path):
+    # Two backends on one file stand in for two gunicorn workers
+    path = str(tmp_path / 'admission.sqlite3')
+    first, second = admission.SQLiteBackend(path), admission.SQLiteBackend(path)
+    token = first.acquire('add', 1, 0, 0.1)
+    assert second.acquire('add', 1, 0, 0.1) == admission.QUEUE_FULL
+    first.release(token)
+    assert second.acquire('add', 1, 0, 0.1) not in (admission.QUEUE_FULL, admission.TIMED_OUT)
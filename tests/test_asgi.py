@@ -0,0 +1,49 @@
+import asyncio
+
+import httpx
+from flask import Flask
+from sqlalchemy import func, select
+
+import asgi
+import config
+from dog_facts import DogFactsProvider
+from models import db, Pet, Submission
+from submissions import SubmissionQueue
+
+FORM = {'first_name': 'Ada', 'surname': 'Lovelace', 'email': 'ada@example.com', 'message': 'Hi', 'terms': 'on'}
+
+
+def test_default_sqlite_url_is_the_instance_database(tmp_path, monkeypatch):
+    # Run from a directory of its own, so a database opened relative to it shows
+    monkeypatch.chdir(tmp_path)
+    app = Flask(__name__, instance_path=str(tmp_path / 'instance'))
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite:///test.db', DOG_FACTS_URL='http://127.0.0.1:9/unused',
+                      DOG_FACTS_CACHE_FILE=str(tmp_path / 'dog_facts.json'), SUBMISSION_FLUSH_INTERVAL=0.05)
+    config.init_app(app)
+    db.init_app(app)
+    DogFactsProvider(app)
+    queue = SubmissionQueue(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(Pet(img='images/Rex.png', name='Rex', age=2, breed='Mixed', species='Dog'))
+        db.session.commit()
+    application = asgi.AsyncApp(app)
+
+    async def run():
+        await application.startup()
+        try:
+            transport = httpx.ASGITransport(app=application)
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                response = await client.get('/pets.json')
+            queue.submit(**FORM)
+        finally:
+            await application.shutdown()
+        return response
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert [pet['name'] for pet in response.json()['pets']] == ['Rex']
+    with app.app_context():
+        assert db.session.execute(select(func.count()).select_from(Submission)).scalar() == 1
+        db.engine.dispose()
+    assert not (tmp_path / 'test.db').exists()
@@ -0,0 +1,51 @@
+from models import db, Pet
+
+
+def test_unchanged_listing_is_not_modified(site):
+    client = site.test_client()
+    response = client.get('/pets')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+
+    response = client.get('/pets', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert client.get('/pets?species=Dog').headers['ETag'] != etag
+
+
+def test_a_pet_change_invalidates_the_etag(site):
+    client = site.test_client()
+    etag = client.get('/pets').headers['ETag']
+    with site.app_context():
+        db.session.get(Pet, 1).name = 'Renamed'
+        db.session.commit()
+
+    response = client.get('/pets', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Renamed' in response.data
+    assert response.headers['ETag'] != etag
+
+
+def test_an_unmodified_write_keeps_the_etag(site):
+    client = site.test_client()
+    etag = client.get('/pets').headers['ETag']
+    with site.app_context():
+        pet = db.session.get(Pet, 1)
+        pet.name = pet.name
+        db.session.commit()
+    assert client.get('/pets', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_pages_with_flashed_messages_are_never_cached(site):
+    client = site.test_client()
+    etag = client.get('/pets').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('message', 'Thank you for contacting us!!')]
+    response = client.get('/pets', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+def test_static_pages_may_be_reused(site):
+    response = site.test_client().get('/about')
+    assert response.headers['Cache-Control'] == f"public, max-age={site.config['STATIC_PAGE_MAX_AGE']}"
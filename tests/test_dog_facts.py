@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+import dog_facts
+from dog_facts import CircuitBreaker, DogFactsProvider, FALLBACK_FACTS
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(dog_facts.time, 'monotonic', clock)
+    return clock
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+
+def test_half_open_lets_exactly_one_trial_through(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    open_breaker(breaker)
+    clock.now += 60
+    assert breaker.state == 'half-open'
+
+    allowed = []
+    threads = [threading.Thread(target=lambda: allowed.append(breaker.allow())) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert allowed.count(True) == 1
+
+
+def test_half_open_trial_outcome(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    open_breaker(breaker)
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow() and breaker.allow()
+
+
+def test_lost_trial_is_given_up_after_a_cooldown(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=60)
+    open_breaker(breaker)
+    clock.now += 60
+    assert breaker.allow()
+    clock.now += 30
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+@pytest.fixture
+def provider(tmp_path):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.config.update(DOG_FACTS_CACHE_FILE=str(tmp_path / 'dog_facts.json'), DOG_FACTS_TTL=600,
+                      DOG_FACTS_STALE_TTL=3600, DOG_FACTS_BACKGROUND=True)
+    return DogFactsProvider(app)
+
+
+def write_cache(provider, facts, age):
+    with open(provider.cache_file, 'w') as fh:
+        json.dump({'facts': facts, 'fetched_at': time.time() - age}, fh)
+
+
+def test_fresh_pool_is_served_without_refreshing(provider, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(provider, '_schedule_refresh', lambda: scheduled.append(True))
+    write_cache(provider, ['a', 'b', 'c', 'd'], age=10)
+    assert set(provider.get_facts(3)) <= {'a', 'b', 'c', 'd'}
+    assert not scheduled
+
+
+def test_stale_pool_is_served_while_revalidating(provider, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(provider, '_schedule_refresh', lambda: scheduled.append(True))
+    write_cache(provider, ['a', 'b', 'c', 'd'], age=700)
+    assert set(provider.get_facts(3)) <= {'a', 'b', 'c', 'd'}
+    assert scheduled
+
+
+def test_expired_pool_falls_back(provider, monkeypatch):
+    monkeypatch.setattr(provider, '_schedule_refresh', lambda: None)
+    write_cache(provider, ['a', 'b', 'c'], age=600 + 3600 + 1)
+    assert provider.get_facts(3) == FALLBACK_FACTS[:3]
+
+
+def test_refresh_does_not_call_an_open_breaker(provider, monkeypatch):
+    calls = []
+    monkeypatch.setattr(provider, 'fetch', lambda: calls.append(True) or [])
+    open_breaker(provider.breaker)
+    assert provider.refresh() is False
+    assert not calls
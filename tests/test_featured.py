@@ -0,0 +1,54 @@
+from sqlalchemy import insert, update
+
+import featured
+import matching
+import stats
+from models import db, Pet, PetChange
+
+
+def setup(app):
+    app.config.update(FEATURED_COUNT=1)
+    pets = featured.FeaturedPets(app)
+    with app.app_context():
+        db.session.add_all([Pet(img='images/Rex.png', name=name, age=2, breed='Mixed', species='Dog')
+                            for name in ('Rex', 'Max')])
+        db.session.commit()
+        with db.engine.begin() as connection:
+            stats.rebuild(connection)
+    return pets
+
+
+def test_only_edits_to_featured_pets_redraw(db_app):
+    pets = setup(db_app)
+    with db_app.app_context():
+        selection = pets.current()
+        (featured_id,) = selection.ids
+        other = db.session.get(Pet, 3 - featured_id)
+        other.name = 'Renamed'
+        db.session.commit()
+        assert pets.selection is selection
+
+        db.session.get(Pet, featured_id).name = 'Renamed'
+        db.session.commit()
+        assert pets.selection is None
+
+
+def test_other_workers_edits_are_found_by_the_check(db_app):
+    pets = setup(db_app)
+    with db_app.app_context():
+        selection = pets.current()
+        (featured_id,) = selection.ids
+        pets.check()
+        assert pets.selection is selection
+
+        # Another worker renames the featured pet and logs it
+        with db.engine.begin() as connection:
+            connection.execute(update(Pet).where(Pet.id == featured_id).values(name='Renamed'))
+            seq = matching.cursor_at(connection).seq
+            connection.execute(insert(PetChange), [{'id': seq + 1, 'first_id': featured_id,
+                                                    'last_id': featured_id}])
+        assert pets.current() is selection
+        pets.check()
+        assert pets.selection is not selection
+        # Same rotation, same draw: the pet is back with its new name
+        assert [pet['name'] for pet in pets.current()] == ['Renamed']
@@ -0,0 +1,10 @@
+def cards(page):
+    return page.count(b'class="pet-card"')
+
+
+def test_posted_listing_does_not_fill_the_filtered_grid(site):
+    client = site.test_client()
+    form = {'first_name': 'Ada', 'surname': 'Lovelace', 'email': 'ada@example.com', 'message': 'Hi', 'terms': 'on'}
+    # The form renders the unfiltered grid, whatever the query string says
+    assert cards(client.post('/pets?breed=Beagle', data=form).data) > 1
+    assert cards(client.get('/pets?breed=Beagle').data) == 1
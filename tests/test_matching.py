@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import func, insert, select
+
+import matching
+from models import db, Pet, PetChange
+
+
+def add_pet(connection, pet_id, name='Rex'):
+    connection.execute(insert(Pet), [{'id': pet_id, 'img': 'images/Rex.png', 'name': name, 'age': 2,
+                                      'breed': 'Rex', 'species': 'Rabbit'}])
+
+
+def log(connection, change_id, first_id, last_id=None):
+    connection.execute(insert(PetChange), [{'id': change_id, 'first_id': first_id,
+                                            'last_id': first_id if last_id is None else last_id}])
+
+
+def test_late_commit_below_the_cursor_is_replayed(db_app):
+    with db_app.app_context(), db.engine.begin() as connection:
+        add_pet(connection, 1)
+        add_pet(connection, 2)
+        log(connection, 1, 1)
+        # Entry 2 belongs to a transaction that has not committed yet
+        log(connection, 3, 2)
+        snapshot = matching.load_snapshot(connection)
+        assert sorted(snapshot.ids) == [1, 2]
+        assert not matching.has_changes(connection, snapshot.cursor)
+
+        add_pet(connection, 3)
+        log(connection, 2, 3)
+        assert matching.has_changes(connection, snapshot.cursor)
+        snapshot = matching.apply_changes(snapshot, connection)
+        assert sorted(snapshot.ids) == [1, 2, 3]
+        assert not matching.has_changes(connection, snapshot.cursor)
+
+
+def test_read_changes_reports_a_pruned_log(db_app):
+    with db_app.app_context(), db.engine.begin() as connection:
+        cursor = matching.cursor_at(connection)
+        log(connection, 50, 1)
+        changes, _ = matching.read_changes(connection, cursor)
+        assert changes is None
+
+
+def test_pruning_survives_id_jumps(db_app, monkeypatch):
+    monkeypatch.setattr(matching, 'CHANGELOG_KEEP', 10)
+    monkeypatch.setattr(matching, 'PRUNE_EVERY', 5)
+    with db_app.app_context(), db.engine.begin() as connection:
+        for change_id in range(1, 14):
+            log(connection, change_id, change_id)
+            matching.prune_changes(connection)
+        assert connection.execute(select(func.count()).select_from(PetChange)).scalar() == 13
+        # A bulk insert skips straight past any multiple of PRUNE_EVERY
+        log(connection, 23, 1, 500)
+        matching.prune_changes(connection)
+        assert connection.execute(select(func.min(PetChange.id))).scalar() > 23 - 10
+
+
+@pytest.mark.parametrize('data', [[1, 2], 'dog', 5])
+def test_preferences_must_be_an_object(data):
+    with pytest.raises(ValueError):
+        matching.parse_preferences(data)
+
+
+@pytest.mark.parametrize('data', [{'terms': 5}, {'q': {'a': 1}}, {'species': 3}, {'breeds': 1.5}])
+def test_preference_fields_must_be_strings_or_lists(data):
+    with pytest.raises(ValueError):
+        matching.parse_preferences(data)
+
+
+def test_match_endpoint_rejects_malformed_bodies(db_app):
+    from app import match_pets
+    db_app.add_url_rule('/match', 'match', match_pets, methods=['POST'])
+    client = db_app.test_client()
+    assert client.post('/match', json=[1, 2]).status_code == 400
+    assert client.post('/match', json={'terms': 5}).status_code == 400
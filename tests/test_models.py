@@ -0,0 +1,41 @@
+import pytest
+
+from images import ImagePipeline
+from models import validate_pet
+
+PET = {'name': 'Max', 'age': '2', 'breed': 'Beagle', 'species': 'Dog'}
+
+
+@pytest.fixture
+def images_app(db_app):
+    db_app.config['UPLOAD_FOLDER'] = f"{db_app.static_folder}/uploads"
+    ImagePipeline(db_app)
+    with db_app.app_context():
+        yield db_app
+
+
+def test_fields_are_cleaned():
+    assert validate_pet(dict(PET, name=' Max ')) == {'img': '', 'name': 'Max', 'age': 2, 'breed': 'Beagle',
+                                                     'species': 'Dog'}
+
+
+@pytest.mark.parametrize('data, message', [
+    (dict(PET, name=''), "required"),
+    (dict(PET, age='two'), "Age must be a number"),
+    (dict(PET, breed='x' * 101), "Breed is too long"),
+])
+def test_invalid_fields(data, message):
+    with pytest.raises(ValueError, match=message):
+        validate_pet(data)
+
+
+@pytest.mark.parametrize('img', ['images/Beagle.png', 'uploads/ab/0123.png'])
+def test_image_inside_the_photo_folders(images_app, img):
+    assert validate_pet(dict(PET, img=img))['img'] == img
+
+
+@pytest.mark.parametrize('img', ['/etc/passwd', '../app.py', 'images/../../config.py', 'derived/ab/x.webp',
+                                 'images\\..\\..\\app.py'])
+def test_image_outside_the_photo_folders(images_app, img):
+    with pytest.raises(ValueError, match="Img must be"):
+        validate_pet(dict(PET, img=img))
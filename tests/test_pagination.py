@@ -0,0 +1,65 @@
+import base64
+import json
+
+import pytest
+
+from models import db, Pet
+from pagination import decode_cursor, encode_cursor
+
+
+def cursor(value, pet_id):
+    return base64.urlsafe_b64encode(json.dumps([value, pet_id]).encode()).decode().rstrip('=')
+
+
+def walk(client, sort, per_page=5):
+    ids, after = [], None
+    while True:
+        query = f'/pets.json?sort={sort}&per_page={per_page}' + (f'&after={after}' if after else '')
+        body = client.get(query).get_json()
+        ids += [pet['id'] for pet in body['pets']]
+        after = body['next_cursor']
+        if after is None:
+            return ids
+
+
+@pytest.mark.parametrize('sort', ['id', 'age'])
+def test_cursors_walk_the_whole_listing_in_order(site, sort):
+    client = site.test_client()
+    with site.app_context():
+        pets = Pet.query.all()
+    key = (lambda pet: pet.id) if sort == 'id' else (lambda pet: (pet.age, pet.id))
+    assert walk(client, sort) == [pet.id for pet in sorted(pets, key=key)]
+
+
+def test_previous_cursor_returns_the_page_before(site):
+    client = site.test_client()
+    first = client.get('/pets.json?sort=age&per_page=5').get_json()
+    second = client.get(f"/pets.json?sort=age&per_page=5&after={first['next_cursor']}").get_json()
+    back = client.get(f"/pets.json?sort=age&per_page=5&before={second['prev_cursor']}").get_json()
+    assert [pet['id'] for pet in back['pets']] == [pet['id'] for pet in first['pets']]
+
+
+def test_cursor_round_trip():
+    pet = Pet(id=7, age=3)
+    assert decode_cursor(encode_cursor(pet, 'age'), 'age') == (3, 7)
+    assert decode_cursor(encode_cursor(pet), 'id') == (None, 7)
+
+
+@pytest.mark.parametrize('sort, value', [
+    ('age', 'three'),   # a string reaching the keyset comparison
+    ('age', True),
+    ('age', None),      # an `id` cursor sent with sort=age
+    ('id', 3),
+])
+def test_cursor_values_must_fit_the_sort_key(sort, value):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor(value, 7), sort)
+
+
+@pytest.mark.parametrize('after', ['garbage!', cursor('three', 1), cursor(3, '1'), cursor(3, True)])
+def test_tampered_cursors_are_rejected(site, after):
+    client = site.test_client()
+    response = client.get(f'/pets.json?sort=age&after={after}')
+    assert response.status_code == 400
+    # The HTML listing starts over from the first page instead
+    assert client.get(f'/pets?sort=age&after={after}').status_code == 200
@@ -0,0 +1,36 @@
+import sys
+import threading
+
+import profiler
+
+
+def test_frame_names_without_co_qualname():
+    class Code:
+        co_name = 'handler'
+
+    class Frame:
+        f_code = Code()
+        f_globals = {'__name__': 'app'}
+        f_back = None
+
+    assert profiler.collapse(Frame()) == 'app:handler'
+
+
+def test_summary_copy_while_sampling():
+    profile = profiler.Profile(forced=True)
+    frame = sys._getframe()
+    done = threading.Event()
+
+    def sample():
+        while not done.is_set():
+            profile.sample(frame)
+
+    thread = threading.Thread(target=sample)
+    thread.start()
+    try:
+        for _ in range(200):
+            stacks, samples, _, _ = profile.copy()
+            assert sum(stacks.values()) == samples
+    finally:
+        done.set()
+        thread.join()
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, insert, select, update
+
+import config
+from caching import bump_catalog_version
+from models import db, CatalogVersion, Pet
+from replicas import ReplicaRouter, read_only
+
+PET = {'img': 'images/Beagle.png', 'age': 2, 'breed': 'Beagle', 'species': 'Dog'}
+
+
+def seed(engine, name):
+    db.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(Pet), [dict(PET, name=name)])
+        connection.execute(insert(CatalogVersion), [{'id': 1, 'version': 1}])
+
+
+def version_of(engine):
+    with engine.connect() as connection:
+        return connection.execute(select(CatalogVersion.version)).scalar()
+
+
+def set_version(engine, version):
+    with engine.begin() as connection:
+        connection.execute(update(CatalogVersion).values(version=version))
+
+
+def make_app(tmp_path, replica_url):
+    app = Flask(__name__, instance_path=str(tmp_path))
+    app.secret_key = 'test'
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'primary.db'}",
+                      DATABASE_REPLICA_URLS=replica_url, REPLICA_CHECK_INTERVAL=60)
+    config.init_app(app)
+    db.init_app(app)
+    router = ReplicaRouter(app)
+
+    def names():
+        return jsonify(sorted(db.session.execute(db.select(Pet.name)).scalars()))
+
+    app.add_url_rule('/read', 'read', read_only(names))
+    app.add_url_rule('/primary', 'primary', names)
+
+    @app.route('/write', methods=['POST'])
+    def write():
+        db.session.add(Pet(name='new', **PET))
+        db.session.flush()
+        bump_catalog_version(db.session.connection())
+        db.session.commit()
+        return '', 204
+
+    with app.app_context():
+        seed(db.engine, 'primary')
+    return app, router
+
+
+@pytest.fixture
+def replica(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    seed(engine, 'replica')
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def setup(tmp_path, replica):
+    app, router = make_app(tmp_path, f"sqlite:///{tmp_path / 'replica.db'}")
+    with app.app_context():
+        router.replicas[0].check()
+    yield app, router
+    with app.app_context():
+        db.engine.dispose()
+    for item in router.replicas:
+        item.engine.dispose()
+
+
+def test_read_only_views_use_the_replica(setup):
+    app, _ = setup
+    client = app.test_client()
+    assert client.get('/read').get_json() == ['replica']
+    assert client.get('/primary').get_json() == ['primary']
+
+
+def test_reads_follow_the_writer_until_the_replica_catches_up(setup, replica):
+    app, _ = setup
+    writer, other = app.test_client(), app.test_client()
+    assert writer.post('/write').status_code == 204
+    # The primary is ahead now, the replica still at 1
+    assert writer.get('/read').get_json() == ['new', 'primary']
+    assert other.get('/read').get_json() == ['replica']
+
+    with app.app_context():
+        set_version(replica, version_of(db.engine))
+    assert writer.get('/read').get_json() == ['replica']
+
+
+def test_pin_expires(setup, monkeypatch):
+    app, router = setup
+    client = app.test_client()
+    client.post('/write')
+    assert client.get('/read').get_json() == ['new', 'primary']
+    monkeypatch.setattr(time, 'time', lambda: 10 ** 10)
+    assert client.get('/read').get_json() == ['replica']
+
+
+def test_unchecked_and_unreachable_replicas_are_skipped(tmp_path):
+    app, router = make_app(tmp_path, f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    client = app.test_client()
+    # Not checked yet: the primary answers while the check runs in the background
+    assert client.get('/read').get_json() == ['primary']
+    deadline = time.monotonic() + 5
+    while router.replicas[0].healthy is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert router.replicas[0].healthy is False
+    assert client.get('/read').get_json() == ['primary']
@@ -0,0 +1,98 @@
+import io
+import os
+import shutil
+import tempfile
+
+import pytest
+from PIL import Image
+
+from conftest import ROOT
+from models import db, Pet
+
+FIELDS = {'name': 'Biscuit', 'age': '3', 'breed': 'Beagle', 'species': 'Dog'}
+MAX_BYTES = 64 * 1024
+
+
+def png(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(make_site):
+    # Pet.img is relative to the static folder, so uploads must live under it
+    parent = os.path.join(ROOT, 'static', 'uploads')
+    os.makedirs(parent, exist_ok=True)
+    folder = tempfile.mkdtemp(prefix='test-', dir=parent)
+    app = make_site(UPLOAD_FOLDER=folder, UPLOAD_GC_GRACE=0, UPLOAD_MAX_BYTES=MAX_BYTES)
+    yield app
+    shutil.rmtree(folder)
+
+
+def files(app):
+    folder = app.config['UPLOAD_FOLDER']
+    return sorted(os.path.relpath(os.path.join(root, name), folder)
+                  for root, _, names in os.walk(folder) for name in names)
+
+
+def add(client, data, filename='photo.png', **fields):
+    return client.post('/add', data=dict(FIELDS, **fields, image=(io.BytesIO(data), filename)),
+                       content_type='multipart/form-data')
+
+
+def added(app):
+    with app.app_context():
+        return Pet.query.filter(Pet.name.in_(['Biscuit', 'Crumble'])).order_by(Pet.id).all()
+
+
+def test_identical_uploads_share_one_file(store):
+    client = store.test_client()
+    image = png()
+    assert add(client, image, 'one.png').status_code == 302
+    assert add(client, image, 'two.jpg', name='Crumble').status_code == 302
+    first, second = added(store)
+    assert first.img == second.img
+    assert first.img.endswith('.png')
+    assert len(files(store)) == 1
+
+
+def test_a_shared_file_is_removed_with_its_last_pet(store):
+    client = store.test_client()
+    image = png()
+    add(client, image)
+    add(client, image, name='Crumble')
+    first, second = added(store)
+    path = os.path.join(store.static_folder, first.img)
+
+    client.post(f'/delete_pet/{first.id}')
+    assert os.path.exists(path)
+    client.post(f'/delete_pet/{second.id}')
+    assert not os.path.exists(path)
+    assert files(store) == []
+
+
+def test_replacing_a_photo_releases_the_old_one(store):
+    client = store.test_client()
+    add(client, png('red'))
+    (pet,) = added(store)
+    old = os.path.join(store.static_folder, pet.img)
+    client.post(f'/edit/{pet.id}', data=dict(FIELDS, image=(io.BytesIO(png('blue')), 'new.png')),
+                content_type='multipart/form-data')
+    (pet,) = added(store)
+    assert not os.path.exists(old)
+    assert files(store) == [os.path.relpath(os.path.join(store.static_folder, pet.img), store.config['UPLOAD_FOLDER'])]
+
+
+@pytest.mark.parametrize('data, fields', [
+    (b'GIF89a but not really' * 10, {'name': ''}),
+    (b'<html>not an image</html>' * 10, {}),
+    (png() + b'\0' * MAX_BYTES, {}),
+    # Past the request body limit as well: refused with 413 before it is read
+    (png() + b'\0' * (3 * MAX_BYTES), {}),
+], ids=['invalid-form', 'not-an-image', 'too-large', 'body-too-large'])
+def test_rejected_uploads_leave_nothing_behind(store, data, fields):
+    response = add(store.test_client(), data, **fields)
+    assert response.status_code == 302
+    assert added(store) == []
+    assert files(store) == []
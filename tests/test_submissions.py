@@ -0,0 +1,78 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import func, select
+
+from models import db, Submission
+from submissions import SubmissionQueue
+
+FORM = {'first_name': 'Ada', 'surname': 'Lovelace', 'email': 'ada@example.com', 'message': 'Hi', 'terms': 'on'}
+
+
+def stored(app):
+    with app.app_context():
+        return db.session.execute(select(func.count()).select_from(Submission)).scalar()
+
+
+@pytest.fixture
+def make_queue(db_app):
+    queues = []
+
+    def make(**config):
+        db_app.config.update(config)
+        queue = SubmissionQueue(db_app)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.drain()
+
+
+def test_sync_mode_writes_inline(db_app, make_queue):
+    queue = make_queue(SUBMISSION_QUEUE_MODE='sync')
+    queue.submit(**FORM)
+    assert stored(db_app) == 1
+    assert queue.depth == 0
+
+
+def test_missing_field_is_rejected(db_app, make_queue):
+    queue = make_queue(SUBMISSION_QUEUE_MODE='sync')
+    with pytest.raises(ValueError):
+        queue.submit(**dict(FORM, email=''))
+    assert stored(db_app) == 0
+
+
+def test_drain_flushes_everything_queued(db_app, make_queue):
+    queue = make_queue(SUBMISSION_QUEUE_MODE='async', SUBMISSION_BATCH_SIZE=10, SUBMISSION_FLUSH_INTERVAL=0.2)
+    for i in range(25):
+        queue.submit(**dict(FORM, message=f"message {i}"))
+    queue.drain()
+    assert stored(db_app) == 25
+    assert queue.flushed == 25
+    assert queue.batches >= 3
+
+
+def test_full_queue_writes_inline(db_app, make_queue):
+    queue = make_queue(SUBMISSION_QUEUE_MODE='async', SUBMISSION_QUEUE_SIZE=1, SUBMISSION_FLUSH_INTERVAL=0.2,
+                       SUBMISSION_BATCH_SIZE=100)
+    for _ in range(5):
+        queue.submit(**FORM)
+    assert queue.overflows >= 1
+    queue.drain()
+    assert stored(db_app) == 5
+
+
+def test_spool_of_a_dead_worker_is_replayed(db_app, make_queue, tmp_path):
+    spool_dir = tmp_path / 'spool'
+    spool_dir.mkdir()
+    # No process has pid 2**22 + 1 on Linux (pid_max is at most 2**22)
+    with open(spool_dir / f"submissions-{2 ** 22 + 1}.spool", 'w') as fh:
+        fh.write(json.dumps(dict(FORM, terms=True)) + '\n')
+    queue = make_queue(SUBMISSION_QUEUE_MODE='async', SUBMISSION_SPOOL_DIR=str(spool_dir),
+                       SUBMISSION_SPOOL_FSYNC=False)
+    queue.submit(**FORM)
+    queue.drain()
+    assert stored(db_app) == 2
+    assert not [name for name in os.listdir(spool_dir) if 'recovering' in name]
@@ -0,0 +1,38 @@
+import pytest
+from sqlalchemy import insert
+
+import suggest
+from models import db, Pet
+
+
+def test_ranking_covers_every_entry_under_the_prefix():
+    completions = suggest.Completions()
+    # Many rare values sort before the common one
+    for i in range(3000):
+        completions.add(f"Ca{i:04d}")
+    for _ in range(5):
+        completions.add("Cz")
+    completions.finish()
+    assert completions.complete('c', 2)[0] == ('Cz', 5)
+    assert completions.complete('q', 2) == []
+
+
+def test_a_failed_refresh_keeps_the_last_index(db_app, monkeypatch):
+    index = suggest.SuggestIndex(db_app)
+    with db_app.app_context():
+        db.session.execute(insert(Pet), [{'img': 'images/Rex.png', 'name': 'Charlie', 'age': 2,
+                                          'breed': 'Beagle', 'species': 'Dog'}])
+        db.session.commit()
+        assert index.suggest('ch')['name'] == [('Charlie', 1)]
+
+        def broken(*args):
+            raise RuntimeError("database went away")
+        monkeypatch.setattr(suggest.matching, 'read_changes', broken)
+        index.checked_at = 0.0
+        assert index.suggest('ch')['name'] == [('Charlie', 1)]
+
+        # With no index to fall back on, the error is the caller's
+        index.fields = None
+        monkeypatch.setattr(index, '_load', broken)
+        with pytest.raises(RuntimeError):
+            index.suggest('ch')
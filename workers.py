@@ -0,0 +1,18 @@
+"""Helpers for state that gunicorn worker processes share through files.
+
+Metrics snapshots, admission slots and submission spools are all tagged
+with the pid of the worker that wrote them, so the others can tell whether
+that worker is still around.
+"""
+import os
+
+
+def pid_alive(pid):
+    """Whether a process with this pid exists (on this host)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, owned by someone else
+    return True